@@ -16,7 +16,7 @@ import { UserContext } from './UserContext';
 import { Audio } from 'expo-av'; // Use expo-av instead of expo-audio
 import * as FileSystem from 'expo-file-system';
 import { sendChatMessage, sendAssistantMessage, transcribeAudio, analyzeJournalEntry } from './openaiService';
-import { createJournalEntry, getJournalEntries, deleteJournalEntry } from './api';
+import { createJournalEntry, getJournalPage, getJournalEntry, deleteJournalEntry } from './api';
 import Icon from 'react-native-vector-icons/MaterialIcons'; // Make sure to install react-native-vector-icons
 
 export default function Chat({ navigation }) {
@@ -30,6 +30,8 @@ export default function Chat({ navigation }) {
   const [recording, setRecording] = useState(null);
   const [isLoading, setIsLoading] = useState(false);
   const [journalEntries, setJournalEntries] = useState([]);
+  const [journalCursor, setJournalCursor] = useState(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [journalInputText, setJournalInputText] = useState('');
   const [journalTitle, setJournalTitle] = useState('');
   const [showJournalForm, setShowJournalForm] = useState(false);
@@ -49,8 +51,9 @@ export default function Chat({ navigation }) {
     
     try {
       setIsLoading(true);
-      const entries = await getJournalEntries(user.id);
-      setJournalEntries(entries);
+      const page = await getJournalPage(user.id);
+      setJournalEntries(page.entries);
+      setJournalCursor(page.next_cursor);
     } catch (error) {
       console.error('Failed to load journal entries:', error);
       Alert.alert('Error', 'Failed to load journal entries');
@@ -59,6 +62,33 @@ export default function Chat({ navigation }) {
     }
   };
 
+  // Fetch the next page when the list is scrolled to the end
+  const loadMoreJournalEntries = async () => {
+    if (!user?.id || !journalCursor || isLoadingMore) return;
+
+    try {
+      setIsLoadingMore(true);
+      const page = await getJournalPage(user.id, journalCursor);
+      setJournalEntries(prev => [...prev, ...page.entries]);
+      setJournalCursor(page.next_cursor);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
+  // The list only carries excerpts; load the full text when an entry is opened
+  const openJournalEntry = async (entryId) => {
+    const entry = await getJournalEntry(entryId);
+    if (!entry) {
+      Alert.alert('Error', 'Failed to load journal entry');
+      return;
+    }
+    Alert.alert(
+      entry.title,
+      `${entry.content}\n\nAnalysis: ${entry.analysis || 'No analysis available'}`
+    );
+  };
+
   // Function to simulate voice input (temporary until audio recording is fixed)
   const startRecording = async () => {
     try {
@@ -252,13 +282,11 @@ export default function Chat({ navigation }) {
   const renderJournalEntry = ({ item }) => (
     <TouchableOpacity 
       style={styles.journalEntry}
-      onPress={() => Alert.alert(
-        item.title,
-        `${item.content}\n\nAnalysis: ${item.analysis || 'No analysis available'}`
-      )}
+      onPress={() => openJournalEntry(item.id)}
       onLongPress={() => handleDeleteJournal(item.id)}
     >
       <Text style={styles.journalTitle}>{item.title}</Text>
+      {item.excerpt ? <Text style={styles.journalExcerpt}>{item.excerpt}</Text> : null}
       <Text style={styles.journalDate}>
         {new Date(item.created_at).toLocaleDateString()}
       </Text>
@@ -414,6 +442,9 @@ export default function Chat({ navigation }) {
                       renderItem={renderJournalEntry}
                       keyExtractor={(item) => item.id.toString()}
                       contentContainerStyle={styles.journalList}
+                      onEndReached={loadMoreJournalEntries}
+                      onEndReachedThreshold={0.5}
+                      ListFooterComponent={isLoadingMore ? <ActivityIndicator color="#5D92B1" /> : null}
                     />
                   )}
                 </>
@@ -548,6 +579,11 @@ const styles = StyleSheet.create({
     fontSize: 16,
     fontWeight: 'bold',
   },
+  journalExcerpt: {
+    fontSize: 14,
+    color: '#333',
+    marginTop: 4,
+  },
   journalDate: {
     fontSize: 14,
     color: '#666',
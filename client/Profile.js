@@ -17,7 +17,7 @@ import {
   getMoodHistory, 
   submitMood, 
   getUserStreaks,
-  getMicroAssessments 
+  getDashboard 
 } from './api';
 
 export default function Profile({ navigation }) {
@@ -88,12 +88,13 @@ export default function Profile({ navigation }) {
   const fetchData = async () => {
     setLoadingResults(true);
     try {
-      await Promise.all([
-        fetchMoodHistory(),
-        fetchTestResults(),
-        fetchMicroAssessments(),
-        fetchStreakData()
-      ]);
+      const dashboard = await getDashboard(user.id);
+      // Sections that failed on the server come back null; keep what is on screen for those
+      const failed = dashboard.errors || [];
+      if (!failed.includes('moods')) setMoodHistory(dashboard.moods);
+      if (!failed.includes('tests')) setTestResults(dashboard.tests);
+      if (!failed.includes('micro_assessments')) setMicroAssessments(dashboard.micro_assessments);
+      if (!failed.includes('streaks')) setStreakData(dashboard.streaks);
     } catch (error) {
       console.error('Error fetching data:', error);
     } finally {
@@ -123,17 +124,6 @@ export default function Profile({ navigation }) {
     }
   };
 
-  const fetchMicroAssessments = async () => {
-    try {
-      const data = await getMicroAssessments(user.id);
-      setMicroAssessments(data);
-      return data;
-    } catch (error) {
-      console.error('Failed to fetch micro assessments:', error);
-      return [];
-    }
-  };
-
   const fetchStreakData = async () => {
     try {
       const data = await getUserStreaks(user.id);
@@ -1,4 +1,4 @@
-import React, { useEffect, useState, useContext } from 'react';
+import React, { useEffect, useState, useContext, useRef } from 'react';
 import {
   StyleSheet,
   View,
@@ -13,7 +13,7 @@ import {
   getTestQuestions, 
   submitTest, 
   startTest, 
-  saveResponse, 
+  saveResponses, 
   getTestProgress,
   getInProgressTest
 } from './api';
@@ -92,6 +92,7 @@ const TakeTest = ({ navigation }) => {
                       onPress: () => {
                         setActiveTestId(inProgressTest.test_id);
                         setResponses(testProgress.responses);
+                        latestResponses.current = { ...testProgress.responses };
                         
                         // Find the next unanswered question index
                         const answeredIds = Object.keys(testProgress.responses).map(Number);
@@ -137,6 +138,7 @@ const TakeTest = ({ navigation }) => {
         const testId = await startTest(user.id);
         setActiveTestId(testId);
         setResponses({});
+        latestResponses.current = {};
         setCurrentQuestionIndex(0);
       }
     } catch (error) {
@@ -144,31 +146,56 @@ const TakeTest = ({ navigation }) => {
     }
   };
 
-  // Auto-save responses when they change
-  useEffect(() => {
-    const saveCurrentResponses = async () => {
-      if (activeTestId && Object.keys(responses).length > 0 && !isSaving) {
-        setIsSaving(true);
-        
-        try {
-          // Get the current response that might have changed
-          const currentQuestion = questions[currentQuestionIndex];
-          if (currentQuestion && responses[currentQuestion.id] !== undefined) {
-            await saveResponse(activeTestId, currentQuestion.id, responses[currentQuestion.id]);
-          }
-        } catch (error) {
-          console.error("Error auto-saving response:", error);
-        } finally {
-          setIsSaving(false);
-        }
+  // Auto-save: answers are collected and sent as one batch once the user pauses
+  const pendingResponses = useRef({});
+  const latestResponses = useRef({});
+  const autosaveTimer = useRef(null);
+
+  const flushResponses = async () => {
+    const batch = pendingResponses.current;
+    if (!activeTestId || Object.keys(batch).length === 0) {
+      return;
+    }
+    pendingResponses.current = {};
+    setIsSaving(true);
+
+    try {
+      // Timestamps make a sequence that keeps increasing across app restarts
+      const result = await saveResponses(activeTestId, Date.now(), batch);
+      if (!result.applied) {
+        // Some answers were older than the stored ones (a late batch); send the current
+        // choices again, with a newer seq, unless they are already queued
+        const current = {};
+        Object.keys(batch).forEach(questionId => {
+          current[questionId] = latestResponses.current[questionId] ?? batch[questionId];
+        });
+        pendingResponses.current = { ...current, ...pendingResponses.current };
+        clearTimeout(autosaveTimer.current);
+        autosaveTimer.current = setTimeout(flushResponses, 1000);
       }
-    };
-    
-    saveCurrentResponses();
-  }, [responses, currentQuestionIndex]);
+    } catch (error) {
+      console.error("Error auto-saving responses:", error);
+      // Keep the failed answers for the next batch unless they were changed since
+      pendingResponses.current = { ...batch, ...pendingResponses.current };
+    } finally {
+      setIsSaving(false);
+    }
+  };
+
+  useEffect(() => {
+    return () => clearTimeout(autosaveTimer.current);
+  }, []);
+
+  const queueAutosave = (questionId, score) => {
+    latestResponses.current[questionId] = score;
+    pendingResponses.current[questionId] = score;
+    clearTimeout(autosaveTimer.current);
+    autosaveTimer.current = setTimeout(flushResponses, 1000);
+  };
 
   const handleSelect = (questionId, score) => {
     setResponses(prev => ({ ...prev, [questionId]: score }));
+    queueAutosave(questionId, score);
     
     // Auto-advance to next question if not on the last question
     if (currentQuestionIndex < questions.length - 1) {
@@ -214,6 +241,9 @@ const TakeTest = ({ navigation }) => {
   const submitResponses = async () => {
     try {
       setSubmitting(true);
+      // The submission carries every answer, so pending autosaves are no longer needed
+      clearTimeout(autosaveTimer.current);
+      pendingResponses.current = {};
       
       const formattedResponses = Object.keys(responses).map(id => ({
         question_id: parseInt(id),
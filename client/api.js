@@ -8,8 +8,11 @@ export const registerUser = async (name, email, password) => {
 };
 
 // Login User
+// The session token is sent with every later request so the server can skip its user lookup
 export const loginUser = async (email, password) => {
-  return axios.post(`${BASE_URL}/login`, { email, password });
+  const response = await axios.post(`${BASE_URL}/login`, { email, password });
+  axios.defaults.headers.common['Authorization'] = `Bearer ${response.data.token}`;
+  return response;
 };
 
 // MBI TEST SERVICE
@@ -50,6 +53,24 @@ export const saveResponse = async (testId, questionId, score) => {
   }
 };
 
+// Autosave a batch of answers for a test in progress; seq must increase with every batch
+export const saveResponses = async (testId, seq, responses) => {
+  try {
+    const response = await axios.post(`${BASE_URL}/save-responses`, {
+      test_id: testId,
+      seq: seq,
+      responses: Object.entries(responses).map(([questionId, score]) => ({
+        question_id: Number(questionId),
+        score: score
+      }))
+    });
+    return response.data;
+  } catch (error) {
+    console.error("Error saving responses:", error);
+    throw error;
+  }
+};
+
 // Submit User Responses (complete test)
 export const submitTest = async (userId, responses, testId = null) => {
   try {
@@ -105,6 +126,14 @@ export const getTestResults = async (userId) => {
   }
 };
 
+// Profile screen data in one request; fields limits it to the listed sections
+export const getDashboard = async (userId, fields = null) => {
+  const response = await axios.get(`${BASE_URL}/dashboard/${userId}`, {
+    params: fields ? { fields: fields.join(',') } : {}
+  });
+  return response.data;
+};
+
 // Submit Mood Data
 export const submitMood = async (userId, mood) => {
   try {
@@ -174,6 +203,32 @@ export const getJournalEntries = async (userId) => {
   }
 };
 
+// Get one page of a user's journal (titles and excerpts); pass the previous page's next_cursor for the next one
+export const getJournalPage = async (userId, cursor = null) => {
+  try {
+    const response = await axios.get(`${BASE_URL}/journal/${userId}/entries`, {
+      params: cursor ? { cursor } : {},
+    });
+    return response.data;
+  } catch (error) {
+    console.error("Error fetching journal page:", error);
+    return { entries: [], next_cursor: null };
+  }
+};
+
+// Search a user's journal; results come best match first, with <mark>-highlighted snippets
+export const searchJournal = async (userId, query, offset = 0) => {
+  try {
+    const response = await axios.get(`${BASE_URL}/journal/${userId}/search`, {
+      params: { q: query, offset },
+    });
+    return response.data;
+  } catch (error) {
+    console.error("Error searching journal:", error);
+    return { results: [], next_offset: null };
+  }
+};
+
 // Get a specific journal entry
 export const getJournalEntry = async (entryId) => {
   try {
@@ -323,6 +378,21 @@ export const syncHealthData = async (userId, healthData) => {
   }
 };
 
+// Sync many health samples in one request
+// samples: [{ recorded_at, heart_rate, sleep_duration, sleep_quality, steps, stress_level, hrv }]
+export const syncHealthDataBatch = async (userId, samples) => {
+  try {
+    const response = await axios.post(`${BASE_URL}/sync-health-data/batch`, {
+      user_id: userId,
+      samples: samples
+    });
+    return response.data;
+  } catch (error) {
+    console.error("Error syncing health data batch:", error);
+    throw error;
+  }
+};
+
 // Get health metrics for dashboard/analysis
 export const getHealthMetrics = async (userId, timeRange = '7d') => {
   try {
@@ -0,0 +1,239 @@
+"""Admission control: adaptive per-route-class concurrency limits with load shedding.
+
+Requests are sorted into classes (bcrypt auth, heavy analytics, writes,
+cheap reads), each with its own concurrency limit, so a slow class can
+only occupy its own slots and the others keep answering. A request over
+its class limit waits briefly for a slot, then gets 503 with Retry-After.
+The classes that hold a DB connection per request share the connection
+pool (see DB_CONNECTIONS), so admitted requests do not wait on checkout.
+
+Limits adapt per class, AIMD style, from the latency of admitted requests
+(queueing time excluded). Completions are grouped into windows of about
+`limit` requests (at least WINDOW_MIN_SAMPLES); when a window's average latency exceeds the best
+window average of the last BASELINE_SECONDS by the tolerance factor, or
+a request failed with a 5xx, the limit is cut by DECREASE_FACTOR. A
+window that had requests waiting or shed raises the limit by one.
+
+Everything here runs on the event loop, so no locks are needed. Limits
+are per server process. ADMISSION_CONTROL=0 turns the middleware off;
+/internal/admission-stats shows the current limits.
+"""
+import asyncio
+import os
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+
+import orjson
+
+from database import DB_MAX_OVERFLOW, DB_PGBOUNCER, DB_POOL_SIZE
+from outbox import OUTBOX_WORKERS
+from utils import PASSWORD_HASH_QUEUE, PASSWORD_HASH_WORKERS
+
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "1") == "1"
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))  # seconds
+LATENCY_TOLERANCE = float(os.getenv("ADMISSION_LATENCY_TOLERANCE", "2.0"))  # x the baseline before backing off
+DECREASE_FACTOR = 0.8
+BASELINE_SECONDS = 30.0
+WINDOW_MIN_SAMPLES = 10  # so one slow request at low traffic does not cut the limit
+
+@dataclass(frozen=True)
+class RouteClass:
+    initial: int
+    minimum: int
+    maximum: int
+    queue_size: int
+    queue_timeout: float  # seconds a request may wait for a slot
+
+# Pool connections left for requests once the outbox workers hold theirs. Behind PgBouncer
+# there is no client-side pool to exhaust, and the classes keep their fixed limits.
+DB_CONNECTIONS = None if DB_PGBOUNCER else max(3, DB_POOL_SIZE + DB_MAX_OVERFLOW - OUTBOX_WORKERS)
+# heavy:write:read split of those connections; read gets the largest share, so a slow
+# write or analytics class cannot take the connections reads need
+DB_SHARES = {"heavy": 1, "write": 2, "read": 4}
+
+def _db_class(name: str, config: RouteClass) -> RouteClass:
+    """Caps a class that holds a DB connection per request at its share of the pool"""
+    if DB_CONNECTIONS is None:
+        return config
+    maximum = max(1, DB_CONNECTIONS * DB_SHARES[name] // sum(DB_SHARES.values()))
+    minimum = min(config.minimum, maximum)
+    return RouteClass(max(minimum, maximum // 2), minimum, maximum, config.queue_size, config.queue_timeout)
+
+ROUTE_CLASSES = {
+    # bcrypt runs on the hashing pool; up to its workers plus queue may wait on it.
+    # Its DB sessions are short and taken outside the hashing, so it gets no pool share.
+    "auth": RouteClass(PASSWORD_HASH_WORKERS * 2, 1, PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE, 16, 0.5),
+    "heavy": _db_class("heavy", RouteClass(4, 1, 8, 8, 0.25)),
+    "write": _db_class("write", RouteClass(8, 2, 16, 32, 0.1)),
+    "read": _db_class("read", RouteClass(16, 4, 32, 64, 0.05)),
+}
+
+# (class, methods or None for any, path pattern); first match wins, then writes and reads by method
+ROUTE_RULES = [
+    (None, None, re.compile(r"^/(internal/|metrics$|docs|redoc|openapi\.json)")),  # never limited
+    ("auth", {"POST", "PUT"}, re.compile(r"^/(login|register|update-password)$")),
+    ("heavy", {"GET"}, re.compile(r"^/(health-metrics|micro-assessment/trend|dashboard|cohorts)/|^/journal/[^/]+/search$")),
+]
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+def route_class(method: str, path: str):
+    for name, methods, pattern in ROUTE_RULES:
+        if (methods is None or method in methods) and pattern.search(path):
+            return name
+    return "read" if method in READ_METHODS else "write"
+
+class AdaptiveLimit:
+    """Concurrency limit for one route class, adjusted from observed latency"""
+
+    def __init__(self, name: str, config: RouteClass):
+        self.name = name
+        self.config = config
+        self.limit = float(config.initial)
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+        self._waiters = deque()
+        self._baselines = deque()  # (time, window average latency)
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window_count = 0
+        self._window_total = 0.0
+        self._window_failed = False
+        self._window_saturated = False
+
+    async def acquire(self) -> bool:
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+        self._window_saturated = True
+        if len(self._waiters) >= self.config.queue_size:
+            self.shed += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() hands the slot over by resolving the future
+            await asyncio.wait_for(waiter, self.config.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the timeout fired
+                self.admitted += 1
+                return True
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            self.shed += 1
+            return False
+        except asyncio.CancelledError:
+            # Client went away while queued; give back a slot handed over meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self.in_flight -= 1
+                self._hand_over()
+            raise
+        self.admitted += 1
+        return True
+
+    def release(self, latency: float, failed: bool):
+        self.in_flight -= 1
+        self._record(latency, failed)
+        self._hand_over()
+
+    def _hand_over(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(True)
+
+    def _record(self, latency: float, failed: bool):
+        self._window_count += 1
+        self._window_total += latency
+        self._window_failed |= failed
+
+        if self._window_count < max(WINDOW_MIN_SAMPLES, int(self.limit)):
+            return
+        now = time.monotonic()
+
+        average = self._window_total / self._window_count
+        self._baselines.append((now, average))
+        while self._baselines[0][0] < now - BASELINE_SECONDS:
+            self._baselines.popleft()
+        baseline = min(value for _, value in self._baselines)
+
+        if self._window_failed or average > baseline * LATENCY_TOLERANCE:
+            self.limit = max(self.config.minimum, self.limit * DECREASE_FACTOR)
+        elif self._window_saturated:
+            self.limit = min(self.config.maximum, self.limit + 1)
+        self._reset_window()
+
+    def stats(self):
+        baseline = min((value for _, value in self._baselines), default=None)
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "baseline_ms": None if baseline is None else round(baseline * 1000, 1),
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+limits = {name: AdaptiveLimit(name, config) for name, config in ROUTE_CLASSES.items()}
+
+def admission_statistics():
+    return {name: limit.stats() for name, limit in limits.items()}
+
+def max_concurrency() -> int:
+    """Requests all classes may run at once; the threadpool needs this many threads.
+
+    The heavy, write and read maxima together stay within DB_CONNECTIONS
+    (DB_POOL_SIZE + DB_MAX_OVERFLOW - OUTBOX_WORKERS), so admitted requests
+    do not queue on pool checkout; raise the pool to raise them.
+    """
+    return sum(config.maximum for config in ROUTE_CLASSES.values())
+
+BUSY_BODY = orjson.dumps({"detail": "Server busy, please retry"})
+
+class AdmissionMiddleware:
+    """ASGI middleware applying the class limits; sheds with 503 + Retry-After like the hashing pool"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_CONTROL:
+            return await self.app(scope, receive, send)
+        name = route_class(scope["method"], scope["path"])
+        if name is None:
+            return await self.app(scope, receive, send)
+
+        limit = limits[name]
+        if not await limit.acquire():
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(BUSY_BODY)).encode()),
+                    (b"retry-after", str(ADMISSION_RETRY_AFTER).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": BUSY_BODY})
+            return
+
+        status = 500
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            limit.release(time.perf_counter() - started, status >= 500)
@@ -0,0 +1,109 @@
+"""async def variants of the hot endpoints, served from the AsyncEngine.
+
+With ASYNC_ENDPOINTS=1, main.py swaps these in for the sync routes of
+the same path and method (replace_routes), so these paths stop occupying
+Starlette's threadpool and concurrency is bounded by the database pool
+instead. Handlers run the sync handlers' queries on the AsyncSession's
+connection through run_sync, which executes on the event loop: only
+small, bounded queries belong there. CPU-bound work (the NumPy health
+insights) goes to the threadpool, and routes that are mostly CPU (streak
+rebuilds, hydrating every journal entry) stay sync.
+"""
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, FastAPI, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import current_user_id, ensure_user
+from data_versions import user_etag_async
+from database import get_async_db
+from health_analytics import compute_insights, load_health_rows
+from health_rollups import rollup_metrics
+from json_responses import json_response, row_dicts
+import health_service
+import journal_service
+import micro_assessment_service
+import user_service
+from journal_service import JOURNAL_PAGE_SIZE, MAX_JOURNAL_PAGE_SIZE, JournalEntryCreate, JournalEntryResponse, JournalPage
+from micro_assessment_service import MicroAssessmentCreate, MicroAssessmentResponse
+from user_service import MoodSubmission
+
+router = APIRouter()
+
+def replace_routes(app: FastAPI):
+    """Serve these handlers in place of the sync routes with the same path and methods, so each path has one handler"""
+    replacements = {(route.path, frozenset(route.methods)): route for route in router.routes}
+    replaced = set()
+    routes = []
+    for route in app.router.routes:
+        key = (getattr(route, "path", None), frozenset(getattr(route, "methods", None) or ()))
+        if key in replacements:
+            route = replacements[key]
+            replaced.add(key)
+        routes.append(route)
+    missing = set(replacements) - replaced
+    if missing:
+        raise RuntimeError(f"Async routes without a sync counterpart: {sorted(path for path, _ in missing)}")
+    app.router.routes[:] = routes
+
+@router.get("/health-metrics/{user_id}")
+async def get_health_metrics(user_id: int, timeRange: str = '7d', db: AsyncSession = Depends(get_async_db), caller_id: Optional[int] = Depends(current_user_id)):
+    await db.run_sync(lambda session: ensure_user(session, user_id, caller_id))
+    time_delta, start_date, rollup_model = health_service.metrics_window(timeRange)
+
+    if rollup_model is not None:
+        data, stats = await db.run_sync(lambda session: rollup_metrics(session, user_id, start_date, rollup_model))
+        if stats["sample_count"]:
+            return await run_in_threadpool(
+                lambda: json_response(health_service.build_metrics_response(data, stats, time_delta))
+            )
+
+    # Only the query runs on the event loop; the insights and serialization are CPU-bound
+    rows = await db.run_sync(lambda session: load_health_rows(session, user_id, start_date))
+    return await run_in_threadpool(
+        lambda: json_response(health_service.build_metrics_response(row_dicts(rows), compute_insights(rows), time_delta))
+    )
+
+@router.post("/micro-assessment", response_model=MicroAssessmentResponse)
+async def create_micro_assessment(assessment: MicroAssessmentCreate, db: AsyncSession = Depends(get_async_db), caller_id: Optional[int] = Depends(current_user_id)):
+    return await db.run_sync(lambda session: micro_assessment_service.create_micro_assessment(assessment, session, caller_id))
+
+@router.get("/micro-assessment/{user_id}", response_model=List[MicroAssessmentResponse], dependencies=[Depends(user_etag_async)])
+async def get_micro_assessments(user_id: int, response: Response, limit: int = 10, db: AsyncSession = Depends(get_async_db), caller_id: Optional[int] = Depends(current_user_id)):
+    return await db.run_sync(lambda session: micro_assessment_service.get_micro_assessments(user_id, response, limit, session, caller_id))
+
+@router.get("/micro-assessment/latest/{user_id}", response_model=MicroAssessmentResponse, dependencies=[Depends(user_etag_async)])
+async def get_latest_micro_assessment(user_id: int, db: AsyncSession = Depends(get_async_db), caller_id: Optional[int] = Depends(current_user_id)):
+    return await db.run_sync(lambda session: micro_assessment_service.get_latest_micro_assessment(user_id, session, caller_id))
+
+@router.get("/micro-assessment/trend/{user_id}")
+async def get_micro_assessment_trend(user_id: int, days: int = 30, db: AsyncSession = Depends(get_async_db), caller_id: Optional[int] = Depends(current_user_id)):
+    return await db.run_sync(lambda session: micro_assessment_service.get_micro_assessment_trend(user_id, days, session, caller_id))
+
+@router.post("/mood")
+async def save_mood(mood_data: MoodSubmission, db: AsyncSession = Depends(get_async_db), caller_id: Optional[int] = Depends(current_user_id)):
+    return await db.run_sync(lambda session: user_service.save_mood(mood_data, session, caller_id))
+
+@router.get("/mood/{user_id}", dependencies=[Depends(user_etag_async)])
+async def get_latest_moods(user_id: int, response: Response, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: user_service.get_latest_moods(user_id, response, session))
+
+@router.post("/journal", response_model=JournalEntryResponse)
+async def create_journal_entry(entry: JournalEntryCreate, db: AsyncSession = Depends(get_async_db), caller_id: Optional[int] = Depends(current_user_id)):
+    return await db.run_sync(lambda session: journal_service.create_journal_entry(entry, session, caller_id))
+
+@router.get("/journal/{user_id}/entries", response_model=JournalPage, dependencies=[Depends(user_etag_async)])
+async def get_journal_page(
+    user_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(JOURNAL_PAGE_SIZE, ge=1, le=MAX_JOURNAL_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+    caller_id: Optional[int] = Depends(current_user_id)
+):
+    return await db.run_sync(lambda session: journal_service.get_journal_page(user_id, response, cursor, limit, session, caller_id))
+
+@router.get("/journal/entry/{entry_id}", response_model=JournalEntryResponse)
+async def get_journal_entry(entry_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: journal_service.get_journal_entry(entry_id, session))
@@ -1,40 +1,171 @@
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from database import get_db
+from database import SessionLocal
 from models import User
-from utils import hash_password, verify_password
+from utils import HashingPoolBusy, password_hasher
 
 router = APIRouter()
 
+# Session tokens: "<user_id>.<expires>.<signature>", HMAC-SHA256 over the first two parts
+# Every worker must share the key; only APP_ENV=dev may run with a random per-process one
+APP_ENV = os.getenv("APP_ENV", "production")
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+if not SESSION_SECRET and APP_ENV == "dev":
+    SESSION_SECRET = secrets.token_urlsafe(32)
+    print("SESSION_SECRET not set: using a random key, tokens only work on this process until it restarts")
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))  # seconds
+SESSION_CACHE_TTL = 60  # seconds a verified token is trusted without re-checking
+SESSION_CACHE_SIZE = 10000
+# Users allowed to read organization-wide analytics, comma-separated ids
+ADMIN_USER_IDS = {int(user_id) for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()}
+
+_token_cache = {}
+_token_cache_lock = threading.Lock()
+
+def check_session_secret():
+    """Server startup check; CLIs importing this module never sign tokens and run without the key"""
+    if not SESSION_SECRET:
+        raise RuntimeError("SESSION_SECRET is not set (set APP_ENV=dev to use a random key)")
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+def issue_token(user_id: int) -> str:
+    payload = f"{user_id}.{int(time.time()) + SESSION_TTL}"
+    return f"{payload}.{_sign(payload)}"
+
+def read_token(token: str) -> Optional[int]:
+    """User id of a valid, unexpired token, otherwise None"""
+    try:
+        user_id, expires, signature = token.split(".")
+        if not hmac.compare_digest(signature, _sign(f"{user_id}.{expires}")):
+            return None
+        if int(expires) < time.time():
+            return None
+        return int(user_id)
+    except ValueError:
+        return None
+
+def current_user_id(authorization: Optional[str] = Header(None)) -> Optional[int]:
+    """Caller's user id from an "Authorization: Bearer" token, resolved in memory.
+
+    None when no token is sent, so clients without one keep working.
+    """
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Invalid session token")
+
+    now = time.monotonic()
+    cached = _token_cache.get(token)
+    if cached and cached[1] > now:
+        return cached[0]
+
+    user_id = read_token(token)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired session token")
+
+    with _token_cache_lock:
+        if len(_token_cache) >= SESSION_CACHE_SIZE:
+            _token_cache.clear()
+        _token_cache[token] = (user_id, now + SESSION_CACHE_TTL)
+    return user_id
+
+def require_admin(caller_id: Optional[int] = Depends(current_user_id)) -> int:
+    """Dependency for admin-only endpoints: a token of one of ADMIN_USER_IDS"""
+    if caller_id is None:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if caller_id not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return caller_id
+
+def ensure_user(db: Session, user_id: int, caller_id: Optional[int], status_code: int = 404, detail: str = "User not found"):
+    """Check that user_id exists, without a query when it is the token's own user"""
+    if caller_id is not None:
+        if caller_id != user_id:
+            raise HTTPException(status_code=403, detail="Not allowed for this user")
+        return
+    
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(status_code=status_code, detail=detail)
+
+async def _hashing(fn, *args):
+    """Await a password_hasher call, turning a full queue into 503 + Retry-After"""
+    try:
+        return await fn(*args)
+    except HashingPoolBusy as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, please retry",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+# The password endpoints are async and reach the database through these, each on a short
+# session of its own in the threadpool, so no thread or connection is held while bcrypt runs
+def _load_user(*criteria):
+    with SessionLocal() as db:
+        return db.query(User.id, User.name, User.email, User.password).filter(*criteria).first()
+
+def _store_password(user_id: int, password_hash: str):
+    with SessionLocal() as db:
+        db.query(User).filter(User.id == user_id).update({"password": password_hash})
+        db.commit()
+
+def _add_user(name: str, email: str, password_hash: str) -> int:
+    with SessionLocal() as db:
+        new_user = User(name=name, email=email, password=password_hash)
+        db.add(new_user)
+        db.commit()
+        return new_user.id
+
 class RegisterRequest(BaseModel):
     name: str
     email: str
     password: str
 
 @router.post("/register")
-def register(user: RegisterRequest, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email == user.email).first():
+async def register(user: RegisterRequest):
+    if await run_in_threadpool(_load_user, User.email == user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    new_user = User(name=user.name, email=user.email, password=hash_password(user.password))
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    return {"message": "User registered", "user_id": new_user.id}
+    password_hash = await _hashing(password_hasher.hash, user.password)
+    user_id = await run_in_threadpool(_add_user, user.name, user.email, password_hash)
+    return {"message": "User registered", "user_id": user_id}
 
 class LoginRequest(BaseModel):
     email: str
     password: str
 
 @router.post("/login")
-def login(user: LoginRequest, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.password):
+async def login(user: LoginRequest):
+    db_user = await run_in_threadpool(_load_user, User.email == user.email)
+    if not db_user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    valid, new_hash = await _hashing(password_hasher.verify_and_update, user.password, db_user.password)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    
+    # Stored with a lower bcrypt cost: upgrade it now that we know the password
+    if new_hash:
+        await run_in_threadpool(_store_password, db_user.id, new_hash)
+    
     return {
         "message": "Login successful", 
+            "token": issue_token(db_user.id),
             "user": {
                 "id": db_user.id, 
                 "name": db_user.name, 
@@ -49,14 +180,15 @@ class PasswordUpdateRequest(BaseModel):
     new_password: str
 
 @router.put("/update-password")
-def update_password(data: PasswordUpdateRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == data.user_id).first()
+async def update_password(data: PasswordUpdateRequest):
+    user = await run_in_threadpool(_load_user, User.id == data.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    if not verify_password(data.current_password, user.password):
+    valid, _ = await _hashing(password_hasher.verify_and_update, data.current_password, user.password)
+    if not valid:
         raise HTTPException(status_code=401, detail="Current password is incorrect")
 
-    user.password = hash_password(data.new_password)
-    db.commit()
+    password_hash = await _hashing(password_hasher.hash, data.new_password)
+    await run_in_threadpool(_store_password, user.id, password_hash)
     return {"message": "Password updated successfully"}
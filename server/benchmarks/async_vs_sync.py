@@ -0,0 +1,78 @@
+"""Load comparison for the sync and async request paths.
+
+Start the server twice against the same database, once per mode:
+
+    ASYNC_ENDPOINTS=0 uvicorn main:app --port 8000 --workers 1
+    ASYNC_ENDPOINTS=1 uvicorn main:app --port 8000 --workers 1
+
+and run this against each (needs httpx: pip install httpx):
+
+    python benchmarks/async_vs_sync.py --url http://localhost:8000 --user-id 1 \\
+        --concurrency 10 50 200 --requests 2000
+
+Each round sends the requests round-robin over the async-capable read endpoints with
+a fixed number of requests in flight, and reports throughput and latency
+percentiles. The sync path flattens once concurrency exceeds the
+threadpool (40 threads); the async path is bounded by the DB pool.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+def endpoints(user_id):
+    # Only paths async_endpoints.replace_routes swaps; the others run the same handler in both modes
+    return [
+        f"/mood/{user_id}",
+        f"/micro-assessment/{user_id}",
+        f"/journal/{user_id}/entries",
+        f"/health-metrics/{user_id}?timeRange=7d",
+    ]
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+async def run_round(url, paths, concurrency, total):
+    latencies = []
+    errors = 0
+    next_request = 0
+
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def worker():
+            nonlocal next_request, errors
+            while next_request < total:
+                path = paths[next_request % len(paths)]
+                next_request += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code >= 500:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return total / elapsed, percentile(latencies, 0.5), percentile(latencies, 0.95), percentile(latencies, 0.99), errors
+
+async def main(args):
+    paths = endpoints(args.user_id)
+    print(f"{'concurrency':>11} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for concurrency in args.concurrency:
+        rps, p50, p95, p99, errors = await run_round(args.url, paths, concurrency, args.requests)
+        print(f"{concurrency:>11} {rps:>8.0f} {p50 * 1000:>8.1f} {p95 * 1000:>8.1f} {p99 * 1000:>8.1f} {errors:>7}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--requests", type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
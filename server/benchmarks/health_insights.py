@@ -0,0 +1,146 @@
+"""Benchmark: per-row Python insight loops vs. the NumPy engine in health_analytics.
+
+Usage (from server/): python benchmarks/health_insights.py [--db] [sizes...]
+
+--db also times the full read path against an in-memory SQLite database:
+ORM query + loops (before) vs. Core select + NumPy (after).
+"""
+import math
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from health_analytics import compute_insights, insights_from_columns, load_health_rows, to_columns
+from models import Base, HealthData, User
+
+Row = namedtuple("Row", "recorded_at heart_rate sleep_duration sleep_quality steps stress_level hrv")
+
+def make_rows(n, seed=7):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    step = timedelta(days=90) / n
+    maybe = lambda value: None if rng.random() < 0.1 else value
+    return [
+        Row(
+            start + step * i,
+            maybe(rng.randint(45, 120)),
+            maybe(rng.uniform(4, 9)),
+            maybe(rng.random()),
+            maybe(rng.randint(0, 2000)),
+            maybe(rng.random()),
+            maybe(rng.uniform(15, 110)),
+        )
+        for i in range(n)
+    ]
+
+def python_insights(rows):
+    """The original per-row implementation from get_health_metrics"""
+    def safe_average(values):
+        filtered = [v for v in values if v is not None]
+        return sum(filtered) / len(filtered) if filtered else None
+
+    heart_rates = [d.heart_rate for d in rows]
+    sleep_durations = [d.sleep_duration for d in rows]
+    stress_levels = [d.stress_level for d in rows]
+    hrvs = [d.hrv for d in rows]
+
+    daily_heart_rates = {}
+    for data in rows:
+        if data.heart_rate is None:
+            continue
+        daily_heart_rates.setdefault(data.recorded_at.date(), []).append(data.heart_rate)
+
+    resting_heart_rates = []
+    for rates in daily_heart_rates.values():
+        rates.sort()
+        resting_hr = sum(rates[:min(5, len(rates))]) / min(5, len(rates)) if rates else None
+        if resting_hr:
+            resting_heart_rates.append(resting_hr)
+    avg_resting_hr = sum(resting_heart_rates) / len(resting_heart_rates) if resting_heart_rates else None
+
+    sleep_consistency = None
+    if len(sleep_durations) > 3:
+        non_none_durations = [d for d in sleep_durations if d is not None]
+        if non_none_durations:
+            avg_sleep = sum(non_none_durations) / len(non_none_durations)
+            variance = sum((d - avg_sleep) ** 2 for d in non_none_durations) / len(non_none_durations)
+            sleep_consistency = max(0, 100 - (variance * 10))
+
+    return {
+        "average_heart_rate": safe_average(heart_rates),
+        "average_resting_heart_rate": avg_resting_hr,
+        "average_sleep": safe_average(sleep_durations),
+        "average_stress": safe_average(stress_levels),
+        "average_hrv": safe_average(hrvs),
+        "sleep_consistency": sleep_consistency,
+        "sample_count": len(rows),
+    }
+
+def best_of(fn, rows, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(rows)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+def bench_database(n):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[User.__table__, HealthData.__table__])
+    with Session(engine) as db:
+        db.execute(insert(User), [{"id": 1, "name": "bench", "email": "bench@example.com", "password": "x"}])
+        db.execute(insert(HealthData), [{"user_id": 1, **row._asdict()} for row in make_rows(n)])
+        db.commit()
+
+        start = datetime(2024, 12, 31)
+
+        def before(_):
+            db.expunge_all()  # measure hydration, not identity-map hits
+            health_data = db.query(HealthData).filter(
+                HealthData.user_id == 1,
+                HealthData.recorded_at >= start
+            ).order_by(HealthData.recorded_at.asc()).all()
+            return python_insights(health_data)
+
+        def after(_):
+            return compute_insights(load_health_rows(db, 1, start))
+
+        before_time, _ = best_of(before, None)
+        after_time, _ = best_of(after, None)
+    return before_time, after_time
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    with_db = "--db" in args
+    sizes = [int(arg) for arg in args if arg != "--db"] or [10_000, 100_000, 1_000_000]
+
+    print("rows -> insights: both sides start from fetched rows; arrays -> insights: NumPy math only")
+    print(f"{'samples':>10} {'python (ms)':>12} {'numpy (ms)':>12} {'speedup':>8} {'arrays (ms)':>12} {'speedup':>8}")
+    for n in sizes:
+        rows = make_rows(n)
+        columns = to_columns(rows)
+        python_time, expected = best_of(python_insights, rows)
+        numpy_time, actual = best_of(compute_insights, rows)
+        math_time, _ = best_of(lambda cols: insights_from_columns(cols, n), columns)
+        for key, value in expected.items():
+            assert (value is None and actual[key] is None) or math.isclose(value, actual[key], rel_tol=1e-9), key
+        print(
+            f"{n:>10} {python_time * 1000:>12.1f} {numpy_time * 1000:>12.1f} {python_time / numpy_time:>7.1f}x"
+            f" {math_time * 1000:>12.1f} {python_time / math_time:>7.1f}x"
+        )
+
+    if with_db:
+        print()
+        print("full read path (SQLite in memory): ORM + loops vs. Core select + NumPy")
+        print(f"{'samples':>10} {'before (ms)':>12} {'after (ms)':>12} {'speedup':>8}")
+        for n in sizes:
+            before_time, after_time = bench_database(n)
+            print(f"{n:>10} {before_time * 1000:>12.1f} {after_time * 1000:>12.1f} {before_time / after_time:>7.1f}x")
@@ -0,0 +1,130 @@
+"""Benchmark: storage saved vs. CPU per read for compressed journal text.
+
+Usage (from server/): python benchmarks/journal_compression.py [entries]
+
+Generates `entries` journal entries of mixed length (a short note up to a
+few thousand characters, with an AI analysis on most), then
+
+  codecs:  for each codec and threshold, bytes stored against plain UTF-8,
+           plus compress (write) and decompress (read) time per value
+  sqlite:  the same entries written to SQLite files with compression off
+           and with zlib; file size after VACUUM and the time to read
+           every entry in full through the ORM (both files also hold the
+           same FTS5 index)
+
+The corpus repeats a small pool of sentences, so it compresses better than
+real entries would; compare codecs and thresholds, not absolute ratios.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The service modules create their tables on import; keep that off the real database
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, event, insert, select, text
+from sqlalchemy.orm import Session
+
+import text_compression
+from models import Base, Journal, User
+
+SENTENCES = [
+    "The night shift ran long again and I barely had time to eat.",
+    "A patient's family thanked me today, which helped more than I expected.",
+    "I keep replaying a conversation with my supervisor about the rota.",
+    "Charting took most of the afternoon and I left an hour late.",
+    "Slept badly, woke up at four thinking about the handover.",
+    "My colleague covered for me so I could take a proper break.",
+    "I felt detached during rounds, like I was watching from outside.",
+    "Went for a run after work and my head felt clearer.",
+    "Three admissions in an hour; nobody had time to breathe.",
+    "I'm not sure I'm helping anyone when I'm this tired.",
+    "Talked to a friend outside medicine and it put things in perspective.",
+    "The new protocol adds paperwork without changing anything for patients.",
+]
+ANALYSIS = [
+    "The entry shows signs of emotional exhaustion linked to workload.",
+    "Positive coping strategies are present: exercise and social support.",
+    "Sleep disruption appears repeatedly and may amplify stress.",
+    "Some depersonalization is described; consider discussing it with a peer.",
+    "Recognition from patients is a protective factor worth noting.",
+]
+
+def corpus(entries, seed=7):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(entries):
+        sentences = rng.choice([2, 5, 15, 40])
+        content = " ".join(rng.choice(SENTENCES) for _ in range(sentences))
+        analysis = " ".join(rng.choice(ANALYSIS) for _ in range(rng.randint(3, 8))) if rng.random() < 0.8 else None
+        rows.append((f"Entry {i}", content, analysis))
+    return rows
+
+def per_value_us(fn, values, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for value in values:
+            fn(value)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(values) * 1e6
+
+def codec_table(rows):
+    values = [value for _, content, analysis in rows for value in (content, analysis) if value is not None]
+    plain_bytes = sum(len(value.encode()) for value in values)
+    codecs = [codec for codec in text_compression.CODEC_IDS if codec != "zstd" or text_compression.zstandard]
+
+    print(f"{len(values)} values, {plain_bytes / 1024:.0f} KiB of plain UTF-8")
+    print(f"{'codec':>6} {'threshold':>9} {'stored KiB':>10} {'saved':>6} {'write µs':>9} {'read µs':>8}")
+    for codec in codecs:
+        for threshold in (256, 512, 1024):
+            stored = [text_compression.compress_text(value, codec, threshold) for value in values]
+            stored_bytes = sum(len(value) if isinstance(value, bytes) else len(value.encode()) for value in stored)
+            write_us = per_value_us(lambda value: text_compression.compress_text(value, codec, threshold), values)
+            read_us = per_value_us(text_compression.plain_text, stored)
+            print(f"{codec:>6} {threshold:>9} {stored_bytes / 1024:>10.0f} {1 - stored_bytes / plain_bytes:>6.0%} "
+                  f"{write_us:>9.1f} {read_us:>8.1f}")
+
+def sqlite_file(rows, codec, path):
+    text_compression.COMPRESSION_CODEC = codec
+    engine = create_engine(f"sqlite:///{path}")
+    event.listen(engine, "connect", text_compression.register_sqlite_functions)
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        user = User(name="bench", email="bench@example.com", password="x")
+        db.add(user)
+        db.commit()
+        db.execute(insert(Journal), [
+            {"user_id": user.id, "title": title, "content": content, "analysis": analysis}
+            for title, content, analysis in rows
+        ])
+        db.commit()
+        db.execute(text("VACUUM"))
+
+        timings = []
+        for _ in range(3):
+            started = time.perf_counter()
+            for journal in db.scalars(select(Journal)):
+                journal.content, journal.analysis
+            db.expunge_all()
+            timings.append(time.perf_counter() - started)
+    engine.dispose()
+    return os.path.getsize(path), min(timings) * 1000
+
+def main(entries):
+    rows = corpus(entries)
+    codec_table(rows)
+
+    print()
+    print(f"{'sqlite':>6} {'file KiB':>9} {'read all ms':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for codec in ("off", "zlib"):
+            size, read_ms = sqlite_file(rows, codec, os.path.join(directory, f"{codec}.db"))
+            print(f"{codec:>6} {size / 1024:>9.0f} {read_ms:>12.1f}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
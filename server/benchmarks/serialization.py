@@ -0,0 +1,156 @@
+"""Benchmark: ORM hydration + jsonable_encoder vs. Core rows + response_model + orjson, per endpoint.
+
+Usage (from server/): python benchmarks/serialization.py [rows]
+
+Fills an in-memory SQLite database with one user holding `rows` completed
+tests, micro-assessments and health samples, then times each endpoint's
+handler plus response serialization, without HTTP:
+
+  before: ORM objects -> hand-built dicts -> jsonable_encoder -> json.dumps
+  after:  the current handler: Core rows -> dicts -> orjson (json_responses.json_response)
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The service modules create their tables on import; keep that off the real database
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+from sqlalchemy import insert
+
+import health_service
+import micro_assessment_service
+import mbi_test_service
+import user_service
+from database import SessionLocal
+from health_analytics import compute_insights
+from models import HealthData, MicroAssessment, Test, User
+
+def fill(db, rows):
+    user = User(name="bench", email="bench@example.com", password="x", age=40, specialty="GP", reasons="1,2,3")
+    db.add(user)
+    db.commit()
+
+    now = datetime.utcnow()
+    db.execute(insert(Test), [
+        {"user_id": user.id, "created_at": now - timedelta(minutes=i), "completed": True,
+         "emotional_exhaustion_score": i % 54, "emotional_exhaustion_level": "Moderate",
+         "depersonalization_score": i % 30, "depersonalization_level": "Low",
+         "personal_accomplishment_score": i % 48, "personal_accomplishment_level": "High",
+         "burnout_level": "Low"}
+        for i in range(rows)
+    ])
+    db.execute(insert(MicroAssessment), [
+        {"user_id": user.id, "created_at": now - timedelta(minutes=i), "fatigue_level": 3, "stress_level": 2,
+         "work_satisfaction": 4, "sleep_quality": 3, "support_feeling": 4, "comments": "ok", "burnout_risk_score": 5.5}
+        for i in range(rows)
+    ])
+    db.execute(insert(HealthData), [
+        {"user_id": user.id, "recorded_at": now - timedelta(days=6) + timedelta(seconds=i * 60), "heart_rate": 60 + i % 40,
+         "sleep_duration": 7.0, "sleep_quality": 0.8, "steps": i, "stress_level": 0.3, "hrv": 50.0}
+        for i in range(rows)
+    ])
+    db.commit()
+    return user.id
+
+# Handlers as they were before the Core projection, for comparison
+
+def tests_before(db, user_id):
+    tests = db.query(Test).filter(Test.user_id == user_id, Test.completed == True).order_by(Test.created_at.desc()).all()
+    return [
+        {
+            "id": test.id,
+            "created_at": test.created_at,
+            "emotional_exhaustion_score": test.emotional_exhaustion_score,
+            "emotional_exhaustion_level": test.emotional_exhaustion_level,
+            "depersonalization_score": test.depersonalization_score,
+            "depersonalization_level": test.depersonalization_level,
+            "personal_accomplishment_score": test.personal_accomplishment_score,
+            "personal_accomplishment_level": test.personal_accomplishment_level,
+            "burnout_level": test.burnout_level,
+        }
+        for test in tests
+    ]
+
+def micro_before(db, user_id, limit):
+    # Already had a response_model: ORM objects were validated by pydantic, then rendered with json.dumps
+    return db.query(MicroAssessment).filter(
+        MicroAssessment.user_id == user_id
+    ).order_by(MicroAssessment.created_at.desc()).limit(limit).all()
+
+def profile_before(db, user_id):
+    user = db.query(User).filter(User.id == user_id).first()
+    fields = {field: getattr(user, field) or None for field in user_service.PROFILE_FIELDS}
+    return {"id": user.id, "name": user.name, "email": user.email, **fields,
+            "reasons": [int(r) for r in user.reasons.split(",")] if user.reasons else None,
+            "created_at": user.created_at, "updated_at": user.updated_at}
+
+def health_before(db, user_id):
+    time_delta = timedelta(days=7)
+    rows = db.query(HealthData).filter(
+        HealthData.user_id == user_id, HealthData.recorded_at >= datetime.utcnow() - time_delta
+    ).order_by(HealthData.recorded_at.asc()).all()
+    data = [
+        {"timestamp": r.recorded_at, "heart_rate": r.heart_rate, "sleep_duration": r.sleep_duration,
+         "sleep_quality": r.sleep_quality, "steps": r.steps, "stress_level": r.stress_level, "hrv": r.hrv}
+        for r in rows
+    ]
+    stats = compute_insights([tuple(d.values()) for d in data])
+    return health_service.build_metrics_response(data, stats, time_delta)
+
+loop = asyncio.new_event_loop()
+
+def render_before(content, route_path=None, router=None):
+    """What FastAPI did with the handler's return value: response_model serialization
+    when the route had one, jsonable_encoder otherwise, then json.dumps"""
+    if router is None:
+        return JSONResponse(jsonable_encoder(content)).body
+    route = next(r for r in router.routes if isinstance(r, APIRoute) and r.path == route_path)
+    return JSONResponse(loop.run_until_complete(serialize_response(field=route.response_field, response_content=content))).body
+
+def best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+def main(rows):
+    db = SessionLocal()
+    user_id = fill(db, rows)
+
+    endpoints = [
+        ("/tests/{user_id}",
+         lambda: render_before(tests_before(db, user_id)),
+         lambda: mbi_test_service.get_tests_by_user(user_id, None, db, user_id).body),
+        ("/micro-assessment/{user_id}",
+         lambda: render_before(micro_before(db, user_id, rows), "/micro-assessment/{user_id}", micro_assessment_service.router),
+         lambda: micro_assessment_service.get_micro_assessments(user_id, None, rows, db, user_id).body),
+        ("/user-profile/{user_id}",
+         lambda: render_before(profile_before(db, user_id)),
+         lambda: user_service.get_user_profile(user_id, None, db).body),
+        ("/health-metrics/{user_id}",
+         lambda: render_before(health_before(db, user_id)),
+         lambda: health_service.get_health_metrics(user_id, "7d", db, user_id).body),
+    ]
+
+    print(f"{rows} rows per list")
+    print(f"{'endpoint':>28} {'before ms':>10} {'after ms':>9} {'speedup':>8}")
+    for path, before, after in endpoints:
+        # Same payload both ways, up to JSON formatting
+        assert json.loads(before()) == json.loads(after()), path
+        before_ms, after_ms = best_of(before), best_of(after)
+        print(f"{path:>28} {before_ms:>10.2f} {after_ms:>9.2f} {before_ms / after_ms:>7.1f}x")
+
+    db.close()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
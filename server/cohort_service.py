@@ -0,0 +1,129 @@
+import os
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from auth import require_admin
+from cohort_stats import SUM_COLUMNS, week_start
+from database import get_db
+from models import CohortWeeklyStat
+from models.cohort import ALL_USERS, COHORT_DIMENSIONS, SUBSCALES
+
+router = APIRouter()
+
+BURNOUT_LEVELS = ("Low", "Moderate", "High")
+DEFAULT_COHORT_WEEKS = 12
+# Cohort weeks with fewer tests than this are left out, so no individual's results can be singled out.
+# Suppression is per fixed week, and range totals only add up published weeks, so no difference
+# of two responses reveals a suppressed week.
+COHORT_MIN_SIZE = int(os.getenv("COHORT_MIN_SIZE", "5"))
+
+class SubscaleSummary(BaseModel):
+    mean: float
+    stddev: float
+
+class CohortPeriod(BaseModel):
+    cohort: str
+    week_start: Optional[date] = None  # null when the range is not broken down by week
+    tests: int
+    burnout_levels: Dict[str, int]
+    emotional_exhaustion: SubscaleSummary
+    depersonalization: SubscaleSummary
+    personal_accomplishment: SubscaleSummary
+
+class CohortReport(BaseModel):
+    dimension: str
+    start: date
+    end: date
+    min_cohort_size: int
+    cohorts: List[CohortPeriod]
+    suppressed: int  # cohort weeks left out for having fewer than min_cohort_size tests
+
+def _subscale(sums, subscale: str, tests: int):
+    mean = sums[f"{subscale}_sum"] / tests
+    variance = max(0.0, sums[f"{subscale}_sum_sq"] / tests - mean ** 2)
+    return {"mean": round(mean, 2), "stddev": round(variance ** 0.5, 2)}
+
+@router.get("/cohorts/burnout", response_model=CohortReport)
+def get_cohort_burnout(
+    dimension: str = ALL_USERS,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    weekly: bool = True,
+    db: Session = Depends(get_db),
+    _admin: int = Depends(require_admin)
+):
+    """Burnout level distribution and MBI subscale scores of completed tests, per cohort of `dimension`.
+
+    Read from the weekly pre-aggregates, so the cost depends on the number of
+    cohorts and weeks, not on the number of users or tests. The range defaults
+    to the last 12 weeks and covers whole weeks; `weekly=false` gives one figure
+    per cohort, summed over its published weeks. Admins only.
+    """
+    if dimension != ALL_USERS and dimension not in COHORT_DIMENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown cohort dimension: use {ALL_USERS}, {', '.join(COHORT_DIMENSIONS)}"
+        )
+    end = end or date.today()
+    start = week_start(start) if start else week_start(end) - timedelta(weeks=DEFAULT_COHORT_WEEKS - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+
+    group = [CohortWeeklyStat.cohort, CohortWeeklyStat.week_start]
+    rows = db.execute(
+        select(*group, CohortWeeklyStat.burnout_level,
+               *(func.sum(getattr(CohortWeeklyStat, column)).label(column) for column in SUM_COLUMNS))
+        .where(
+            CohortWeeklyStat.dimension == dimension,
+            CohortWeeklyStat.week_start >= start,
+            CohortWeeklyStat.week_start <= end,
+        )
+        .group_by(*group, CohortWeeklyStat.burnout_level)
+    ).all()
+
+    weeks = {}
+    for row in rows:
+        week = weeks.setdefault((row.cohort, row.week_start), {"levels": {}, "sums": dict.fromkeys(SUM_COLUMNS, 0)})
+        week["levels"][row.burnout_level] = week["levels"].get(row.burnout_level, 0) + int(row.test_count)
+        for column in SUM_COLUMNS:
+            week["sums"][column] += int(getattr(row, column))
+
+    periods = {}
+    suppressed = 0
+    for (cohort, week_of), week in weeks.items():
+        if week["sums"]["test_count"] < COHORT_MIN_SIZE:
+            suppressed += 1
+            continue
+        period = periods.setdefault(
+            (cohort, week_of if weekly else None),
+            {"levels": dict.fromkeys(BURNOUT_LEVELS, 0), "sums": dict.fromkeys(SUM_COLUMNS, 0)}
+        )
+        for level, count in week["levels"].items():
+            period["levels"][level] = period["levels"].get(level, 0) + count
+        for column in SUM_COLUMNS:
+            period["sums"][column] += week["sums"][column]
+
+    cohorts = []
+    for (cohort, week), period in sorted(periods.items(), key=lambda item: (item[0][1] or start, item[0][0])):
+        tests = period["sums"]["test_count"]
+        cohorts.append({
+            "cohort": cohort,
+            "week_start": week,
+            "tests": tests,
+            "burnout_levels": period["levels"],
+            **{subscale: _subscale(period["sums"], subscale, tests) for subscale in SUBSCALES},
+        })
+
+    return {
+        "dimension": dimension,
+        "start": start,
+        "end": end,
+        "min_cohort_size": COHORT_MIN_SIZE,
+        "cohorts": cohorts,
+        "suppressed": suppressed,
+    }
@@ -0,0 +1,148 @@
+"""Weekly cohort aggregates of completed MBI tests.
+
+record_test_results handles submit_test's "test.completed" outbox events,
+adding each test to its week's row for every cohort the user belongs to.
+Tests are attributed to the cohorts of the user's profile when the event
+is processed; after bulk profile changes, or to fill the table from
+existing tests, rebuild it:
+
+    python cohort_stats.py rebuild [--chunk-size N]
+
+tests.cohort_counted marks the tests already counted, and the rebuild
+locks the table against the handler (on SQLite, the database write lock
+does), so each test is counted once however they interleave. The rebuild
+runs in one transaction: readers see the old table until it commits.
+"""
+import argparse
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, dialect_insert
+from models import CohortWeeklyStat, Test, User, create_tables
+from models.cohort import ALL_USERS, COHORT_DIMENSIONS, SUBSCALES, UNKNOWN_COHORT
+
+REBUILD_CHUNK_SIZE = 5000
+SUM_COLUMNS = ["test_count"] + [f"{subscale}{suffix}" for subscale in SUBSCALES for suffix in ("_sum", "_sum_sq")]
+
+def week_start(value) -> date:
+    """Monday of the week of a date or datetime"""
+    day = value.date() if isinstance(value, datetime) else value
+    return day - timedelta(days=day.weekday())
+
+def cohorts_of(profile):
+    """(dimension, cohort) pairs a user with this profile row counts towards"""
+    return [(ALL_USERS, ALL_USERS)] + [
+        (dimension, getattr(profile, dimension) or UNKNOWN_COHORT) for dimension in COHORT_DIMENSIONS
+    ]
+
+def _add(aggregates, profile, created_at: datetime, result):
+    """Count one test; `result` maps burnout_level and the subscale scores"""
+    key_tail = (week_start(created_at), result["burnout_level"])
+    for dimension, cohort in cohorts_of(profile):
+        sums = aggregates.setdefault((dimension, cohort) + key_tail, dict.fromkeys(SUM_COLUMNS, 0))
+        sums["test_count"] += 1
+        for subscale in SUBSCALES:
+            score = result[f"{subscale}_score"] or 0
+            sums[f"{subscale}_sum"] += score
+            sums[f"{subscale}_sum_sq"] += score * score
+
+def _upsert(db: Session, aggregates):
+    """Add the aggregates onto the stored rows"""
+    if not aggregates:
+        return
+    table = CohortWeeklyStat.__table__
+    insert = dialect_insert(db, CohortWeeklyStat)
+    db.execute(insert.on_conflict_do_update(
+        index_elements=["dimension", "week_start", "cohort", "burnout_level"],
+        set_={column: table.c[column] + insert.excluded[column] for column in SUM_COLUMNS},
+    ), [
+        # Sorted, so concurrent submissions take the row locks in the same order
+        {"dimension": dimension, "cohort": cohort, "week_start": week, "burnout_level": level, **sums}
+        for (dimension, cohort, week, level), sums in sorted(aggregates.items())
+    ])
+
+def _lock_table(db: Session, mode: str):
+    # Handlers share ROW EXCLUSIVE; a rebuild's EXCLUSIVE waits for them and holds new ones back
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text(f"LOCK TABLE cohort_weekly_stats IN {mode} MODE"))
+
+def record_test_results(db: Session, payloads):
+    """Outbox handler: count newly completed tests in their users' cohorts.
+
+    Each payload carries user_id, test_id, an ISO created_at, burnout_level and the subscale scores.
+    """
+    _lock_table(db, "ROW EXCLUSIVE")
+    test_ids = [payload["test_id"] for payload in payloads]
+    claimed = set(db.scalars(
+        update(Test).where(Test.id.in_(test_ids), Test.cohort_counted == False)
+        .values(cohort_counted=True).returning(Test.id)
+    ))
+    payloads = [payload for payload in payloads if payload["test_id"] in claimed]
+
+    user_ids = {payload["user_id"] for payload in payloads}
+    profiles = {
+        row.id: row for row in db.execute(
+            select(User.id, *(User.__table__.c[dimension] for dimension in COHORT_DIMENSIONS))
+            .where(User.id.in_(user_ids))
+        )
+    }
+    aggregates = {}
+    for payload in payloads:
+        profile = profiles.get(payload["user_id"])
+        if profile is not None:  # the user was deleted since
+            _add(aggregates, profile, datetime.fromisoformat(payload["created_at"]), payload)
+    _upsert(db, aggregates)
+
+def rebuild_cohort_stats(db: Session, chunk_size: int = REBUILD_CHUNK_SIZE):
+    """Recompute the table from completed tests in one transaction, reading chunk_size tests at a time"""
+    _lock_table(db, "EXCLUSIVE")
+    # Deleting first also takes SQLite's write lock before the tests are read
+    db.execute(delete(CohortWeeklyStat))
+
+    columns = [Test.id, Test.created_at, Test.burnout_level] + [
+        getattr(Test, f"{subscale}_score") for subscale in SUBSCALES
+    ] + [getattr(User, dimension) for dimension in COHORT_DIMENSIONS]
+    last_id = 0
+    processed = 0
+    while True:
+        rows = db.execute(
+            select(*columns)
+            .join(User, User.id == Test.user_id)
+            .where(Test.id > last_id, Test.completed == True, Test.created_at.isnot(None))
+            .order_by(Test.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+
+        aggregates = {}
+        for row in rows:
+            _add(aggregates, row, row.created_at, row._mapping)
+        _upsert(db, aggregates)
+        db.execute(
+            update(Test).where(Test.id.in_([row.id for row in rows]), Test.cohort_counted == False)
+            .values(cohort_counted=True)
+        )
+
+        last_id = rows[-1].id
+        processed += len(rows)
+        print(f"  {processed} tests aggregated")
+
+    db.commit()
+    return processed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cohort analytics maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--chunk-size", type=int, default=REBUILD_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        total = rebuild_cohort_stats(db, args.chunk_size)
+        print(f"✅ Cohort stats rebuilt from {total} tests")
+    finally:
+        db.close()
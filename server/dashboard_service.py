@@ -0,0 +1,66 @@
+import logging
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from auth import current_user_id, ensure_user
+from database import get_db
+from json_responses import json_response
+from metrics import count_handled_error
+from micro_assessment_service import MicroAssessmentResponse, recent_micro_assessments
+from mbi_test_service import TestSummary, completed_test_summaries
+from streak_service import StreakResponse, get_user_streaks
+from user_service import MoodEntry, latest_moods
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Each section reuses its endpoint's query; the user was already checked once,
+# so the streak handler gets user_id as the caller and skips its own lookup
+DASHBOARD_SECTIONS = {
+    "moods": lambda db, user_id: latest_moods(db, user_id),
+    "tests": lambda db, user_id: completed_test_summaries(db, user_id),
+    "micro_assessments": lambda db, user_id: recent_micro_assessments(db, user_id, 10),
+    "streaks": lambda db, user_id: get_user_streaks(user_id, db, user_id),
+}
+
+class DashboardResponse(BaseModel):
+    moods: Optional[List[MoodEntry]] = None
+    tests: Optional[List[TestSummary]] = None
+    micro_assessments: Optional[List[MicroAssessmentResponse]] = None
+    streaks: Optional[StreakResponse] = None
+    errors: Optional[List[str]] = None  # sections that failed to load; they are null
+
+# Sections left out by `fields` are omitted from the response
+@router.get("/dashboard/{user_id}", response_model=DashboardResponse, response_model_exclude_unset=True)
+def get_dashboard(user_id: int, fields: Optional[str] = None, db: Session = Depends(get_db),
+                  caller_id: Optional[int] = Depends(current_user_id)):
+    """Profile screen data in one response: the /mood, /tests, /micro-assessment and /streaks payloads.
+
+    `fields` is a comma-separated subset of the sections; all of them by default.
+    The sections share one session, one query each. A failing section comes
+    back null and is listed in `errors`, so the others still render.
+    """
+    sections = list(DASHBOARD_SECTIONS) if not fields else [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [section for section in sections if section not in DASHBOARD_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown dashboard fields: {', '.join(unknown)}")
+
+    ensure_user(db, user_id, caller_id)
+
+    result = {}
+    errors = []
+    for section in sections:
+        try:
+            result[section] = DASHBOARD_SECTIONS[section](db, user_id)
+        except Exception:
+            logger.exception("Dashboard section %s failed for user %s", section, user_id)
+            count_handled_error(f"dashboard.{section}")
+            db.rollback()
+            result[section] = None
+            errors.append(section)
+    if errors:
+        result["errors"] = errors
+    return json_response(result)
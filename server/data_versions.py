@@ -0,0 +1,82 @@
+"""Per-user data versions and conditional GETs built on them.
+
+Every write path calls bump_data_version() in its own transaction, so a
+user's version changes whenever anything the read endpoints return does.
+GET endpoints add `dependencies=[Depends(user_etag)]`: the ETag is derived
+from the version alone, so a matching If-None-Match is answered with 304
+after the caller check and a single primary-key lookup, before the
+handler queries anything.
+Fixed content such as the MBI questions uses immutable_resource() instead.
+"""
+import hashlib
+import json
+from datetime import datetime
+
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from auth import current_user_id, ensure_user
+from database import dialect_insert, get_async_db, get_db
+from models import UserDataVersion
+
+def bump_data_version(db: Session, user_id: int):
+    """Increment the user's data version inside the caller's transaction"""
+    bump_data_versions(db, [user_id])
+
+def bump_data_versions(db: Session, user_ids):
+    """bump_data_version for many users in one statement (batch jobs)"""
+    if not user_ids:
+        return
+    now = datetime.utcnow()
+    # Sorted, so concurrent batches take the row locks in the same order
+    upsert = dialect_insert(db, UserDataVersion).values([
+        {"user_id": user_id, "version": 1, "updated_at": now} for user_id in sorted(user_ids)
+    ])
+    db.execute(upsert.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={"version": UserDataVersion.version + 1, "updated_at": upsert.excluded.updated_at}
+    ))
+
+def get_data_version(db: Session, user_id: int) -> int:
+    version = db.query(UserDataVersion.version).filter(UserDataVersion.user_id == user_id).scalar()
+    return version or 0
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))
+
+def _check_etag(db: Session, user_id: int, caller_id: Optional[int], request: Request, response: Response):
+    # A 304 must not confirm a user, or another user's data, that the handler would refuse
+    if request.headers.get("if-none-match"):
+        ensure_user(db, user_id, caller_id)
+    etag = f'W/"{user_id}.{get_data_version(db, user_id)}"'
+    # no-cache: clients may store the body but must revalidate it every time
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+def user_etag(user_id: int, request: Request, response: Response, db: Session = Depends(get_db),
+              caller_id: Optional[int] = Depends(current_user_id)):
+    _check_etag(db, user_id, caller_id, request, response)
+
+async def user_etag_async(user_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_async_db),
+                          caller_id: Optional[int] = Depends(current_user_id)):
+    await db.run_sync(lambda session: _check_etag(session, user_id, caller_id, request, response))
+
+def immutable_resource(content):
+    """Dependency for endpoints serving fixed content: long-lived immutable caching plus a content ETag"""
+    etag = '"' + hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()[:16] + '"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+
+    def check(request: Request, response: Response):
+        if etag_matches(request, etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    return check
@@ -1,12 +1,51 @@
 import os
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
+from metrics import instrument_engine
+from pool_stats import InstrumentedAsyncQueuePool, InstrumentedNullPool, InstrumentedQueuePool
+from text_compression import register_sqlite_functions
+
 # Database Connection
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://myuser:mypassword@db:5432/burnout_db")
 
-engine = create_engine(DATABASE_URL)
+# Pool settings (per engine, i.e. per uvicorn worker)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))  # seconds, -1 = never
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "0") == "1"
+# Behind PgBouncer (transaction pooling): no client-side pool, no prepared statements
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") == "1"
+
+def _engine_options(url, queue_pool_class):
+    options = {"pool_pre_ping": DB_POOL_PRE_PING}
+    if DB_PGBOUNCER:
+        options["poolclass"] = InstrumentedNullPool
+        if "+asyncpg" in url:
+            options["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+    elif not url.startswith("sqlite"):
+        options.update(
+            poolclass=queue_pool_class,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    return options
+
+def _on_connect(bound):
+    # Per-request statement counts and DB time (see metrics)
+    instrument_engine(bound)
+    # SQL functions the journal search triggers rely on (see text_compression)
+    if bound.dialect.name == "sqlite":
+        event.listen(bound, "connect", register_sqlite_functions)
+    return bound
+
+engine = _on_connect(create_engine(DATABASE_URL, **_engine_options(DATABASE_URL, InstrumentedQueuePool)))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -17,3 +56,54 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Async engine for the async endpoints, on the async driver for the same database
+def _async_url(url):
+    for sync_prefix, async_prefix in (("postgresql://", "postgresql+asyncpg://"), ("sqlite://", "sqlite+aiosqlite://")):
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+
+# Created on first use so deployments without the async driver can still import this module
+_async_engine = None
+_async_session_factory = None
+
+def get_async_engine():
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL, InstrumentedAsyncQueuePool)
+        )
+        _on_connect(_async_engine.sync_engine)
+        _async_session_factory = async_sessionmaker(
+            _async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+    return _async_engine
+
+def AsyncSessionLocal() -> AsyncSession:
+    get_async_engine()
+    return _async_session_factory()
+
+# Dependency for async DB session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def pool_statistics():
+    engines = {"sync": engine, "async": _async_engine}
+    return {
+        name: getattr(bound.pool, "describe", bound.pool.status)() if bound is not None else None
+        for name, bound in engines.items()
+    }
+
+async def dispose_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+# INSERT construct with ON CONFLICT support for the session's dialect
+def dialect_insert(db, table):
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
@@ -0,0 +1,150 @@
+"""Nightly engagement report: streaks and check-ins for every user in one pass.
+
+Usage: python engagement_report.py [--date YYYY-MM-DD] [--chunk-size N]
+
+Users are processed in id-ordered chunks. For each chunk the distinct
+(user_id, day) pairs are pulled from moods, completed tests and
+micro-assessments with a single UNION, and the streak figures are computed
+over the sorted arrays with NumPy. Results are upserted into
+engagement_snapshots, so memory stays bounded by the chunk size and a
+rerun for the same date overwrites that date's rows.
+"""
+import argparse
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, select, union
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, dialect_insert
+from models import User, Test, Mood, MicroAssessment, EngagementSnapshot, create_tables
+
+DEFAULT_CHUNK_SIZE = 5000
+
+def compute_streaks(user_ids, days, today: int):
+    """Vectorized equivalent of get_user_streaks for many users at once.
+
+    user_ids and days are equal-length int64 arrays sorted by (user_id, day),
+    without duplicate pairs; days and today are day numbers (days since epoch).
+    Returns (users, current_streak, longest_streak, weekly_checkins, last_day),
+    one entry per distinct user.
+    """
+    n = len(days)
+    if n == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty, empty
+
+    new_user = np.ones(n, dtype=bool)
+    new_user[1:] = user_ids[1:] != user_ids[:-1]
+    new_run = new_user.copy()
+    new_run[1:] |= (days[1:] - days[:-1]) != 1
+
+    run_starts = np.flatnonzero(new_run)
+    run_lengths = np.diff(np.append(run_starts, n))
+    run_index = np.cumsum(new_run) - 1
+
+    user_starts = np.flatnonzero(new_user)
+    user_ends = np.append(user_starts[1:], n) - 1
+
+    # Same rules as calculate_longest_streak / count_weekly_checkins
+    longest = np.maximum.reduceat(run_lengths, run_index[user_starts])
+    weekly = np.add.reduceat((days >= today - 7).astype(np.int64), user_starts)
+
+    # The last run only counts as current if it reaches today or yesterday
+    last_day = days[user_ends]
+    current = np.where(last_day >= today - 1, run_lengths[run_index[user_ends]], 0)
+
+    return user_ids[user_starts], current, longest, weekly, last_day
+
+def _activity_pairs(db: Session, first_id: int, last_id: int, until: datetime):
+    def day_select(model, *criteria):
+        return select(model.user_id, func.date(model.created_at).label("day")).where(
+            model.user_id.between(first_id, last_id), model.created_at < until, *criteria
+        )
+
+    pairs = union(
+        day_select(Mood),
+        day_select(Test, Test.completed == True),
+        day_select(MicroAssessment),
+    ).subquery()
+    rows = db.execute(select(pairs.c.user_id, pairs.c.day).order_by(pairs.c.user_id, pairs.c.day)).all()
+
+    user_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    # date objects (Postgres) and ISO strings (SQLite) both convert to datetime64[D]
+    days = np.array([row[1] for row in rows], dtype="datetime64[D]").astype(np.int64)
+    return user_ids, days
+
+def _completed_tests(db: Session, first_id: int, last_id: int, until: datetime):
+    return dict(db.execute(
+        select(Test.user_id, func.count(Test.id))
+        .where(Test.user_id.between(first_id, last_id), Test.completed == True, Test.created_at < until)
+        .group_by(Test.user_id)
+    ).all())
+
+def run_report(db: Session, report_date: date, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    today = (report_date - date(1970, 1, 1)).days
+    # Activity after the report date is left out, so past dates can be recomputed
+    until = datetime.combine(report_date + timedelta(days=1), datetime.min.time())
+    computed_at = datetime.utcnow()
+    last_seen = 0
+    processed = 0
+    started = time.perf_counter()
+
+    while True:
+        chunk = [row[0] for row in db.execute(
+            select(User.id).where(User.id > last_seen).order_by(User.id).limit(chunk_size)
+        )]
+        if not chunk:
+            break
+        first_id, last_id = chunk[0], chunk[-1]
+
+        users, current, longest, weekly, last_day = compute_streaks(
+            *_activity_pairs(db, first_id, last_id, until), today
+        )
+        stats = {
+            int(uid): (int(cur), int(lng), int(wk), date(1970, 1, 1) + timedelta(days=int(last)))
+            for uid, cur, lng, wk, last in zip(users, current, longest, weekly, last_day)
+        }
+        totals = _completed_tests(db, first_id, last_id, until)
+
+        rows = []
+        for uid in chunk:
+            cur, lng, wk, last = stats.get(uid, (0, 0, 0, None))
+            rows.append({
+                "report_date": report_date,
+                "user_id": uid,
+                "current_streak": cur,
+                "longest_streak": lng,
+                "weekly_checkins": wk,
+                "total_assessments": totals.get(uid, 0),
+                "last_activity": last,
+                "computed_at": computed_at,
+            })
+
+        insert = dialect_insert(db, EngagementSnapshot)
+        db.execute(insert.on_conflict_do_update(
+            index_elements=["report_date", "user_id"],
+            set_={name: insert.excluded[name] for name in rows[0] if name not in ("report_date", "user_id")},
+        ), rows)
+        db.commit()
+
+        processed += len(chunk)
+        last_seen = last_id
+        print(f"  {processed} users processed ({time.perf_counter() - started:.1f}s)")
+
+    return processed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute the nightly engagement report")
+    parser.add_argument("--date", type=date.fromisoformat, default=datetime.utcnow().date())
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        total = run_report(db, args.date, args.chunk_size)
+        print(f"✅ Engagement report for {args.date.isoformat()} written for {total} users")
+    finally:
+        db.close()
@@ -0,0 +1,180 @@
+"""Vectorized health insights over a window of raw samples.
+
+Samples are loaded with a Core select (no ORM objects) and the insight
+math runs on NumPy column arrays, giving the same figures as the per-row
+loops it replaces up to floating point summation order.
+"""
+from datetime import datetime
+from operator import itemgetter
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import HealthData
+
+RESTING_HR_READINGS = 5
+
+def health_rows_select(user_id: int, start_date: datetime):
+    """Raw samples for the window as rows shaped like the metrics `data` items"""
+    return (
+        select(
+            HealthData.recorded_at.label("timestamp"),
+            HealthData.heart_rate,
+            HealthData.sleep_duration,
+            HealthData.sleep_quality,
+            HealthData.steps,
+            HealthData.stress_level,
+            HealthData.hrv,
+        )
+        .where(HealthData.user_id == user_id, HealthData.recorded_at >= start_date)
+        .order_by(HealthData.recorded_at.asc())
+    )
+
+def load_health_rows(db: Session, user_id: int, start_date: datetime):
+    return db.execute(health_rows_select(user_id, start_date)).all()
+
+def to_columns(rows):
+    """Column arrays for the metrics used by the insights; missing values become NaN.
+
+    Timestamps are reduced to day numbers (proleptic ordinals), which is all the insights need.
+    """
+    def column(index):
+        return np.array(list(map(itemgetter(index), rows)), dtype=float)
+
+    return {
+        "day": np.fromiter(map(datetime.toordinal, map(itemgetter(0), rows)), dtype=np.int64, count=len(rows)),
+        "heart_rate": column(1),
+        "sleep_duration": column(2),
+        "stress_level": column(5),
+        "hrv": column(6),
+    }
+
+def _mean(values):
+    present = values[~np.isnan(values)]
+    return float(present.mean()) if present.size else None
+
+def _daily_lowest(days, heart_rates):
+    """Each day's lowest readings: (unique days, day index per kept reading, kept readings)"""
+    present = ~np.isnan(heart_rates)
+
+    days, rates = days[present], heart_rates[present]
+    # By day, then by rate within the day
+    order = np.lexsort((rates, days))
+    days, rates = days[order], rates[order]
+
+    new_day = np.ones(days.size, dtype=bool)
+    new_day[1:] = days[1:] != days[:-1]
+    day_index = np.cumsum(new_day) - 1
+    rank = np.arange(days.size) - np.flatnonzero(new_day)[day_index]
+
+    lowest = rank < RESTING_HR_READINGS
+    return days[new_day], day_index[lowest], rates[lowest]
+
+def _resting_average(daily):
+    daily = daily[daily != 0]
+    return float(daily.mean()) if daily.size else None
+
+def resting_heart_rate(days, heart_rates):
+    """Average over days of each day's mean of its lowest readings"""
+    _, day_index, rates = _daily_lowest(days, heart_rates)
+    if not rates.size:
+        return None
+
+    return _resting_average(np.bincount(day_index, weights=rates) / np.bincount(day_index))
+
+def sleep_consistency(sleep_durations):
+    if sleep_durations.size <= 3:
+        return None
+
+    present = sleep_durations[~np.isnan(sleep_durations)]
+    if not present.size:
+        return None
+
+    # Lower variance = higher consistency, scale to 0-100
+    return max(0, 100 - (float(present.var()) * 10))
+
+def insights_from_columns(columns, sample_count: int):
+    return {
+        "average_heart_rate": _mean(columns["heart_rate"]),
+        "average_resting_heart_rate": resting_heart_rate(columns["day"], columns["heart_rate"]),
+        "average_sleep": _mean(columns["sleep_duration"]),
+        "average_stress": _mean(columns["stress_level"]),
+        "average_hrv": _mean(columns["hrv"]),
+        "sleep_consistency": sleep_consistency(columns["sleep_duration"]),
+        "sample_count": sample_count,
+    }
+
+def compute_insights(rows):
+    """Aggregate statistics for build_metrics_response from load_health_rows output"""
+    return insights_from_columns(to_columns(rows), len(rows))
+
+class InsightAccumulator:
+    """compute_insights over rows that arrive in chunks, in memory independent of the row count.
+
+    Keeps running sums per metric, a mergeable mean/M2 pair for sleep variance
+    and the lowest heart-rate readings per day seen so far.
+    """
+
+    AVERAGED = ("heart_rate", "sleep_duration", "stress_level", "hrv")
+
+    def __init__(self):
+        self.sample_count = 0
+        self.counts = dict.fromkeys(self.AVERAGED, 0)
+        self.sums = dict.fromkeys(self.AVERAGED, 0.0)
+        self.sleep_mean = 0.0
+        self.sleep_m2 = 0.0
+        self.daily_lowest = {}
+
+    def add(self, rows):
+        if not rows:
+            return
+        columns = to_columns(rows)
+        self.sample_count += len(rows)
+
+        for metric in self.AVERAGED:
+            values = columns[metric]
+            present = values[~np.isnan(values)]
+            if metric == "sleep_duration" and present.size:
+                self._merge_sleep(present)
+            self.counts[metric] += present.size
+            self.sums[metric] += float(present.sum())
+
+        unique_days, day_index, rates = _daily_lowest(columns["day"], columns["heart_rate"])
+        for i, readings in enumerate(np.split(rates, np.flatnonzero(np.diff(day_index)) + 1)):
+            if not readings.size:
+                continue
+            day = int(unique_days[i])
+            if day in self.daily_lowest:
+                readings = np.sort(np.concatenate((self.daily_lowest[day], readings)))[:RESTING_HR_READINGS]
+            self.daily_lowest[day] = readings
+
+    def _merge_sleep(self, values):
+        # Chan et al. pairwise update of mean and sum of squared deviations
+        count = self.counts["sleep_duration"]
+        chunk_mean = float(values.mean())
+        chunk_m2 = float(((values - chunk_mean) ** 2).sum())
+        total = count + values.size
+        delta = chunk_mean - self.sleep_mean
+        self.sleep_mean += delta * values.size / total
+        self.sleep_m2 += chunk_m2 + delta ** 2 * count * values.size / total
+
+    def result(self):
+        def average(metric):
+            return self.sums[metric] / self.counts[metric] if self.counts[metric] else None
+
+        sleep_consistency = None
+        if self.sample_count > 3 and self.counts["sleep_duration"]:
+            variance = self.sleep_m2 / self.counts["sleep_duration"]
+            sleep_consistency = max(0, 100 - (variance * 10))
+
+        daily = np.array([readings.mean() for readings in self.daily_lowest.values()], dtype=float)
+        return {
+            "average_heart_rate": average("heart_rate"),
+            "average_resting_heart_rate": _resting_average(daily),
+            "average_sleep": average("sleep_duration"),
+            "average_stress": average("stress_level"),
+            "average_hrv": average("hrv"),
+            "sleep_consistency": sleep_consistency,
+            "sample_count": self.sample_count,
+        }
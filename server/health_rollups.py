@@ -0,0 +1,303 @@
+"""Hourly and daily rollups of health_data.
+
+apply_rollups folds in newly inserted samples, from the "health.synced"
+outbox events the sync endpoints enqueue. health_data.rolled_up marks the
+samples already counted: the outbox handler only rolls up samples it flips
+from false, and it and the rebuild lock the user's row first, so each
+sample is counted once however they interleave. The compaction job rebuilds rollups from the raw rows,
+one user per transaction, so readers see either the old or the new rollups
+of a user, never a partial set:
+
+    python health_rollups.py rebuild [--user-id N]
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, dialect_insert
+from models import HealthData, HealthRollupHourly, HealthRollupDaily, User, create_tables
+from models.health_rollup import ROLLUP_METRICS, SAMPLE_COUNT
+
+RESTING_HR_READINGS = 5
+REBUILD_PROGRESS_USERS = 100  # print progress every this many users
+SYNCED_IDS_CHUNK_SIZE = 1000  # also the samples a rebuild reads and folds in at a time
+
+def hour_start(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+def day_start(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _aggregate(samples, bucket_of):
+    aggregates = {}
+
+    def add(bucket, metric, value):
+        agg = aggregates.setdefault((bucket, metric), [0, 0.0, 0.0, None, None])
+        agg[0] += 1
+        if value is not None:
+            agg[1] += value
+            agg[2] += value * value
+            agg[3] = value if agg[3] is None else min(agg[3], value)
+            agg[4] = value if agg[4] is None else max(agg[4], value)
+
+    for sample in samples:
+        bucket = bucket_of(sample.recorded_at)
+        add(bucket, SAMPLE_COUNT, None)
+        for metric in ROLLUP_METRICS:
+            value = getattr(sample, metric)
+            if value is not None:
+                add(bucket, metric, value)
+
+    return aggregates
+
+def _least(db: Session, a, b):
+    fn = func.least if db.get_bind().dialect.name == "postgresql" else func.min
+    return fn(func.coalesce(a, b), func.coalesce(b, a))
+
+def _greatest(db: Session, a, b):
+    fn = func.greatest if db.get_bind().dialect.name == "postgresql" else func.max
+    return fn(func.coalesce(a, b), func.coalesce(b, a))
+
+def _upsert(db: Session, model, user_id: int, aggregates):
+    table = model.__table__
+    insert = dialect_insert(db, model)
+    db.execute(
+        insert.on_conflict_do_update(
+            index_elements=["user_id", "bucket_start", "metric"],
+            set_={
+                "value_count": table.c.value_count + insert.excluded.value_count,
+                "value_sum": table.c.value_sum + insert.excluded.value_sum,
+                "value_sum_sq": table.c.value_sum_sq + insert.excluded.value_sum_sq,
+                "value_min": _least(db, table.c.value_min, insert.excluded.value_min),
+                "value_max": _greatest(db, table.c.value_max, insert.excluded.value_max),
+            }
+        ),
+        [
+            {
+                "user_id": user_id,
+                "bucket_start": bucket,
+                "metric": metric,
+                "value_count": count,
+                "value_sum": total,
+                "value_sum_sq": total_sq,
+                "value_min": low,
+                "value_max": high,
+            }
+            for (bucket, metric), (count, total, total_sq, low, high) in aggregates.items()
+        ]
+    )
+
+def _merge_lowest_heart_rates(db: Session, user_id: int, samples):
+    readings = {}
+    for sample in samples:
+        if sample.heart_rate is not None:
+            readings.setdefault(day_start(sample.recorded_at), []).append(sample.heart_rate)
+    if not readings:
+        return
+
+    rows = db.query(HealthRollupDaily).filter(
+        HealthRollupDaily.user_id == user_id,
+        HealthRollupDaily.metric == "heart_rate",
+        HealthRollupDaily.bucket_start.in_(list(readings))
+    ).with_for_update().all()
+
+    for row in rows:
+        lowest = parse_lowest_values(row.lowest_values) + readings[row.bucket_start]
+        lowest.sort()
+        row.lowest_values = ",".join(str(v) for v in lowest[:RESTING_HR_READINGS])
+
+def parse_lowest_values(value):
+    return [int(v) for v in value.split(",")] if value else []
+
+def apply_rollups(db: Session, user_id: int, samples):
+    """Fold newly stored samples into the hourly and daily rollups.
+
+    samples only need recorded_at and the metric attributes (ORM objects, rows or HealthSample).
+    Runs inside the caller's transaction; the caller commits.
+    """
+    if not samples:
+        return
+
+    _upsert(db, HealthRollupHourly, user_id, _aggregate(samples, hour_start))
+    _upsert(db, HealthRollupDaily, user_id, _aggregate(samples, day_start))
+    db.flush()
+    _merge_lowest_heart_rates(db, user_id, samples)
+
+SAMPLE_COLUMNS = [HealthData.id, HealthData.user_id, HealthData.recorded_at] + [
+    getattr(HealthData, metric) for metric in ROLLUP_METRICS
+]
+
+def _lock_users(db: Session, user_ids):
+    """Serializes the outbox handler and rebuilds per user (row locks on users, in id order)"""
+    db.execute(
+        select(User.id).where(User.id.in_(sorted(user_ids))).order_by(User.id).with_for_update(key_share=True)
+    ).all()
+
+def apply_synced_rollups(db: Session, payloads):
+    """Outbox handler: roll up the samples stored by sync requests (payloads of user_id and sample_ids)"""
+    _lock_users(db, {payload["user_id"] for payload in payloads})
+    sample_ids = [sample_id for payload in payloads for sample_id in payload["sample_ids"]]
+    by_user = {}
+    # Claims the samples by flipping rolled_up, skipping any a rebuild has counted meanwhile.
+    # A batch sync can carry thousands of ids; keep each IN list small
+    for i in range(0, len(sample_ids), SYNCED_IDS_CHUNK_SIZE):
+        chunk = sample_ids[i:i + SYNCED_IDS_CHUNK_SIZE]
+        for row in db.execute(
+            update(HealthData)
+            .where(HealthData.id.in_(chunk), HealthData.rolled_up == False)
+            .values(rolled_up=True)
+            .returning(*SAMPLE_COLUMNS)
+        ):
+            by_user.setdefault(row.user_id, []).append(row)
+    for user_id, samples in by_user.items():
+        apply_rollups(db, user_id, samples)
+
+def apply_resynced_rollups(db: Session, payloads):
+    """Outbox handler: recompute the days of samples overwritten by the legacy sync (payloads of user_id and day)"""
+    for user_id, day in sorted({(payload["user_id"], payload["day"]) for payload in payloads}):
+        start = datetime.fromisoformat(day)
+        rebuild_user_rollups(db, user_id, start, start + timedelta(days=1))
+
+def rebuild_user_rollups(db: Session, user_id: int, start: datetime = None, end: datetime = None):
+    """Replace one user's rollups with ones computed from their raw samples; returns the sample count.
+
+    start/end (day-aligned) limit it to the buckets of those days.
+    Runs inside the caller's transaction; the caller commits.
+    """
+    _lock_users(db, [user_id])
+
+    def in_range(column):
+        criteria = []
+        if start is not None:
+            criteria.append(column >= start)
+        if end is not None:
+            criteria.append(column < end)
+        return criteria
+
+    # Deleting first also takes SQLite's write lock before the samples are read
+    for model in (HealthRollupHourly, HealthRollupDaily):
+        db.execute(delete(model).where(model.user_id == user_id, *in_range(model.bucket_start)))
+
+    # In id chunks, so a heavy user's history is never in memory at once; apply_rollups is additive
+    last_id = 0
+    processed = 0
+    while True:
+        samples = db.execute(
+            select(*SAMPLE_COLUMNS, HealthData.rolled_up)
+            .where(HealthData.user_id == user_id, HealthData.id > last_id,
+                   HealthData.recorded_at.isnot(None), *in_range(HealthData.recorded_at))
+            .order_by(HealthData.id)
+            .limit(SYNCED_IDS_CHUNK_SIZE)
+        ).all()
+        if not samples:
+            break
+        # Flag what is counted here, so the outbox handler skips these samples
+        unclaimed = [sample.id for sample in samples if not sample.rolled_up]
+        if unclaimed:
+            db.execute(update(HealthData).where(HealthData.id.in_(unclaimed)).values(rolled_up=True))
+        apply_rollups(db, user_id, samples)
+        last_id = samples[-1].id
+        processed += len(samples)
+    return processed
+
+def rebuild_rollups(db: Session, user_id=None):
+    """Recompute rollups from raw health_data, for one user or everyone, one transaction per user"""
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = db.scalars(
+            select(HealthData.user_id).where(HealthData.user_id.isnot(None)).distinct().order_by(HealthData.user_id)
+        ).all()
+
+    processed = 0
+    for i, uid in enumerate(user_ids, 1):
+        processed += rebuild_user_rollups(db, uid)
+        db.commit()
+        if i % REBUILD_PROGRESS_USERS == 0 or i == len(user_ids):
+            print(f"  {i}/{len(user_ids)} users, {processed} samples rolled up")
+
+    return processed
+
+def rollup_metrics(db: Session, user_id: int, start_date: datetime, model):
+    """Bucketed data points and aggregate statistics for a window, read from rollups only.
+
+    sample_count is 0 when the window has no rollups; callers then read the raw samples.
+
+    Buckets are aligned to the rollup granularity, so the first bucket may start
+    slightly before start_date.
+    """
+    floor = hour_start(start_date) if model is HealthRollupHourly else day_start(start_date)
+    rows = db.execute(
+        select(model.bucket_start, model.metric, model.value_count, model.value_sum, model.value_sum_sq)
+        .where(model.user_id == user_id, model.bucket_start >= floor)
+        .order_by(model.bucket_start)
+    ).all()
+
+    buckets = {}
+    totals = {metric: [0, 0.0, 0.0] for metric in ROLLUP_METRICS + (SAMPLE_COUNT,)}
+    for row in rows:
+        point = buckets.setdefault(row.bucket_start, {"timestamp": row.bucket_start})
+        if row.metric != SAMPLE_COUNT:
+            point[row.metric] = row.value_sum / row.value_count if row.value_count else None
+        total = totals[row.metric]
+        total[0] += row.value_count
+        total[1] += row.value_sum
+        total[2] += row.value_sum_sq
+
+    data = [
+        {"timestamp": point["timestamp"], **{metric: point.get(metric) for metric in ROLLUP_METRICS}}
+        for point in buckets.values()
+    ]
+
+    def average(metric):
+        count, total, _ = totals[metric]
+        return total / count if count else None
+
+    # Resting heart rate: mean of each day's lowest readings, averaged over days
+    resting_heart_rates = []
+    for (lowest_values,) in db.execute(
+        select(HealthRollupDaily.lowest_values).where(
+            HealthRollupDaily.user_id == user_id,
+            HealthRollupDaily.metric == "heart_rate",
+            HealthRollupDaily.bucket_start >= day_start(start_date)
+        )
+    ):
+        lowest = parse_lowest_values(lowest_values)
+        if lowest:
+            resting_heart_rates.append(sum(lowest) / len(lowest))
+
+    sleep_consistency = None
+    sleep_count, sleep_sum, sleep_sum_sq = totals["sleep_duration"]
+    if totals[SAMPLE_COUNT][0] > 3 and sleep_count:
+        avg_sleep = sleep_sum / sleep_count
+        variance = max(0.0, sleep_sum_sq / sleep_count - avg_sleep ** 2)
+        sleep_consistency = max(0, 100 - (variance * 10))
+
+    stats = {
+        "average_heart_rate": average("heart_rate"),
+        "average_resting_heart_rate": (
+            sum(resting_heart_rates) / len(resting_heart_rates) if resting_heart_rates else None
+        ),
+        "average_sleep": average("sleep_duration"),
+        "average_stress": average("stress_level"),
+        "average_hrv": average("hrv"),
+        "sleep_consistency": sleep_consistency,
+        "sample_count": totals[SAMPLE_COUNT][0],
+    }
+    return data, stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Health data rollup maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        total = rebuild_rollups(db, args.user_id)
+        print(f"✅ Rollups rebuilt from {total} samples")
+    finally:
+        db.close()
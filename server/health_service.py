@@ -1,13 +1,40 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from database import get_db
-from models import User, HealthData
-from pydantic import BaseModel
-from datetime import datetime, timedelta
+from auth import current_user_id, ensure_user
+from database import SessionLocal, dialect_insert, get_db
+from models import User, HealthData, HealthRollupHourly, HealthRollupDaily
+from health_rollups import day_start, rollup_metrics
+from outbox import enqueue
+from health_analytics import InsightAccumulator, compute_insights, health_rows_select, load_health_rows
+from json_responses import json_response, row_dicts
+from risk_scoring import health_risk_score
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict, Any
+import orjson
 
 router = APIRouter()
 
+MAX_BATCH_SAMPLES = 5000
+MAX_HEART_RATE = 300  # bpm; anything above is a sensor or unit error
+
+TIME_RANGES = {
+    '1d': timedelta(days=1),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+    '90d': timedelta(days=90)
+}
+
+# Rows fetched per server-side cursor round trip when streaming
+STREAM_CHUNK_SIZE = 1000
+
+# Ranges answered from rollups rather than raw samples
+ROLLUP_RANGES = {
+    '30d': HealthRollupHourly,
+    '90d': HealthRollupDaily
+}
+
 class HealthPermissionUpdate(BaseModel):
     user_id: int
     enabled: bool
@@ -26,135 +53,196 @@ class HealthDataSync(BaseModel):
     user_id: int
     health_data: Dict[str, Any]
 
-@router.post("/sync-health-data")
-def sync_health_data(data: HealthDataSync, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == data.user_id).first()
+class HealthSample(BaseModel):
+    recorded_at: datetime
+    heart_rate: Optional[int] = Field(None, ge=0, le=MAX_HEART_RATE)
+    sleep_duration: Optional[float] = Field(None, ge=0, le=24)  # hours
+    sleep_quality: Optional[float] = Field(None, ge=0, le=1)
+    steps: Optional[int] = Field(None, ge=0)
+    stress_level: Optional[float] = Field(None, ge=0, le=1)
+    hrv: Optional[float] = Field(None, ge=0)
+
+    @field_validator("recorded_at")
+    @classmethod
+    def to_naive_utc(cls, value: datetime) -> datetime:
+        # recorded_at is stored as naive UTC
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+class LegacyHealthSample(HealthSample):
+    """What /sync-health-data has always accepted: any numbers, counts rounded for the integer columns"""
+    heart_rate: Optional[float] = None
+    sleep_duration: Optional[float] = None
+    sleep_quality: Optional[float] = None
+    steps: Optional[float] = None
+    stress_level: Optional[float] = None
+    hrv: Optional[float] = None
+
+    @field_validator("heart_rate", "steps")
+    @classmethod
+    def round_count(cls, value: Optional[float]) -> Optional[int]:
+        return None if value is None else round(value)
+
+class HealthDataBatch(BaseModel):
+    user_id: int
+    samples: List[HealthSample] = Field(..., max_length=MAX_BATCH_SAMPLES)
+
+def get_syncing_user(db: Session, user_id: int) -> User:
+    user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     if not user.health_permission:
         raise HTTPException(status_code=403, detail="Health data permission not granted")
     
-    # Process and store the health data
-    new_health_data = HealthData(
-        user_id=data.user_id,
-        heart_rate=data.health_data.get('heart_rate'),
-        sleep_duration=data.health_data.get('sleep_duration'),
-        sleep_quality=data.health_data.get('sleep_quality'),
-        steps=data.health_data.get('steps'),
-        stress_level=data.health_data.get('stress_level'),
-        hrv=data.health_data.get('hrv'),
-        recorded_at=data.health_data.get('timestamp', datetime.utcnow())
-    )
+    return user
+
+def ingest_health_samples(db: Session, user_id: int, samples: List[HealthSample]):
+    """Insert samples with one multi-row INSERT, skipping (user_id, recorded_at) pairs already stored.
+
+    Returns the ids of the inserted rows. Runs inside the caller's transaction;
+    the rollups are updated from the outbox once it commits.
+    """
+    # The first sample wins when a batch repeats a timestamp
+    unique_samples = {}
+    for sample in samples:
+        unique_samples.setdefault(sample.recorded_at, sample)
+    if not unique_samples:
+        return []
+
+    rows = [{"user_id": user_id, **sample.model_dump()} for sample in unique_samples.values()]
+    result = db.execute(
+        dialect_insert(db, HealthData)
+        .on_conflict_do_nothing(index_elements=["user_id", "recorded_at"])
+        .returning(HealthData.id, HealthData.recorded_at),
+        rows
+    ).all()
+    
+    inserted_ids = [row.id for row in result]
+    if inserted_ids:
+        enqueue(db, "health.synced", {"user_id": user_id, "sample_ids": inserted_ids})
+    return inserted_ids
+
+@router.post("/sync-health-data")
+def sync_health_data(data: HealthDataSync, db: Session = Depends(get_db)):
+    get_syncing_user(db, data.user_id)
     
-    db.add(new_health_data)
+    try:
+        sample = LegacyHealthSample(
+            recorded_at=data.health_data.get('timestamp', datetime.utcnow()),
+            heart_rate=data.health_data.get('heart_rate'),
+            sleep_duration=data.health_data.get('sleep_duration'),
+            sleep_quality=data.health_data.get('sleep_quality'),
+            steps=data.health_data.get('steps'),
+            stress_level=data.health_data.get('stress_level'),
+            hrv=data.health_data.get('hrv')
+        )
+    except ValidationError:
+        raise HTTPException(status_code=422, detail="Invalid health data")
+    
+    if not ingest_health_samples(db, data.user_id, [sample]):
+        # A repeated timestamp overwrites the stored sample, as a re-sync should
+        db.query(HealthData).filter(
+            HealthData.user_id == data.user_id, HealthData.recorded_at == sample.recorded_at
+        ).update(sample.model_dump(exclude={"recorded_at"}), synchronize_session=False)
+        enqueue(db, "health.resynced", {"user_id": data.user_id, "day": day_start(sample.recorded_at).isoformat()})
     db.commit()
-    db.refresh(new_health_data)
     
     return {"message": "Health data synced successfully"}
 
+@router.post("/sync-health-data/batch")
+def sync_health_data_batch(data: HealthDataBatch, db: Session = Depends(get_db)):
+    get_syncing_user(db, data.user_id)
+    
+    inserted_ids = ingest_health_samples(db, data.user_id, data.samples)
+    db.commit()
+    
+    return {
+        "message": "Health data synced successfully",
+        "received": len(data.samples),
+        "accepted": len(inserted_ids),
+        "duplicates": len(data.samples) - len(inserted_ids)
+    }
+
+def metrics_window(timeRange: str):
+    """(length, start, rollup model or None) of a /health-metrics timeRange"""
+    time_delta = TIME_RANGES.get(timeRange, timedelta(days=7))
+    return time_delta, datetime.utcnow() - time_delta, ROLLUP_RANGES.get(timeRange)
+
 @router.get("/health-metrics/{user_id}")
-def get_health_metrics(user_id: int, timeRange: str = '7d', db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def get_health_metrics(user_id: int, timeRange: str = '7d', db: Session = Depends(get_db), caller_id: Optional[int] = Depends(current_user_id)):
+    ensure_user(db, user_id, caller_id)
+    
+    time_delta, start_date, rollup_model = metrics_window(timeRange)
+    
+    # Long ranges are answered from the hourly/daily rollups instead of raw samples,
+    # unless there are none yet (fresh deploy, rollups never built): then from the raw rows
+    if rollup_model is not None:
+        data, stats = rollup_metrics(db, user_id, start_date, rollup_model)
+        if stats["sample_count"]:
+            return json_response(build_metrics_response(data, stats, time_delta))
     
-    # Convert timeRange to actual date filter
-    time_delta = {
-        '1d': timedelta(days=1),
-        '7d': timedelta(days=7),
-        '30d': timedelta(days=30),
-        '90d': timedelta(days=90)
-    }.get(timeRange, timedelta(days=7))
+    # Get the health data for the time range and compute insights on column arrays
+    rows = load_health_rows(db, user_id, start_date)
+    return json_response(build_metrics_response(row_dicts(rows), compute_insights(rows), time_delta))
+
+@router.get("/health-metrics/{user_id}/stream")
+def stream_health_metrics(user_id: int, timeRange: str = '7d', db: Session = Depends(get_db), caller_id: Optional[int] = Depends(current_user_id)):
+    """NDJSON variant of /health-metrics: one raw sample per line, then one line with insights and recommendations"""
+    ensure_user(db, user_id, caller_id)
     
+    time_delta = TIME_RANGES.get(timeRange, timedelta(days=7))
     start_date = datetime.utcnow() - time_delta
     
-    # Get the health data for the time range
-    health_data = db.query(HealthData).filter(
-        HealthData.user_id == user_id,
-        HealthData.recorded_at >= start_date
-    ).order_by(HealthData.recorded_at.asc()).all()
-    
-    # Process data for trends and insights
-    def safe_average(values):
-        filtered = [v for v in values if v is not None]
-        return sum(filtered) / len(filtered) if filtered else None
-    
-    heart_rates = [d.heart_rate for d in health_data]
-    sleep_durations = [d.sleep_duration for d in health_data]
-    stress_levels = [d.stress_level for d in health_data]
-    hrvs = [d.hrv for d in health_data]
-    
-    # Calculate resting heart rate (average of lowest 5 readings per day)
-    daily_heart_rates = {}
-    for data in health_data:
-        if data.heart_rate is None:
-            continue
-        
-        day = data.recorded_at.date()
-        if day not in daily_heart_rates:
-            daily_heart_rates[day] = []
-        
-        daily_heart_rates[day].append(data.heart_rate)
-    
-    resting_heart_rates = []
-    for day, rates in daily_heart_rates.items():
-        rates.sort()
-        resting_hr = sum(rates[:min(5, len(rates))]) / min(5, len(rates)) if rates else None
-        if resting_hr:
-            resting_heart_rates.append(resting_hr)
-    
-    avg_resting_hr = sum(resting_heart_rates) / len(resting_heart_rates) if resting_heart_rates else None
-    
-    # Calculate sleep consistency score
-    sleep_consistency = None
-    if len(sleep_durations) > 3:
-        non_none_durations = [d for d in sleep_durations if d is not None]
-        if non_none_durations:
-            avg_sleep = sum(non_none_durations) / len(non_none_durations)
-            variance = sum((d - avg_sleep) ** 2 for d in non_none_durations) / len(non_none_durations)
-            # Lower variance = higher consistency, scale to 0-100
-            sleep_consistency = max(0, 100 - (variance * 10))
-    
-    # Calculate burnout risk score based on health data
-    # Higher resting HR, lower HRV, poor sleep = higher risk
-    burnout_risk = None
-    if avg_resting_hr and safe_average(hrvs) and safe_average(sleep_durations):
-        hr_factor = min(100, max(0, (avg_resting_hr - 50) * 2)) / 100  # Normalize: higher HR = higher risk
-        hrv_factor = min(100, max(0, 100 - safe_average(hrvs))) / 100  # Normalize: lower HRV = higher risk
-        sleep_factor = min(100, max(0, (8 - safe_average(sleep_durations)) * 20)) / 100  # Normalize: less sleep = higher risk
+    return StreamingResponse(
+        _stream_health_metrics(user_id, start_date, time_delta),
+        media_type="application/x-ndjson"
+    )
+
+def _stream_health_metrics(user_id: int, start_date: datetime, time_delta: timedelta):
+    # The request's session is closed before the body is sent, so the stream owns its own
+    db = SessionLocal()
+    try:
+        accumulator = InsightAccumulator()
+        result = db.execute(
+            health_rows_select(user_id, start_date).execution_options(yield_per=STREAM_CHUNK_SIZE)
+        )
+        for rows in result.partitions():
+            accumulator.add(rows)
+            yield b"".join(orjson.dumps(row._asdict(), option=orjson.OPT_APPEND_NEWLINE) for row in rows)
         
-        # Weighted formula
-        burnout_risk = (hr_factor * 0.3 + hrv_factor * 0.4 + sleep_factor * 0.3) * 10  # Scale to 0-10
+        summary = build_metrics_response([], accumulator.result(), time_delta)
+        del summary["data"]
+        yield orjson.dumps(summary, option=orjson.OPT_APPEND_NEWLINE)
+    finally:
+        db.close()
+
+def build_metrics_response(data, stats, time_delta):
+    avg_resting_hr = stats["average_resting_heart_rate"]
+    avg_hrv = stats["average_hrv"]
+    avg_sleep = stats["average_sleep"]
+    
+    # Higher resting HR, lower HRV, poor sleep = higher risk (0-10), see risk_scoring
+    burnout_risk = health_risk_score(avg_resting_hr, avg_hrv, avg_sleep)
     
     return {
-        "data": [
-            {
-                "timestamp": data.recorded_at,
-                "heart_rate": data.heart_rate,
-                "sleep_duration": data.sleep_duration,
-                "sleep_quality": data.sleep_quality,
-                "steps": data.steps,
-                "stress_level": data.stress_level,
-                "hrv": data.hrv
-            }
-            for data in health_data
-        ],
+        "data": data,
         "insights": {
-            "average_heart_rate": safe_average(heart_rates),
+            "average_heart_rate": stats["average_heart_rate"],
             "average_resting_heart_rate": avg_resting_hr,
-            "average_sleep": safe_average(sleep_durations),
-            "average_stress": safe_average(stress_levels),
-            "average_hrv": safe_average(hrvs),
-            "sleep_consistency": sleep_consistency,
+            "average_sleep": avg_sleep,
+            "average_stress": stats["average_stress"],
+            "average_hrv": avg_hrv,
+            "sleep_consistency": stats["sleep_consistency"],
             "burnout_risk_from_health_data": burnout_risk,
-            "data_quality": len(health_data) / time_delta.days if time_delta.days > 0 else 0,
+            "data_quality": stats["sample_count"] / time_delta.days if time_delta.days > 0 else 0,
         },
         "recommendations": get_health_recommendations(
             avg_resting_hr, 
-            safe_average(hrvs), 
-            safe_average(sleep_durations),
-            safe_average(stress_levels)
+            avg_hrv, 
+            avg_sleep,
+            stats["average_stress"]
         )
     }
 
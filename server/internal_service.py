@@ -0,0 +1,47 @@
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+import outbox
+from admission import admission_statistics
+from database import SessionLocal, pool_statistics
+from metrics import METRICS_ENABLED, render_metrics
+
+# Operational endpoints answer only "Authorization: Bearer <INTERNAL_TOKEN>"; unset, they are off
+INTERNAL_TOKEN = os.getenv("INTERNAL_TOKEN")
+
+def require_internal_token(authorization: Optional[str] = Header(None)):
+    if not INTERNAL_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), INTERNAL_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid internal token")
+
+router = APIRouter(dependencies=[Depends(require_internal_token)])
+
+@router.get("/internal/pool-stats")
+def get_pool_stats():
+    """Connection pool usage for this worker process"""
+    return pool_statistics()
+
+@router.get("/internal/admission-stats")
+def get_admission_stats():
+    """Adaptive concurrency limits and shed counts per route class for this worker process"""
+    return admission_statistics()
+
+def _outbox_status():
+    with SessionLocal() as db:
+        return outbox.status(db)
+
+if METRICS_ENABLED:
+    @router.get("/metrics", include_in_schema=False)
+    async def get_metrics():
+        """Prometheus scrape endpoint for this worker process"""
+        # async: renders on the event loop, where the middleware records; the outbox counts are queried off it
+        outbox_stats = await run_in_threadpool(_outbox_status)
+        return Response(
+            render_metrics(pool_statistics(), admission_statistics(), outbox_stats),
+            media_type="text/plain; version=0.0.4; charset=utf-8",
+        )
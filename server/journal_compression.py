@@ -0,0 +1,84 @@
+"""Background compression of journal text written before JOURNAL_COMPRESSION was on.
+
+Walks journals in id order, one chunk per transaction, and rewrites the
+content and analysis values that would be stored compressed now. Reads
+handle both forms, so the app keeps serving while this runs and an
+interrupted run can simply be restarted (--after resumes from an id):
+
+    JOURNAL_COMPRESSION=zlib python journal_compression.py compress [--chunk-size N] [--after ID]
+"""
+import argparse
+import sys
+
+from sqlalchemy import Text, bindparam, select, type_coerce, update
+from sqlalchemy.orm import Session
+
+import text_compression
+from database import SessionLocal
+from models import Journal, create_tables
+
+COMPRESS_CHUNK_SIZE = 500
+COMPRESSED_COLUMNS = ("content", "analysis")
+
+def compress_existing(db: Session, chunk_size: int = COMPRESS_CHUNK_SIZE, after_id: int = 0):
+    """(rows rewritten, UTF-8 bytes before, bytes stored after) over the whole table"""
+    table = Journal.__table__
+    # Stored values as they are: str when plain, bytes when already compressed
+    raw = [type_coerce(table.c[column], Text).label(column) for column in COMPRESSED_COLUMNS]
+    rewrite = update(table).where(table.c.id == bindparam("row_id")).values(
+        {column: bindparam(column, type_=table.c[column].type) for column in COMPRESSED_COLUMNS}
+    )
+
+    rewritten = bytes_before = bytes_after = 0
+    last_id = after_id
+    while True:
+        rows = db.execute(
+            select(table.c.id, *raw).where(table.c.id > last_id).order_by(table.c.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        changes = []
+        for row in rows:
+            values = {column: getattr(row, column) for column in COMPRESSED_COLUMNS}
+            stored = {column: text_compression.compress_text(value) if isinstance(value, str) else value
+                      for column, value in values.items()}
+            if stored == values:
+                continue
+            for column in COMPRESSED_COLUMNS:
+                if isinstance(values[column], str) and values[column] is not stored[column]:
+                    bytes_before += len(values[column].encode())
+                    bytes_after += len(stored[column])
+            # Plain values bound through CompressedText, which compresses them the same way
+            changes.append({"row_id": row.id, **values})
+
+        if changes:
+            db.execute(rewrite, changes)
+            rewritten += len(changes)
+        db.commit()
+        print(f"… up to journal {last_id}: {rewritten} rows compressed")
+
+    return rewritten, bytes_before, bytes_after
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Journal text compression maintenance")
+    parser.add_argument("command", choices=["compress"])
+    parser.add_argument("--chunk-size", type=int, default=COMPRESS_CHUNK_SIZE)
+    parser.add_argument("--after", type=int, default=0, help="resume after this journal id")
+    args = parser.parse_args()
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name != "sqlite":
+            print("❌ Compressed journal storage only applies to SQLite; Postgres compresses these columns itself")
+            sys.exit(1)
+        if text_compression.COMPRESSION_CODEC == "off":
+            print("❌ Set JOURNAL_COMPRESSION (zlib or zstd) to the mode the app runs with")
+            sys.exit(1)
+        rewritten, before, after = compress_existing(db, args.chunk_size, args.after)
+        saved = f", {before} → {after} bytes" if rewritten else ""
+        print(f"✅ Compressed {rewritten} journal entries{saved}")
+    finally:
+        db.close()
@@ -1,13 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import DateTime, Float, Integer, String, select, text, tuple_
 from sqlalchemy.orm import Session
+from auth import current_user_id, ensure_user
+from data_versions import bump_data_version, user_etag
+from json_responses import json_response, row_dicts
 from database import get_db
 from models import User, Journal
 from pydantic import BaseModel
 from datetime import datetime
 from typing import Optional, List
+import base64
+import re
 
 router = APIRouter()
 
+EXCERPT_LENGTH = 160
+JOURNAL_PAGE_SIZE = 20
+MAX_JOURNAL_PAGE_SIZE = 100
+SEARCH_PAGE_SIZE = 10
+MAX_SEARCH_PAGE_SIZE = 50
+
+def make_excerpt(content: str, length: int = EXCERPT_LENGTH) -> str:
+    """Whitespace-collapsed start of content, cut at a word boundary"""
+    text = re.sub(r"\s+", " ", content).strip()
+    if len(text) <= length:
+        return text
+    cut = text[:length]
+    if " " in cut:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip(" ,.;:") + "…"
+
+def encode_cursor(created_at: datetime, entry_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{entry_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, entry_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split("|")
+        return datetime.fromisoformat(created_at), int(entry_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 class JournalEntryCreate(BaseModel):
     user_id: int
     title: str
@@ -22,33 +54,137 @@ class JournalEntryResponse(BaseModel):
     created_at: datetime
 
 @router.post("/journal", response_model=JournalEntryResponse)
-def create_journal_entry(entry: JournalEntryCreate, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == entry.user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def create_journal_entry(entry: JournalEntryCreate, db: Session = Depends(get_db), caller_id: Optional[int] = Depends(current_user_id)):
+    ensure_user(db, entry.user_id, caller_id)
     
     new_entry = Journal(
         user_id=entry.user_id,
         title=entry.title,
         content=entry.content,
-        analysis=entry.analysis
+        analysis=entry.analysis,
+        excerpt=make_excerpt(entry.content)
     )
     
     db.add(new_entry)
+    bump_data_version(db, entry.user_id)
     db.commit()
     db.refresh(new_entry)
     
     return new_entry
 
-@router.get("/journal/{user_id}", response_model=List[JournalEntryResponse])
-def get_journal_entries(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+# Superseded by the paginated /journal/{user_id}/entries, kept for older clients
+@router.get("/journal/{user_id}", response_model=List[JournalEntryResponse], dependencies=[Depends(user_etag)], deprecated=True)
+def get_journal_entries(user_id: int, db: Session = Depends(get_db), caller_id: Optional[int] = Depends(current_user_id)):
+    ensure_user(db, user_id, caller_id)
     
     entries = db.query(Journal).filter(Journal.user_id == user_id).order_by(Journal.created_at.desc()).all()
     return entries
 
+class JournalListItem(BaseModel):
+    id: int
+    title: str
+    excerpt: Optional[str]
+    created_at: datetime
+
+class JournalPage(BaseModel):
+    entries: List[JournalListItem]
+    next_cursor: Optional[str]
+
+@router.get("/journal/{user_id}/entries", response_model=JournalPage, dependencies=[Depends(user_etag)])
+def get_journal_page(
+    user_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(JOURNAL_PAGE_SIZE, ge=1, le=MAX_JOURNAL_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    caller_id: Optional[int] = Depends(current_user_id)
+):
+    """Newest-first page of entries with excerpts; content and analysis load through /journal/entry/{entry_id}.
+
+    Pass the returned next_cursor to get the following page; it is null on the last page.
+    """
+    ensure_user(db, user_id, caller_id)
+    
+    # Keyset on (created_at, id): each page is an index range scan, however deep
+    query = select(Journal.id, Journal.title, Journal.excerpt, Journal.created_at).where(Journal.user_id == user_id)
+    if cursor:
+        query = query.where(tuple_(Journal.created_at, Journal.id) < decode_cursor(cursor))
+    rows = db.execute(query.order_by(Journal.created_at.desc(), Journal.id.desc()).limit(limit + 1)).all()
+    
+    # The extra row only tells whether another page exists
+    next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+    return json_response({"entries": row_dicts(rows[:limit]), "next_cursor": next_cursor}, response)
+
+class JournalSearchHit(BaseModel):
+    id: int
+    title: str
+    created_at: datetime
+    rank: float
+    snippet: str
+
+class JournalSearchPage(BaseModel):
+    results: List[JournalSearchHit]
+    next_offset: Optional[int]
+
+SEARCH_COLUMNS = dict(id=Integer, title=String, created_at=DateTime, rank=Float, snippet=String)
+
+# Ranks and pages in the subquery first, so ts_headline only runs on the rows returned
+POSTGRES_SEARCH = text("""
+    SELECT page.id, page.title, page.created_at, page.rank,
+           ts_headline('english', journals.content, page.query,
+                       'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MinWords=5, MaxWords=20') AS snippet
+    FROM (
+        SELECT j.id, j.title, j.created_at, ts_rank_cd(j.search_vector, query) AS rank, query
+        FROM journals j, websearch_to_tsquery('english', :q) query
+        WHERE j.user_id = :user_id AND j.search_vector @@ query
+        ORDER BY rank DESC, j.id DESC
+        LIMIT :limit OFFSET :offset
+    ) page
+    JOIN journals ON journals.id = page.id
+    ORDER BY page.rank DESC, page.id DESC
+""").columns(**SEARCH_COLUMNS)
+
+# bm25() is lower-is-better; negated so rank sorts the same way as on Postgres
+SQLITE_SEARCH = text("""
+    SELECT j.id, j.title, j.created_at, -bm25(journals_fts, 2.0, 1.0) AS rank,
+           snippet(journals_fts, 1, '<mark>', '</mark>', '…', 20) AS snippet
+    FROM journals_fts JOIN journals j ON j.id = journals_fts.rowid
+    WHERE journals_fts MATCH :q AND j.user_id = :user_id
+    ORDER BY rank DESC, j.id DESC
+    LIMIT :limit OFFSET :offset
+""").columns(**SEARCH_COLUMNS)
+
+def fts5_query(q: str) -> str:
+    # Every word quoted: user input is matched as terms, never parsed as FTS5 syntax
+    return " ".join('"' + word.replace('"', '""') + '"' for word in q.split())
+
+@router.get("/journal/{user_id}/search", response_model=JournalSearchPage, dependencies=[Depends(user_etag)])
+def search_journal(
+    user_id: int,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=MAX_SEARCH_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    caller_id: Optional[int] = Depends(current_user_id)
+):
+    """Entries matching `q`, best match first, with <mark>-highlighted snippets of the content.
+
+    Pass next_offset back as `offset` for the following page; it is null on the last page.
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Search query is empty")
+    ensure_user(db, user_id, caller_id)
+    
+    if db.get_bind().dialect.name == "postgresql":
+        query, terms = POSTGRES_SEARCH, q
+    else:
+        query, terms = SQLITE_SEARCH, fts5_query(q)
+    rows = db.execute(query, {"q": terms, "user_id": user_id, "limit": limit + 1, "offset": offset}).all()
+    
+    next_offset = offset + limit if len(rows) > limit else None
+    return json_response({"results": row_dicts(rows[:limit]), "next_offset": next_offset}, response)
+
 @router.get("/journal/entry/{entry_id}", response_model=JournalEntryResponse)
 def get_journal_entry(entry_id: int, db: Session = Depends(get_db)):
     entry = db.query(Journal).filter(Journal.id == entry_id).first()
@@ -64,6 +200,7 @@ def delete_journal_entry(entry_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Journal entry not found")
     
     db.delete(entry)
+    bump_data_version(db, entry.user_id)
     db.commit()
     
     return {"message": "Journal entry deleted successfully"}
\ No newline at end of file
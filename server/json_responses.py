@@ -0,0 +1,26 @@
+"""Fast JSON path for list endpoints.
+
+FastAPI runs a handler's return value through jsonable_encoder (or a
+response_model validation pass) before rendering it, which costs more than
+the query for long lists. Handlers on this path select Core rows, turn
+them into plain dicts and return json_response(), which orjson serializes
+directly (datetimes, dates and enums included). response_model stays on
+those routes for the OpenAPI schema only.
+"""
+from typing import Optional
+
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+
+def row_dicts(rows):
+    return [row._asdict() for row in rows]
+
+def json_response(content, response: Optional[Response] = None) -> ORJSONResponse:
+    """Render JSON-ready content with orjson.
+
+    `response` is the route's injected Response: headers set on it by
+    dependencies (ETag, Cache-Control) are carried over, since FastAPI
+    drops them when a handler returns its own Response.
+    """
+    headers = dict(response.headers) if response is not None else None
+    return ORJSONResponse(content, headers=headers)
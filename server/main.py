@@ -1,18 +1,37 @@
+import os
+
+import anyio.to_thread
+
 from fastapi import FastAPI
-from auth import router as auth_router
+from fastapi.responses import ORJSONResponse
+from auth import check_session_secret, router as auth_router
 from mbi_test_service import router as mbi_router
 from user_service import router as user_router
 from journal_service import router as journal_router
 from micro_assessment_service import router as micro_assessment_router
 from streak_service import router as streak_router
 from health_service import router as health_router
+from dashboard_service import router as dashboard_router
+from cohort_service import router as cohort_router
+from internal_service import router as internal_router
+from admission import AdmissionMiddleware, max_concurrency
+from metrics import METRICS_ENABLED, MetricsMiddleware
+from database import dispose_async_engine
+from outbox import outbox_worker
+from utils import password_hasher
 
 from models import Response, Test, User, create_tables
 
 # Base.metadata.create_all(bind=engine)
 create_tables()
 
-app = FastAPI()
+# orjson renders responses; handlers returning Core rows through a response_model skip jsonable_encoder
+app = FastAPI(default_response_class=ORJSONResponse)
+# Route latency, SQL statements per request and Server-Timing; only admitted requests reach it
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+# Per-route-class concurrency limits; sheds overload with 503 + Retry-After (see admission.py)
+app.add_middleware(AdmissionMiddleware)
 
 ## Include routers
 # app.include_router(mbi_router, prefix="/mbi", tags=["mbi"])
@@ -26,6 +45,35 @@ app.include_router(journal_router)
 app.include_router(micro_assessment_router)
 app.include_router(streak_router)
 app.include_router(health_router)
+app.include_router(dashboard_router)
+app.include_router(cohort_router)
+app.include_router(internal_router)
+
+# async variants of the hot endpoints replace their sync routes when enabled
+if os.getenv("ASYNC_ENDPOINTS", "0") == "1":
+    from async_endpoints import replace_routes
+    replace_routes(app)
+
+@app.on_event("startup")
+def startup():
+    check_session_secret()
+    # Calibrates the bcrypt cost on this host and starts the hashing workers
+    password_hasher.start()
+    # Drains post-write work (streaks, cohort stats, health rollups) left by earlier requests and runs
+    outbox_worker.start()
+
+@app.on_event("startup")
+async def size_threadpool():
+    # Sync endpoints run in anyio's threadpool; with fewer threads than the admission
+    # limits allow, admitted requests would queue there regardless of their class
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = max(limiter.total_tokens, max_concurrency())
+
+@app.on_event("shutdown")
+async def shutdown():
+    password_hasher.shutdown()
+    outbox_worker.shutdown()
+    await dispose_async_engine()
 
 ## Mount each sub-app if needed
 # app.mount("/mbi", mbi_app)
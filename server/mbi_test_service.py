@@ -1,9 +1,17 @@
+from datetime import datetime
 from typing import List, Optional
 
-from database import engine, get_db
+from auth import current_user_id, ensure_user
+from data_versions import bump_data_version, immutable_resource, user_etag
+from json_responses import json_response, row_dicts
+from database import dialect_insert, engine, get_db
 from fastapi import Depends, FastAPI, HTTPException, APIRouter
+from fastapi import Response as HTTPResponse
 from models import Response, Test, User, create_tables
-from pydantic import BaseModel
+from models.cohort import SUBSCALES
+from outbox import enqueue
+from pydantic import BaseModel, Field
+from sqlalchemy import case, insert, select, update
 from sqlalchemy.orm import Session
 
 create_tables()
@@ -35,6 +43,20 @@ MBI_QUESTIONS = [
     {"id": 22, "text": "I feel patients blame me for some of their problems.", "category": "depersonalization"},
 ]
 
+# question id -> category, so scoring a submission is one dict lookup per answer
+QUESTION_CATEGORIES = {q["id"]: q["category"] for q in MBI_QUESTIONS}
+
+class TestSummary(BaseModel):
+    id: int
+    created_at: datetime
+    emotional_exhaustion_score: Optional[int]
+    emotional_exhaustion_level: Optional[str]
+    depersonalization_score: Optional[int]
+    depersonalization_level: Optional[str]
+    personal_accomplishment_score: Optional[int]
+    personal_accomplishment_level: Optional[str]
+    burnout_level: Optional[str]
+
 class StartTestRequest(BaseModel):
     user_id: int
 
@@ -47,20 +69,23 @@ class ResponseSchema(BaseModel):
     question_id: int
     score: int
 
+class AutosaveRequest(BaseModel):
+    test_id: int
+    seq: int  # client sequence number, increasing per batch
+    responses: List[ResponseSchema] = Field(..., max_length=len(MBI_QUESTIONS))
+
 class TestSubmission(BaseModel):
     user_id: int
     responses: List[ResponseSchema]
     test_id: Optional[int] = None
 
-@router.get("/test")
+@router.get("/test", dependencies=[Depends(immutable_resource(MBI_QUESTIONS))])
 def get_test():
     return {"questions": MBI_QUESTIONS}
 
 @router.post("/start-test")
-def start_test(request: StartTestRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == request.user_id).first()
-    if not user:
-        raise HTTPException(status_code=400, detail="User does not exist")
+def start_test(request: StartTestRequest, db: Session = Depends(get_db), caller_id: Optional[int] = Depends(current_user_id)):
+    ensure_user(db, request.user_id, caller_id, 400, "User does not exist")
     
     # Check if user already has an incomplete test
     existing_test = db.query(Test).filter(
@@ -106,6 +131,60 @@ def save_response(request: SaveResponseRequest, db: Session = Depends(get_db)):
     db.commit()
     return {"message": "Response saved successfully"}
 
+@router.post("/save-responses")
+def save_responses(request: AutosaveRequest, db: Session = Depends(get_db)):
+    """Autosave a batch of answers for an in-progress test.
+
+    Last write wins per answer: each stored score keeps the seq of the batch
+    that wrote it and is only replaced by a higher one, so a retried or late
+    batch cannot overwrite newer answers but still saves the ones it alone
+    carries. Answers the merged progress in the /test-progress shape, plus the
+    highest seq seen; `applied` is false when some answers were older than
+    the stored ones, and the client then re-sends its current values.
+    """
+    scores = {}
+    for response in request.responses:
+        if response.question_id not in QUESTION_CATEGORIES:
+            raise HTTPException(status_code=400, detail="Invalid question ID")
+        scores[response.question_id] = response.score
+
+    # Locks the test row, so concurrent batches for one test apply one after the other
+    test = db.execute(
+        update(Test)
+        .where(Test.id == request.test_id, Test.completed == False)
+        .values(autosave_seq=case((Test.autosave_seq < request.seq, request.seq), else_=Test.autosave_seq))
+        .returning(Test.id)
+    ).first()
+    if not test:
+        raise HTTPException(status_code=400, detail="Test not found or already completed")
+
+    stored = set()
+    if scores:
+        upsert = dialect_insert(db, Response).values([
+            {"test_id": request.test_id, "question_id": question_id, "score": score, "seq": request.seq}
+            for question_id, score in scores.items()
+        ])
+        stored = set(db.scalars(upsert.on_conflict_do_update(
+            index_elements=["test_id", "question_id"],
+            set_={"score": upsert.excluded.score, "seq": upsert.excluded.seq},
+            where=Response.seq < upsert.excluded.seq
+        ).returning(Response.question_id)))
+    db.commit()
+
+    test = db.query(Test.completed, Test.autosave_seq).filter(Test.id == request.test_id).first()
+    if not test or test.completed:
+        raise HTTPException(status_code=400, detail="Test not found or already completed")
+
+    responses = db.query(Response.question_id, Response.score).filter(Response.test_id == request.test_id).all()
+
+    return {
+        "test_id": request.test_id,
+        "completed": test.completed,
+        "responses": {str(r.question_id): r.score for r in responses},
+        "seq": test.autosave_seq,
+        "applied": stored == set(scores)
+    }
+
 @router.get("/test-progress/{test_id}")
 def get_test_progress(test_id: int, db: Session = Depends(get_db)):
     test = db.query(Test).filter(Test.id == test_id).first()
@@ -121,10 +200,8 @@ def get_test_progress(test_id: int, db: Session = Depends(get_db)):
     }
 
 @router.get("/in-progress-test/{user_id}")
-def get_in_progress_test(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def get_in_progress_test(user_id: int, db: Session = Depends(get_db), caller_id: Optional[int] = Depends(current_user_id)):
+    ensure_user(db, user_id, caller_id)
     
     in_progress_test = db.query(Test).filter(
         Test.user_id == user_id,
@@ -137,48 +214,20 @@ def get_in_progress_test(user_id: int, db: Session = Depends(get_db)):
     return {"test_id": in_progress_test.id}
 
 @router.post("/submit")
-def submit_test(submission: TestSubmission, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == submission.user_id).first()
-    if not user:
-        raise HTTPException(status_code=400, detail="User does not exist")
-
-    # Check if we're completing an existing test or creating a new one
-    test_entry = None
-    if submission.test_id:
-        test_entry = db.query(Test).filter(
-            Test.id == submission.test_id,
-            Test.user_id == submission.user_id,
-            Test.completed == False
-        ).first()
-    
-    # If no existing test was found, create a new one
-    if not test_entry:
-        test_entry = Test(user_id=submission.user_id, completed=False)
-        db.add(test_entry)
-        db.commit()
-        db.refresh(test_entry)
-    
-    categories = {"emotional_exhaustion": 0, "depersonalization": 0, "personal_accomplishment": 0}
+def submit_test(submission: TestSubmission, db: Session = Depends(get_db), caller_id: Optional[int] = Depends(current_user_id)):
+    ensure_user(db, submission.user_id, caller_id, 400, "User does not exist")
 
+    # Validate and score everything before touching the database; a repeated question keeps its last score
+    scores = {}
     for response in submission.responses:
-        # Categorizing responses
-        question = next((q for q in MBI_QUESTIONS if q["id"] == response.question_id), None)
-        if question:
-            categories[question["category"]] += response.score
-        else:
+        if response.question_id not in QUESTION_CATEGORIES:
             raise HTTPException(status_code=400, detail="Invalid question ID")
+        scores[response.question_id] = response.score
 
-        # Store response in database
-        existing_response = db.query(Response).filter(
-            Response.test_id == test_entry.id,
-            Response.question_id == response.question_id
-        ).first()
-        
-        if existing_response:
-            existing_response.score = response.score
-        else:
-            response_entry = Response(test_id=test_entry.id, question_id=response.question_id, score=response.score)
-            db.add(response_entry)
+    # Summed from the deduplicated scores, so the subscales match the stored responses
+    categories = {"emotional_exhaustion": 0, "depersonalization": 0, "personal_accomplishment": 0}
+    for question_id, score in scores.items():
+        categories[QUESTION_CATEGORIES[question_id]] += score
 
     # Calculate scores and levels
     emotional_exhaustion_score = categories["emotional_exhaustion"]
@@ -195,18 +244,54 @@ def submit_test(submission: TestSubmission, db: Session = Depends(get_db)):
     elif emotional_exhaustion_score > 18 or depersonalization_score > 9:
         burnout_level = "Moderate"
 
-    # Update the test with scores and mark as completed
-    test_entry.emotional_exhaustion_score = emotional_exhaustion_score
-    test_entry.depersonalization_score = depersonalization_score
-    test_entry.personal_accomplishment_score = personal_accomplishment_score
-    test_entry.emotional_exhaustion_level = emotional_exhaustion_level
-    test_entry.depersonalization_level = depersonalization_level
-    test_entry.personal_accomplishment_level = personal_accomplishment_level
-    test_entry.burnout_level = burnout_level
-    test_entry.completed = True  # Mark as completed
-    
+    results = {
+        "emotional_exhaustion_score": emotional_exhaustion_score,
+        "depersonalization_score": depersonalization_score,
+        "personal_accomplishment_score": personal_accomplishment_score,
+        "emotional_exhaustion_level": emotional_exhaustion_level,
+        "depersonalization_level": depersonalization_level,
+        "personal_accomplishment_level": personal_accomplishment_level,
+        "burnout_level": burnout_level,
+        "completed": True,
+    }
+
+    # Complete the in-progress test in one UPDATE ... RETURNING, or create it already completed
+    test_entry = None
+    if submission.test_id:
+        test_entry = db.execute(
+            update(Test)
+            .where(Test.id == submission.test_id, Test.user_id == submission.user_id, Test.completed == False)
+            .values(**results)
+            .returning(Test.id, Test.created_at)
+        ).first()
+    if not test_entry:
+        test_entry = db.execute(
+            insert(Test)
+            .values(user_id=submission.user_id, **results)
+            .returning(Test.id, Test.created_at)
+        ).first()
+
+    # All answers in one multi-row upsert on (test_id, question_id)
+    if scores:
+        upsert = dialect_insert(db, Response).values([
+            {"test_id": test_entry.id, "question_id": question_id, "score": score}
+            for question_id, score in scores.items()
+        ])
+        db.execute(upsert.on_conflict_do_update(
+            index_elements=["test_id", "question_id"],
+            set_={"score": upsert.excluded.score}
+        ))
+
+    # Streak and cohort updates run after the commit, from the outbox
+    enqueue(db, "test.completed", {
+        "user_id": submission.user_id,
+        "test_id": test_entry.id,
+        "created_at": test_entry.created_at.isoformat(),
+        "burnout_level": burnout_level,
+        **{f"{subscale}_score": categories[subscale] for subscale in SUBSCALES},
+    })
+    bump_data_version(db, submission.user_id)
     db.commit()
-    db.refresh(test_entry)
 
     return {
         "user_id": submission.user_id,
@@ -220,28 +305,30 @@ def submit_test(submission: TestSubmission, db: Session = Depends(get_db)):
         "burnout_level": burnout_level
     }
 
-@router.get("/tests/{user_id}")
-def get_tests_by_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def test_summaries_select(user_id: int):
+    """Core select of the columns the test list returns, newest first"""
+    return (
+        select(
+            Test.id,
+            Test.created_at,
+            Test.emotional_exhaustion_score,
+            Test.emotional_exhaustion_level,
+            Test.depersonalization_score,
+            Test.depersonalization_level,
+            Test.personal_accomplishment_score,
+            Test.personal_accomplishment_level,
+            Test.burnout_level,
+        )
+        .where(Test.user_id == user_id)
+        .order_by(Test.created_at.desc())
+    )
+
+def completed_test_summaries(db: Session, user_id: int):
+    return row_dicts(db.execute(test_summaries_select(user_id).where(Test.completed == True)))
 
-    tests = db.query(Test).filter(
-        Test.user_id == user_id,
-        Test.completed == True  # Only return completed tests
-    ).order_by(Test.created_at.desc()).all()
-
-    return [
-        {
-            "id": test.id,
-            "created_at": test.created_at,
-            "emotional_exhaustion_score": test.emotional_exhaustion_score,
-            "emotional_exhaustion_level": test.emotional_exhaustion_level,
-            "depersonalization_score": test.depersonalization_score,
-            "depersonalization_level": test.depersonalization_level,
-            "personal_accomplishment_score": test.personal_accomplishment_score,
-            "personal_accomplishment_level": test.personal_accomplishment_level,
-            "burnout_level": test.burnout_level,
-        }
-        for test in tests
-    ]
\ No newline at end of file
+@router.get("/tests/{user_id}", response_model=List[TestSummary], dependencies=[Depends(user_etag)])
+def get_tests_by_user(user_id: int, response: HTTPResponse, db: Session = Depends(get_db), caller_id: Optional[int] = Depends(current_user_id)):
+    ensure_user(db, user_id, caller_id)
+
+    # Only return completed tests
+    return json_response(completed_test_summaries(db, user_id), response)
@@ -0,0 +1,197 @@
+"""Request instrumentation: per-route latency and per-request SQL accounting.
+
+MetricsMiddleware times every request by route template and keeps a
+RequestStats for it in a context variable, which the cursor hooks of
+both engines (installed by database._on_connect) fill with the number
+of statements and the time spent in them. Sync endpoints see the same
+object, since the threadpool runs them in a copy of the request context.
+Statements outside a request (outbox workers, CLIs) are not counted.
+
+Each response carries the totals as a Server-Timing header
+(app;dur=..., db;dur=...;desc="N queries", in ms), and /metrics renders
+everything in the Prometheus text format. Recording and rendering run
+on the event loop, so the route registry needs no locks. METRICS=0 turns all
+of it off.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+METRICS_ENABLED = os.getenv("METRICS", "1") == "1"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)  # statements per request; many more means N+1
+UNMATCHED_ROUTE = "unmatched"
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+_request_stats: ContextVar = ContextVar("request_stats", default=None)
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+class RouteMetrics:
+    __slots__ = ("duration", "statements", "db_seconds", "responses")
+
+    def __init__(self):
+        self.duration = Histogram(LATENCY_BUCKETS)
+        self.statements = Histogram(STATEMENT_BUCKETS)
+        self.db_seconds = 0.0
+        self.responses = {}  # status code -> count
+
+routes = {}  # (method, route template) -> RouteMetrics
+handled_errors = {}  # where -> count of exceptions caught and answered with a fallback
+_handled_errors_lock = threading.Lock()  # counted from threadpool threads
+
+def count_handled_error(where: str):
+    """For except blocks that swallow an error; these do not show up as 5xx"""
+    with _handled_errors_lock:
+        handled_errors[where] = handled_errors.get(where, 0) + 1
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _request_stats.get() is not None:
+        context._metrics_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_stats.get()
+    started = getattr(context, "_metrics_started", None)
+    if stats is not None and started is not None:
+        stats.statements += 1
+        stats.db_seconds += time.perf_counter() - started
+
+def instrument_engine(bound):
+    if METRICS_ENABLED:
+        event.listen(bound, "before_cursor_execute", _before_cursor_execute)
+        event.listen(bound, "after_cursor_execute", _after_cursor_execute)
+
+class MetricsMiddleware:
+    """ASGI middleware recording route metrics and adding the Server-Timing header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = (
+                    f"app;dur={(time.perf_counter() - started) * 1000:.1f}, "
+                    f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.statements} queries"'
+                )
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", timing.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stats.reset(token)
+            # The router leaves the matched route in the scope; raw paths would explode the label set
+            route = scope.get("route")
+            key = (scope["method"], getattr(route, "path", UNMATCHED_ROUTE))
+            metrics = routes.get(key)
+            if metrics is None:
+                metrics = routes[key] = RouteMetrics()
+            metrics.duration.observe(time.perf_counter() - started)
+            metrics.statements.observe(stats.statements)
+            metrics.db_seconds += stats.db_seconds
+            metrics.responses[status] = metrics.responses.get(status, 0) + 1
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+def _histogram_lines(name, histogram, labels):
+    cumulative = 0
+    for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+        cumulative += count
+        yield f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}"
+    yield f"{name}_sum{_labels(**labels)} {histogram.total}"
+    yield f"{name}_count{_labels(**labels)} {histogram.count}"
+
+def render_metrics(pool_stats, admission_stats, outbox_stats) -> str:
+    """Prometheus text exposition of the route metrics, connection pools, admission limits and outbox backlog"""
+    lines = [
+        "# HELP http_request_duration_seconds Request latency by route template",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route), metrics in sorted(routes.items()):
+        lines.extend(_histogram_lines("http_request_duration_seconds", metrics.duration, {"method": method, "route": route}))
+
+    lines += ["# HELP http_requests_total Responses by route template and status", "# TYPE http_requests_total counter"]
+    for (method, route), metrics in sorted(routes.items()):
+        for status, count in sorted(metrics.responses.items()):
+            lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+    lines += ["# HELP http_request_db_statements SQL statements per request", "# TYPE http_request_db_statements histogram"]
+    for (method, route), metrics in sorted(routes.items()):
+        lines.extend(_histogram_lines("http_request_db_statements", metrics.statements, {"method": method, "route": route}))
+
+    lines += ["# HELP http_request_db_seconds_total Time spent executing SQL", "# TYPE http_request_db_seconds_total counter"]
+    for (method, route), metrics in sorted(routes.items()):
+        lines.append(f"http_request_db_seconds_total{_labels(method=method, route=route)} {metrics.db_seconds}")
+
+    lines += ["# HELP handled_errors_total Exceptions caught and answered with a fallback", "# TYPE handled_errors_total counter"]
+    with _handled_errors_lock:
+        errors = sorted(handled_errors.items())
+    for where, count in errors:
+        lines.append(f"handled_errors_total{_labels(where=where)} {count}")
+
+    pool_series = {
+        "db_pool_checked_out": ("gauge", "Connections checked out", "checked_out"),
+        "db_pool_checkouts_total": ("counter", "Connection checkouts", "checkouts"),
+        "db_pool_waits_total": ("counter", "Checkouts that found the pool exhausted", "waits"),
+        "db_pool_timeouts_total": ("counter", "Checkouts that timed out", "timeouts"),
+    }
+    for name, (kind, help_text, key) in pool_series.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for engine_name, description in sorted(pool_stats.items()):
+            if isinstance(description, dict) and key in description:
+                lines.append(f"{name}{_labels(engine=engine_name)} {description[key]}")
+
+    admission_series = {
+        "admission_limit": ("gauge", "Current adaptive concurrency limit", "limit"),
+        "admission_in_flight": ("gauge", "Requests holding a slot", "in_flight"),
+        "admission_queued": ("gauge", "Requests waiting for a slot", "queued"),
+        "admission_shed_total": ("counter", "Requests answered 503 by admission control", "shed"),
+    }
+    for name, (kind, help_text, key) in admission_series.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for route_class, stats in sorted(admission_stats.items()):
+            lines.append(f"{name}{_labels(route_class=route_class)} {stats[key]}")
+
+    lines += [
+        "# HELP outbox_pending_events Outbox events waiting to be processed", "# TYPE outbox_pending_events gauge",
+        f"outbox_pending_events {outbox_stats['pending']}",
+        "# HELP outbox_failed_events Outbox events parked after exhausting their retries", "# TYPE outbox_failed_events gauge",
+        f"outbox_failed_events {outbox_stats['failed']}",
+    ]
+
+    return "\n".join(lines) + "\n"
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import Float, case, cast, func, select
 from sqlalchemy.orm import Session
+from auth import current_user_id, ensure_user
+from data_versions import bump_data_version, user_etag
+from json_responses import json_response, row_dicts
 from database import get_db
+from outbox import enqueue
+from risk_scoring import MICRO_RISK_WEIGHTS, RISK_MODEL_VERSION, score_micro_assessment
 from models import User, MicroAssessment
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from datetime import datetime, timedelta
 from typing import List, Optional
 
@@ -29,29 +35,14 @@ class MicroAssessmentResponse(BaseModel):
     burnout_risk_score: float
     created_at: datetime
 
-    class Config:
-        orm_mode = True 
+    model_config = ConfigDict(from_attributes=True)
 
 @router.post("/micro-assessment", response_model=MicroAssessmentResponse)
-def create_micro_assessment(assessment: MicroAssessmentCreate, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == assessment.user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def create_micro_assessment(assessment: MicroAssessmentCreate, db: Session = Depends(get_db), caller_id: Optional[int] = Depends(current_user_id)):
+    ensure_user(db, assessment.user_id, caller_id)
     
-    # Calculate burnout risk score (1-10 scale)
-    # Higher fatigue and stress increase the score
-    # Higher work satisfaction, sleep quality, and support feeling decrease the score
-    risk_score = (
-        (assessment.fatigue_level + assessment.stress_level) * 0.6 +
-        (6 - assessment.work_satisfaction) * 0.15 +
-        (6 - assessment.sleep_quality) * 0.15 +
-        (6 - assessment.support_feeling) * 0.1
-    )
-    
-    # Normalize to 1-10 scale
-    normalized_score = (risk_score / 5) * 10
-    # Ensure the score stays within 1-10 range
-    final_score = max(1, min(10, normalized_score))
+    # Burnout risk score (1-10 scale), see risk_scoring for the weights
+    risk_score = score_micro_assessment(**{metric: getattr(assessment, metric) for metric in MICRO_RISK_WEIGHTS})
     
     new_assessment = MicroAssessment(
         user_id=assessment.user_id,
@@ -61,32 +52,41 @@ def create_micro_assessment(assessment: MicroAssessmentCreate, db: Session = Dep
         sleep_quality=assessment.sleep_quality,
         support_feeling=assessment.support_feeling,
         comments=assessment.comments,
-        burnout_risk_score=round(final_score, 1)
+        burnout_risk_score=risk_score,
+        risk_score_version=RISK_MODEL_VERSION
     )
     
     db.add(new_assessment)
+    db.flush()
+    enqueue(db, "micro_assessment.created", {
+        "user_id": assessment.user_id,
+        "created_at": new_assessment.created_at.isoformat(),
+    })
+    bump_data_version(db, assessment.user_id)
     db.commit()
     db.refresh(new_assessment)
     
     return new_assessment
 
-@router.get("/micro-assessment/{user_id}", response_model=List[MicroAssessmentResponse])
-def get_micro_assessments(user_id: int, limit: int = 10, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    assessments = db.query(MicroAssessment).filter(
-        MicroAssessment.user_id == user_id
-    ).order_by(MicroAssessment.created_at.desc()).limit(limit).all()
+def recent_micro_assessments(db: Session, user_id: int, limit: int):
+    # Only the response columns, as Core rows
+    columns = [getattr(MicroAssessment, name) for name in MicroAssessmentResponse.model_fields]
+    return row_dicts(db.execute(
+        select(*columns)
+        .where(MicroAssessment.user_id == user_id)
+        .order_by(MicroAssessment.created_at.desc())
+        .limit(limit)
+    ))
+
+@router.get("/micro-assessment/{user_id}", response_model=List[MicroAssessmentResponse], dependencies=[Depends(user_etag)])
+def get_micro_assessments(user_id: int, response: Response, limit: int = 10, db: Session = Depends(get_db), caller_id: Optional[int] = Depends(current_user_id)):
+    ensure_user(db, user_id, caller_id)
     
-    return assessments
+    return json_response(recent_micro_assessments(db, user_id, limit), response)
 
-@router.get("/micro-assessment/latest/{user_id}", response_model=MicroAssessmentResponse)
-def get_latest_micro_assessment(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+@router.get("/micro-assessment/latest/{user_id}", response_model=MicroAssessmentResponse, dependencies=[Depends(user_etag)])
+def get_latest_micro_assessment(user_id: int, db: Session = Depends(get_db), caller_id: Optional[int] = Depends(current_user_id)):
+    ensure_user(db, user_id, caller_id)
     
     assessment = db.query(MicroAssessment).filter(
         MicroAssessment.user_id == user_id
@@ -97,40 +97,45 @@ def get_latest_micro_assessment(user_id: int, db: Session = Depends(get_db)):
     
     return assessment
 
+TREND_METRICS = ("fatigue_level", "stress_level", "work_satisfaction", "sleep_quality", "support_feeling", "burnout_risk_score")
+TREND_EDGE_SIZE = 7  # assessments compared at each end of the window
+
+def trend_summary_select(user_id: int, start_date: datetime):
+    """One row for the window: count, metric averages, risk extremes, and the
+    average risk of the first and last min(7, n // 2) assessments"""
+    table = MicroAssessment.__table__
+    ordered = select(
+        *(table.c[metric] for metric in TREND_METRICS),
+        func.row_number().over(order_by=(table.c.created_at, table.c.id)).label("ordinal"),
+        func.count().over().label("total"),
+    ).where(table.c.user_id == user_id, table.c.created_at >= start_date).subquery()
+
+    risk = ordered.c.burnout_risk_score
+    edge = case((ordered.c.total // 2 < TREND_EDGE_SIZE, ordered.c.total // 2), else_=TREND_EDGE_SIZE)
+    return select(
+        func.count().label("data_points"),
+        *(cast(func.avg(ordered.c[metric]), Float).label(metric) for metric in TREND_METRICS),
+        func.max(risk).label("highest_risk_score"),
+        func.min(risk).label("lowest_risk_score"),
+        cast(func.avg(case((ordered.c.ordinal <= edge, risk))), Float).label("first_risk_average"),
+        cast(func.avg(case((ordered.c.ordinal > ordered.c.total - edge, risk))), Float).label("last_risk_average"),
+    )
+
 @router.get("/micro-assessment/trend/{user_id}")
-def get_micro_assessment_trend(user_id: int, days: int = 30, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Get assessments for the specified number of days
-    from datetime import timedelta
+def get_micro_assessment_trend(user_id: int, days: int = 30, db: Session = Depends(get_db), caller_id: Optional[int] = Depends(current_user_id)):
+    ensure_user(db, user_id, caller_id)
     
+    # Aggregated in the database: a single row comes back however long the window
     start_date = datetime.utcnow() - timedelta(days=days)
+    summary = db.execute(trend_summary_select(user_id, start_date)).one()
     
-    assessments = db.query(MicroAssessment).filter(
-        MicroAssessment.user_id == user_id,
-        MicroAssessment.created_at >= start_date
-    ).order_by(MicroAssessment.created_at.asc()).all()
-    
-    if not assessments:
+    if not summary.data_points:
         return {"message": "No data available for trend analysis"}
     
-    # Calculate average scores for each metric
-    avg_fatigue = sum(a.fatigue_level for a in assessments) / len(assessments)
-    avg_stress = sum(a.stress_level for a in assessments) / len(assessments)
-    avg_work_satisfaction = sum(a.work_satisfaction for a in assessments) / len(assessments)
-    avg_sleep_quality = sum(a.sleep_quality for a in assessments) / len(assessments)
-    avg_support = sum(a.support_feeling for a in assessments) / len(assessments)
-    avg_risk_score = sum(a.burnout_risk_score for a in assessments) / len(assessments)
-    
     # Check if risk score is increasing or decreasing
-    if len(assessments) >= 2:
-        first_week = assessments[:min(7, len(assessments)//2)]
-        last_week = assessments[-min(7, len(assessments)//2):]
-        
-        first_week_avg = sum(a.burnout_risk_score for a in first_week) / len(first_week)
-        last_week_avg = sum(a.burnout_risk_score for a in last_week) / len(last_week)
+    if summary.data_points >= 2:
+        first_week_avg = summary.first_risk_average
+        last_week_avg = summary.last_risk_average
         
         trend = "increasing" if last_week_avg > first_week_avg else "decreasing" if last_week_avg < first_week_avg else "stable"
         trend_percentage = abs(last_week_avg - first_week_avg) / first_week_avg * 100 if first_week_avg > 0 else 0
@@ -139,19 +144,12 @@ def get_micro_assessment_trend(user_id: int, days: int = 30, db: Session = Depen
         trend_percentage = 0
     
     return {
-        "average_scores": {
-            "fatigue_level": round(avg_fatigue, 1),
-            "stress_level": round(avg_stress, 1),
-            "work_satisfaction": round(avg_work_satisfaction, 1),
-            "sleep_quality": round(avg_sleep_quality, 1),
-            "support_feeling": round(avg_support, 1),
-            "burnout_risk_score": round(avg_risk_score, 1)
-        },
+        "average_scores": {metric: round(getattr(summary, metric), 1) for metric in TREND_METRICS},
         "trend": {
             "direction": trend,
             "percentage_change": round(trend_percentage, 1)
         },
-        "data_points": len(assessments),
-        "highest_risk_score": max(a.burnout_risk_score for a in assessments),
-        "lowest_risk_score": min(a.burnout_risk_score for a in assessments),
+        "data_points": summary.data_points,
+        "highest_risk_score": summary.highest_risk_score,
+        "lowest_risk_score": summary.lowest_risk_score,
     }
\ No newline at end of file
@@ -0,0 +1,274 @@
+"""Versioned schema migrations.
+
+create_tables() only creates missing tables, so anything that changes an
+existing table (indexes, columns, data backfills) ships as a numbered
+migration here. Applied versions are recorded in schema_migrations.
+
+Usage: python migrations.py upgrade | status
+
+Steps run on an autocommit connection so Postgres indexes can be built
+with CREATE INDEX CONCURRENTLY, without blocking writes. Every step is
+idempotent, so an interrupted upgrade can simply be rerun. Concurrent
+runners are serialized with an advisory lock on Postgres.
+"""
+import sys
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, bindparam, inspect, select, text
+from sqlalchemy.orm import Session
+
+from database import engine
+from models import create_tables
+
+ADVISORY_LOCK_ID = 0x6275726E  # "burn"
+BACKFILL_CHUNK_SIZE = 1000  # rows per statement in data backfills; each chunk commits on its own
+
+metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+def _is_postgres(conn):
+    return conn.dialect.name == "postgresql"
+
+def create_index(conn, name, table, columns, unique=False, using=None):
+    if _is_postgres(conn):
+        # A failed concurrent build leaves an INVALID index behind; drop it and build again
+        invalid = conn.execute(text(
+            "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {"name": name}).first()
+        if invalid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        concurrently = "CONCURRENTLY "
+    else:
+        concurrently = ""
+
+    conn.execute(text(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX {concurrently}IF NOT EXISTS {name} "
+        f"ON {table} {f'USING {using} ' if using else ''}({', '.join(columns)})"
+    ))
+
+def add_column(conn, table, name, ddl):
+    existing = {column["name"] for column in inspect(conn).get_columns(table)}
+    if name not in existing:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+def drop_index(conn, name):
+    conn.execute(text(f"DROP INDEX {'CONCURRENTLY ' if _is_postgres(conn) else ''}IF EXISTS {name}"))
+
+def delete_duplicates(conn, table, key_columns, keep="min"):
+    """Delete rows sharing key_columns, keeping the lowest (or highest) id.
+
+    Works through id ranges of BACKFILL_CHUNK_SIZE, each deleted and committed on
+    its own, so no statement locks more than one range. A temporary index on
+    key_columns keeps the duplicate lookups cheap.
+    """
+    helper = f"ix_{table}_dedup"
+    create_index(conn, helper, table, key_columns)
+    same_key = " AND ".join(f"other.{column} = t.{column}" for column in key_columns)
+    kept = "other.id < t.id" if keep == "min" else "other.id > t.id"
+    low, high = conn.execute(text(f"SELECT min(id), max(id) FROM {table}")).one()
+    for start in range(low or 0, (high or -1) + 1, BACKFILL_CHUNK_SIZE):
+        conn.execute(text(
+            f"DELETE FROM {table} AS t WHERE t.id >= :start AND t.id < :end "
+            f"AND EXISTS (SELECT 1 FROM {table} other WHERE {same_key} AND {kept})"
+        ), {"start": start, "end": start + BACKFILL_CHUNK_SIZE})
+    drop_index(conn, helper)
+
+def _access_path_indexes(conn):
+    create_index(conn, "ix_moods_user_created", "moods", ["user_id", "created_at"])
+    create_index(conn, "ix_micro_assessments_user_created", "micro_assessments", ["user_id", "created_at"])
+    create_index(conn, "ix_tests_user_completed_created", "tests", ["user_id", "completed", "created_at"])
+    create_index(conn, "ix_journals_user_created", "journals", ["user_id", "created_at"])
+
+def _unique_indexes(conn):
+    delete_duplicates(conn, "health_data", ["user_id", "recorded_at"], keep="min")
+    create_index(conn, "uq_health_data_user_recorded", "health_data", ["user_id", "recorded_at"], unique=True)
+    # save-response/submit update in place, so a duplicate is a lost race; the newest score wins
+    delete_duplicates(conn, "responses", ["test_id", "question_id"], keep="max")
+    create_index(conn, "uq_responses_test_question", "responses", ["test_id", "question_id"], unique=True)
+
+def _health_permission(conn):
+    add_column(conn, "users", "health_permission", "BOOLEAN NOT NULL DEFAULT false")
+
+def _backfill_health_rollups(conn):
+    from health_rollups import rebuild_rollups
+
+    # The rebuild marks samples through health_data.rolled_up (migration 12)
+    _health_data_rolled_up(conn)
+    db = Session(bind=engine)
+    try:
+        rebuild_rollups(db)
+    finally:
+        db.close()
+
+def _autosave_seq(conn):
+    add_column(conn, "tests", "autosave_seq", "BIGINT NOT NULL DEFAULT 0")
+
+def _response_seq(conn):
+    add_column(conn, "responses", "seq", "BIGINT NOT NULL DEFAULT 0")
+
+def _unflag_pending(conn, topic, ids_of, table, flag):
+    """Clear a "counted" flag on the rows whose outbox events (of topic) are still waiting"""
+    outbox = Table("outbox_events", MetaData(), autoload_with=conn)
+    rows = Table(table, MetaData(), autoload_with=conn)
+    pending = [
+        row_id for payload in conn.scalars(select(outbox.c.payload).where(outbox.c.topic == topic))
+        for row_id in ids_of(payload)
+    ]
+    for start in range(0, len(pending), BACKFILL_CHUNK_SIZE):
+        conn.execute(rows.update().where(rows.c.id.in_(pending[start:start + BACKFILL_CHUNK_SIZE])).values({flag: False}))
+
+def _health_data_rolled_up(conn):
+    # Existing samples were rolled up by migration 4 or on ingest; new ones start out false
+    add_column(conn, "health_data", "rolled_up", "BOOLEAN NOT NULL DEFAULT true")
+    if _is_postgres(conn):
+        conn.execute(text("ALTER TABLE health_data ALTER COLUMN rolled_up SET DEFAULT false"))
+    # except those whose events are still waiting in the outbox
+    _unflag_pending(conn, "health.synced", lambda payload: payload["sample_ids"], "health_data", "rolled_up")
+
+def _tests_cohort_counted(conn):
+    # Existing tests are counted by migration 10 or were by the outbox; new ones start out false
+    add_column(conn, "tests", "cohort_counted", "BOOLEAN NOT NULL DEFAULT true")
+    if _is_postgres(conn):
+        conn.execute(text("ALTER TABLE tests ALTER COLUMN cohort_counted SET DEFAULT false"))
+    # except those whose events are still waiting in the outbox
+    _unflag_pending(conn, "test.completed", lambda payload: [payload["test_id"]], "tests", "cohort_counted")
+
+def _journal_excerpts(conn):
+    from journal_service import make_excerpt
+    from text_compression import plain_text
+
+    add_column(conn, "journals", "excerpt", "VARCHAR")
+    journals = Table("journals", MetaData(), autoload_with=conn)
+    while True:
+        rows = conn.execute(
+            select(journals.c.id, journals.c.content)
+            .where(journals.c.excerpt.is_(None))
+            .limit(BACKFILL_CHUNK_SIZE)
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            journals.update().where(journals.c.id == bindparam("row_id")).values(excerpt=bindparam("excerpt")),
+            [{"row_id": row.id, "excerpt": make_excerpt(plain_text(row.content))} for row in rows]
+        )
+
+def _journal_search(conn):
+    from models.journal import FTS5_DDL, SEARCH_INDEX, SEARCH_VECTOR_DDL, SEARCH_VECTOR_EXPRESSION
+
+    if _is_postgres(conn):
+        # Column and trigger first, so rows written during the backfill are covered
+        for statement in SEARCH_VECTOR_DDL:
+            conn.execute(text(statement))
+        last_id = 0
+        while True:
+            ids = conn.scalars(
+                text("SELECT id FROM journals WHERE id > :after ORDER BY id LIMIT :limit"),
+                {"after": last_id, "limit": BACKFILL_CHUNK_SIZE}
+            ).all()
+            if not ids:
+                break
+            conn.execute(text(
+                f"UPDATE journals SET search_vector = {SEARCH_VECTOR_EXPRESSION.format(row='')} "
+                "WHERE id BETWEEN :first AND :last AND search_vector IS NULL"
+            ), {"first": ids[0], "last": ids[-1]})
+            last_id = ids[-1]
+        create_index(conn, SEARCH_INDEX, "journals", ["search_vector"], using="gin")
+    else:
+        for statement in FTS5_DDL:
+            conn.execute(text(statement))
+        # Index the rows written before the triggers existed
+        conn.execute(text("INSERT INTO journals_fts(journals_fts) VALUES ('rebuild')"))
+
+def _journal_compression(conn):
+    from models.journal import FTS5_DDL, FTS5_DROP
+
+    if _is_postgres(conn):
+        # Applies to values written from now on; older ones keep pglz until rewritten.
+        # lz4 needs Postgres 14+ built --with-lz4, which default_toast_compression's choices reveal
+        lz4 = conn.execute(text(
+            "SELECT 'lz4' = ANY(enumvals) FROM pg_settings WHERE name = 'default_toast_compression'"
+        )).scalar()
+        if lz4:
+            conn.execute(text("ALTER TABLE journals ALTER COLUMN content SET COMPRESSION lz4"))
+            conn.execute(text("ALTER TABLE journals ALTER COLUMN analysis SET COMPRESSION lz4"))
+        else:
+            print("  lz4 is not available on this server: journal text keeps pglz compression")
+    else:
+        # Rebuild the FTS5 index on journal_text(), which reads compressed content
+        for statement in FTS5_DROP + FTS5_DDL:
+            conn.execute(text(statement))
+        conn.execute(text("INSERT INTO journals_fts(journals_fts) VALUES ('rebuild')"))
+
+def _risk_score_version(conn):
+    # Existing scores came from the first risk model
+    add_column(conn, "micro_assessments", "risk_score_version", "INTEGER NOT NULL DEFAULT 1")
+
+def _backfill_cohort_stats(conn):
+    from cohort_stats import rebuild_cohort_stats
+
+    _tests_cohort_counted(conn)
+    db = Session(bind=engine)
+    try:
+        rebuild_cohort_stats(db)
+    finally:
+        db.close()
+
+MIGRATIONS = [
+    (1, "Composite (user_id, timestamp) indexes for per-user access paths", _access_path_indexes),
+    (2, "Unique health_data(user_id, recorded_at) and responses(test_id, question_id)", _unique_indexes),
+    (3, "users.health_permission", _health_permission),
+    (4, "Backfill health rollups from raw samples", _backfill_health_rollups),
+    (5, "tests.autosave_seq", _autosave_seq),
+    (6, "journals.excerpt, backfilled from content", _journal_excerpts),
+    (7, "Full-text search over journals: tsvector + GIN on Postgres, FTS5 on SQLite", _journal_search),
+    (8, "Journal text compression: lz4 TOAST on Postgres, FTS5 over journal_text() on SQLite", _journal_compression),
+    (9, "micro_assessments.risk_score_version", _risk_score_version),
+    (10, "Backfill cohort_weekly_stats from completed tests", _backfill_cohort_stats),
+    (11, "responses.seq, for last-write-wins autosave per answer", _response_seq),
+    (12, "health_data.rolled_up, so rollup rebuilds and the outbox count each sample once", _health_data_rolled_up),
+    (13, "tests.cohort_counted, so cohort rebuilds and the outbox count each test once", _tests_cohort_counted),
+]
+
+def applied_versions(conn):
+    return {row[0] for row in conn.execute(select(schema_migrations.c.version))}
+
+def upgrade():
+    create_tables()
+    metadata.create_all(bind=engine)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if _is_postgres(conn):
+            conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+        try:
+            done = applied_versions(conn)
+            for version, description, apply in MIGRATIONS:
+                if version in done:
+                    continue
+                print(f"→ {version}: {description}")
+                apply(conn)
+                conn.execute(schema_migrations.insert().values(version=version, description=description))
+            print("✅ Schema is up to date")
+        finally:
+            if _is_postgres(conn):
+                conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+
+def status():
+    metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        done = applied_versions(conn)
+    for version, description, _ in MIGRATIONS:
+        print(f"{'applied' if version in done else 'pending':>8}  {version}: {description}")
+
+if __name__ == "__main__":
+    commands = {"upgrade": upgrade, "status": status}
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        print("Usage: python migrations.py upgrade | status")
+        sys.exit(1)
+    commands[sys.argv[1]]()
@@ -5,4 +5,10 @@ from .response import Response
 from .mood import Mood
 from .journal import Journal
 from .micro_assessment import MicroAssessment
-from .health_data import HealthData
\ No newline at end of file
+from .health_data import HealthData
+from .activity import ActivityDay, UserStreak
+from .engagement import EngagementSnapshot
+from .health_rollup import HealthRollupHourly, HealthRollupDaily
+from .data_version import UserDataVersion
+from .cohort import CohortWeeklyStat
+from .outbox import OutboxEvent
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, Date, DateTime, ForeignKey
+from datetime import datetime
+from models.base import Base
+
+
+class ActivityDay(Base):
+    """One row per (user, UTC day) with at least one mood, completed test or micro-assessment"""
+    __tablename__ = "activity_days"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+
+class UserStreak(Base):
+    """Streak summary maintained alongside the activity ledger"""
+    __tablename__ = "user_streaks"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    current_run = Column(Integer, nullable=False, default=0)  # consecutive days ending on last_activity
+    longest_streak = Column(Integer, nullable=False, default=0)
+    total_assessments = Column(Integer, nullable=False, default=0)  # completed tests
+    last_activity = Column(Date, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
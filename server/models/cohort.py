@@ -0,0 +1,29 @@
+from sqlalchemy import BigInteger, Column, Date, String
+from models.base import Base
+
+# User profile fields cohort analytics break MBI results down by; ALL_USERS is the whole population
+COHORT_DIMENSIONS = ("specialty", "career_stage", "work_setting", "on_call_frequency")
+ALL_USERS = "all"
+UNKNOWN_COHORT = "unknown"  # profile field not filled in
+
+SUBSCALES = ("emotional_exhaustion", "depersonalization", "personal_accomplishment")
+
+
+class CohortWeeklyStat(Base):
+    """Completed MBI tests per cohort, week and burnout level, with subscale score sums.
+
+    Maintained incrementally from submit_test's outbox events; cohort_stats.py rebuilds it from tests.
+    """
+    __tablename__ = "cohort_weekly_stats"
+
+    dimension = Column(String, primary_key=True)  # one of COHORT_DIMENSIONS, or ALL_USERS
+    week_start = Column(Date, primary_key=True)  # Monday, UTC
+    cohort = Column(String, primary_key=True)
+    burnout_level = Column(String, primary_key=True)
+    test_count = Column(BigInteger, nullable=False, default=0)
+    emotional_exhaustion_sum = Column(BigInteger, nullable=False, default=0)
+    emotional_exhaustion_sum_sq = Column(BigInteger, nullable=False, default=0)
+    depersonalization_sum = Column(BigInteger, nullable=False, default=0)
+    depersonalization_sum_sq = Column(BigInteger, nullable=False, default=0)
+    personal_accomplishment_sum = Column(BigInteger, nullable=False, default=0)
+    personal_accomplishment_sum_sq = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,12 @@
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer
+from datetime import datetime
+from models.base import Base
+
+
+class UserDataVersion(Base):
+    """Per-user counter bumped by every write to the user's data; read endpoints derive ETags from it"""
+    __tablename__ = "user_data_versions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
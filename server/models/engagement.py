@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, Date, DateTime, ForeignKey
+from datetime import datetime
+from models.base import Base
+
+
+class EngagementSnapshot(Base):
+    """Nightly per-user engagement figures, one row per report date"""
+    __tablename__ = "engagement_snapshots"
+
+    report_date = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    current_streak = Column(Integer, nullable=False, default=0)
+    longest_streak = Column(Integer, nullable=False, default=0)
+    weekly_checkins = Column(Integer, nullable=False, default=0)
+    total_assessments = Column(Integer, nullable=False, default=0)
+    last_activity = Column(Date, nullable=True)
+    computed_at = Column(DateTime, default=datetime.utcnow)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, Float, ForeignKey
+from sqlalchemy import Boolean, Column, Integer, DateTime, Float, ForeignKey, Index, false
 from sqlalchemy.ext.declarative import declarative_base
 import enum
 from sqlalchemy.orm import relationship
@@ -8,6 +8,10 @@ from .base import Base
 
 class HealthData(Base):
     __tablename__ = "health_data"
+    __table_args__ = (
+        # One sample per user and timestamp; batch sync dedupes against it
+        Index("uq_health_data_user_recorded", "user_id", "recorded_at", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -18,5 +22,7 @@ class HealthData(Base):
     stress_level = Column(Float, nullable=True)  # score 0-1
     hrv = Column(Float, nullable=True)  # heart rate variability
     recorded_at = Column(DateTime, default=datetime.utcnow)
+    # Counted in health_rollups_*; set by the outbox handler or a rebuild (see health_rollups)
+    rolled_up = Column(Boolean, nullable=False, default=False, server_default=false())
     
     user = relationship("User", back_populates="health_data")
\ No newline at end of file
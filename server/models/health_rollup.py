@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey
+from sqlalchemy.orm import declared_attr
+from models.base import Base
+
+# Metrics rolled up from health_data, plus a pseudo-metric counting raw samples per bucket
+ROLLUP_METRICS = ("heart_rate", "sleep_duration", "sleep_quality", "steps", "stress_level", "hrv")
+SAMPLE_COUNT = "samples"
+
+
+class HealthRollupMixin:
+    @declared_attr
+    def user_id(cls):
+        return Column(Integer, ForeignKey("users.id"), primary_key=True)
+
+    bucket_start = Column(DateTime, primary_key=True)  # UTC, truncated to the hour/day
+    metric = Column(String, primary_key=True)
+    value_count = Column(Integer, nullable=False, default=0)
+    value_sum = Column(Float, nullable=False, default=0)
+    value_sum_sq = Column(Float, nullable=False, default=0)
+    value_min = Column(Float, nullable=True)
+    value_max = Column(Float, nullable=True)
+
+
+class HealthRollupHourly(HealthRollupMixin, Base):
+    __tablename__ = "health_rollups_hourly"
+
+
+class HealthRollupDaily(HealthRollupMixin, Base):
+    __tablename__ = "health_rollups_daily"
+
+    # heart_rate rows only: the day's five lowest readings (comma-separated), for resting HR
+    lowest_values = Column(String, nullable=True)
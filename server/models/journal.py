@@ -1,15 +1,69 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index, event, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from models.base import Base
+from text_compression import CompressedText
 
 class Journal(Base):
     __tablename__ = "journals"
+    __table_args__ = (Index("ix_journals_user_created", "user_id", "created_at"),)
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     title = Column(String, nullable=False)
-    content = Column(Text, nullable=False)
-    analysis = Column(Text, nullable=True)
+    content = Column(CompressedText, nullable=False)
+    analysis = Column(CompressedText, nullable=True)
+    excerpt = Column(String, nullable=True)  # start of content for list views, set on write
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    user = relationship("User", back_populates="journals")
\ No newline at end of file
+    user = relationship("User", back_populates="journals")
+
+# Full-text search lives outside the mapped columns. Postgres: a tsvector
+# (title weighted above content) set by a trigger, with a GIN index; a plain
+# column rather than a generated one, so adding it does not rewrite the table.
+# SQLite: an external-content FTS5 table kept in sync by triggers, reading
+# through journal_text() since content may be stored compressed.
+SEARCH_INDEX = "ix_journals_search_vector"
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('english', coalesce({row}title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce({row}content, '')), 'B')"
+)
+SEARCH_VECTOR_DDL = [
+    "ALTER TABLE journals ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    "CREATE OR REPLACE FUNCTION journals_search_vector() RETURNS trigger AS $$ BEGIN "
+    f"NEW.search_vector := {SEARCH_VECTOR_EXPRESSION.format(row='NEW.')}; RETURN NEW; END $$ LANGUAGE plpgsql",
+    "CREATE OR REPLACE TRIGGER journals_search_vector BEFORE INSERT OR UPDATE OF title, content ON journals "
+    "FOR EACH ROW EXECUTE FUNCTION journals_search_vector()",
+]
+FTS5_DDL = [
+    "CREATE VIEW IF NOT EXISTS journals_search_source AS "
+    "SELECT id, title, journal_text(content) AS content FROM journals",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS journals_fts USING fts5("
+    "title, content, content='journals_search_source', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS journals_fts_insert AFTER INSERT ON journals BEGIN "
+    "INSERT INTO journals_fts(rowid, title, content) VALUES (new.id, new.title, journal_text(new.content)); END",
+    "CREATE TRIGGER IF NOT EXISTS journals_fts_delete AFTER DELETE ON journals BEGIN "
+    "INSERT INTO journals_fts(journals_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, journal_text(old.content)); END",
+    "CREATE TRIGGER IF NOT EXISTS journals_fts_update AFTER UPDATE OF title, content ON journals BEGIN "
+    "INSERT INTO journals_fts(journals_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, journal_text(old.content)); "
+    "INSERT INTO journals_fts(rowid, title, content) VALUES (new.id, new.title, journal_text(new.content)); END",
+]
+FTS5_DROP = [
+    "DROP TRIGGER IF EXISTS journals_fts_insert",
+    "DROP TRIGGER IF EXISTS journals_fts_delete",
+    "DROP TRIGGER IF EXISTS journals_fts_update",
+    "DROP TABLE IF EXISTS journals_fts",
+    "DROP VIEW IF EXISTS journals_search_source",
+]
+
+# Existing databases get these through migrations 7 and 8
+@event.listens_for(Journal.__table__, "after_create")
+def _create_search_index(target, connection, **kw):
+    if connection.dialect.name == "postgresql":
+        for statement in SEARCH_VECTOR_DDL:
+            connection.execute(text(statement))
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON journals USING gin (search_vector)"))
+    elif connection.dialect.name == "sqlite":
+        for statement in FTS5_DDL:
+            connection.execute(text(statement))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime, Float, Text
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, Float, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from models.base import Base
@@ -6,7 +6,10 @@ from models.base import Base
 
 class MicroAssessment(Base):
     __tablename__ = "micro_assessments"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        Index("ix_micro_assessments_user_created", "user_id", "created_at"),
+        {'extend_existing': True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -17,6 +20,7 @@ class MicroAssessment(Base):
     support_feeling = Column(Integer)  # 1-5 scale
     comments = Column(Text, nullable=True)
     burnout_risk_score = Column(Float)  # Calculated risk score
+    risk_score_version = Column(Integer, nullable=False, default=1, server_default="1")  # risk_scoring model that computed it
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User")
\ No newline at end of file
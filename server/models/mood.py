@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Enum, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Enum, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from enum import Enum as PyEnum
@@ -14,6 +14,7 @@ class MoodType(PyEnum):
 
 class Mood(Base):
     __tablename__ = "moods"
+    __table_args__ = (Index("ix_moods_user_created", "user_id", "created_at"),)
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     mood = Column(Enum(MoodType), nullable=False)
@@ -0,0 +1,18 @@
+from sqlalchemy import JSON, BigInteger, Column, DateTime, Index, Integer, String, Text
+from datetime import datetime
+from models.base import Base
+
+
+class OutboxEvent(Base):
+    """Derived work recorded in the transaction of the write that caused it; drained by outbox.py"""
+    __tablename__ = "outbox_events"
+    __table_args__ = (Index("ix_outbox_events_available", "available_at"),)
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    topic = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # not picked up before this (retry backoff)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    failed_at = Column(DateTime, nullable=True)  # set when retries are exhausted; the event is kept for inspection
@@ -1,12 +1,15 @@
-from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from models.base import Base
 
 class Response(Base):
     __tablename__ = "responses"
+    __table_args__ = (Index("uq_responses_test_question", "test_id", "question_id", unique=True),)
     id = Column(Integer, primary_key=True, index=True)
     test_id = Column(Integer, ForeignKey("tests.id"))
     question_id = Column(Integer)
     score = Column(Integer)
+    # Autosave seq of the batch that wrote this score; an answer only moves forward
+    seq = Column(BigInteger, nullable=False, default=0, server_default="0")
 
     test = relationship("Test", back_populates="responses")
\ No newline at end of file
@@ -1,11 +1,12 @@
 from models.base import Base
 from models.user import User
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Boolean, func
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, String, Boolean, Index, false, func
 from sqlalchemy.orm import relationship
 
 
 class Test(Base):
     __tablename__ = "tests"
+    __table_args__ = (Index("ix_tests_user_completed_created", "user_id", "completed", "created_at"),)
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=func.now())
@@ -17,6 +18,10 @@ class Test(Base):
     personal_accomplishment_level = Column(String, nullable=True)
     burnout_level = Column(String, nullable=True)
     completed = Column(Boolean, default=False)
+    # Highest client sequence number seen by /save-responses
+    autosave_seq = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # Counted in cohort_weekly_stats, by the outbox handler or a rebuild
+    cohort_counted = Column(Boolean, nullable=False, default=False, server_default=false())
 
     user = relationship("User", back_populates="tests")
     responses = relationship("Response", back_populates="test")
\ No newline at end of file
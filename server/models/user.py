@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Enum, false
 from sqlalchemy.ext.declarative import declarative_base
 import enum
 from sqlalchemy.orm import relationship
@@ -42,6 +42,9 @@ class User(Base):
     # Reasons for Using App (stored as comma-separated IDs)
     reasons = Column(String, nullable=True)  
     
+    # Whether the user allowed syncing data from their wearable
+    health_permission = Column(Boolean, nullable=False, default=False, server_default=false())
+    
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -0,0 +1,211 @@
+"""Transactional outbox for work derived from user writes.
+
+Write endpoints call enqueue() inside their own transaction, so an event
+exists exactly when the write committed, and return without doing the
+derived work (streaks, cohort aggregates, health rollups). OutboxWorker
+threads in the server process drain the table in batches: claim events
+(FOR UPDATE SKIP LOCKED on Postgres, so several threads or processes never
+take the same ones), run each topic's handler over its payloads, and
+delete the events, all in one transaction.
+
+Delivery is at-least-once: handlers that only write to the database run
+exactly once, since their writes commit together with the delete; any
+other side effect may repeat after a crash. A failing batch is retried one
+event at a time, so one bad event does not hold back the others; a failing
+event is retried with exponential backoff and parked (failed_at set) after
+OUTBOX_MAX_ATTEMPTS.
+
+With OUTBOX_WORKERS=0 the server only enqueues, and a separate process drains:
+
+    python outbox.py run | status
+"""
+import argparse
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, engine
+from metrics import count_handled_error
+from models import OutboxEvent, create_tables
+
+logger = logging.getLogger(__name__)
+
+# Draining threads per server process; SQLite allows one writer, so one thread there
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "1" if engine.dialect.name == "sqlite" else "2"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1.0"))  # seconds, when not woken by a commit
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_BASE = 2.0  # seconds before the first retry, doubled on each further one
+OUTBOX_RETRY_MAX = 3600.0
+
+def handlers():
+    """topic -> handler(db, payloads), called with every payload of that topic in a batch, in commit order"""
+    # Imported here: the handler modules import this one to enqueue
+    from cohort_stats import record_test_results
+    from health_rollups import apply_resynced_rollups, apply_synced_rollups
+    from streak_service import record_activities
+
+    def test_completed(db, payloads):
+        record_activities(db, payloads, completed_test=True)
+        record_test_results(db, payloads)
+
+    return {
+        "test.completed": test_completed,
+        "micro_assessment.created": record_activities,
+        "mood.created": record_activities,
+        "health.synced": apply_synced_rollups,
+        "health.resynced": apply_resynced_rollups,
+    }
+
+def enqueue(db: Session, topic: str, payload: dict):
+    """Record derived work in the caller's transaction; workers are woken once it commits"""
+    now = datetime.utcnow()
+    db.execute(insert(OutboxEvent).values(topic=topic, payload=payload, created_at=now, available_at=now))
+    event.listen(db, "after_commit", lambda session: outbox_worker.notify(), once=True)
+
+def _claim(db: Session, limit: int, event_id: int = None):
+    query = select(OutboxEvent).where(OutboxEvent.failed_at.is_(None), OutboxEvent.available_at <= datetime.utcnow())
+    if event_id is not None:
+        query = query.where(OutboxEvent.id == event_id)
+    return db.scalars(query.order_by(OutboxEvent.id).limit(limit).with_for_update(skip_locked=True)).all()
+
+def _dispatch(db: Session, events):
+    topic_handlers = handlers()
+    by_topic = {}
+    for outbox_event in events:
+        by_topic.setdefault(outbox_event.topic, []).append(outbox_event.payload)
+    for topic, payloads in by_topic.items():
+        if topic not in topic_handlers:
+            raise ValueError(f"No outbox handler for topic {topic!r}")
+        topic_handlers[topic](db, payloads)
+    db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_([outbox_event.id for outbox_event in events])))
+
+def _record_failure(db: Session, event_id: int, error: Exception):
+    attempts = db.scalar(select(OutboxEvent.attempts).where(OutboxEvent.id == event_id)) + 1
+    now = datetime.utcnow()
+    delay = min(OUTBOX_RETRY_MAX, OUTBOX_RETRY_BASE * 2 ** (attempts - 1))
+    db.execute(update(OutboxEvent).where(OutboxEvent.id == event_id).values(
+        attempts=attempts,
+        last_error=f"{type(error).__name__}: {error}"[:2000],
+        available_at=now + timedelta(seconds=delay),
+        failed_at=now if attempts >= OUTBOX_MAX_ATTEMPTS else None,
+    ))
+    db.commit()
+    count_handled_error("outbox.event")
+    if attempts >= OUTBOX_MAX_ATTEMPTS:
+        logger.error("Outbox event %s parked after %s attempts", event_id, attempts, exc_info=error)
+    else:
+        logger.warning("Outbox event %s failed (attempt %s), retrying", event_id, attempts, exc_info=error)
+
+def _process_one(db: Session, event_id: int):
+    events = _claim(db, 1, event_id)
+    if not events:
+        db.rollback()
+        return
+    try:
+        _dispatch(db, events)
+        db.commit()
+    except Exception as error:
+        db.rollback()
+        _record_failure(db, event_id, error)
+
+def drain_batch(batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """Process up to batch_size available events; returns how many were claimed"""
+    db = SessionLocal()
+    try:
+        events = _claim(db, batch_size)
+        if not events:
+            db.rollback()
+            return 0
+        event_ids = [outbox_event.id for outbox_event in events]
+        try:
+            _dispatch(db, events)
+            db.commit()
+        except Exception:
+            # Find the culprit: every event again in a transaction of its own
+            db.rollback()
+            for event_id in event_ids:
+                _process_one(db, event_id)
+        return len(event_ids)
+    finally:
+        db.close()
+
+class OutboxWorker:
+    """Background threads draining the outbox; woken right after commits that enqueue"""
+
+    def __init__(self, workers: int = OUTBOX_WORKERS, batch_size: int = OUTBOX_BATCH_SIZE,
+                 poll_interval: float = OUTBOX_POLL_INTERVAL):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._threads or self.workers <= 0:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"outbox-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        print(f"✅ Outbox: {self.workers} workers, batches of {self.batch_size}")
+
+    def notify(self):
+        self._wake.set()
+
+    def shutdown(self, timeout: float = 10):
+        # Unprocessed events stay in the table for the next start
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                claimed = drain_batch(self.batch_size)
+            except Exception:
+                logger.exception("Outbox worker error")
+                count_handled_error("outbox.worker")
+                claimed = 0
+            if not claimed:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+outbox_worker = OutboxWorker()
+
+def status(db: Session):
+    pending = db.scalar(select(func.count()).select_from(OutboxEvent).where(OutboxEvent.failed_at.is_(None)))
+    oldest = db.scalar(select(func.min(OutboxEvent.created_at)).where(OutboxEvent.failed_at.is_(None)))
+    failed = db.scalar(select(func.count()).select_from(OutboxEvent).where(OutboxEvent.failed_at.isnot(None)))
+    return {"pending": pending, "oldest_pending": oldest, "failed": failed}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Outbox maintenance")
+    parser.add_argument("command", choices=["run", "status"])
+    parser.add_argument("--workers", type=int, default=max(1, OUTBOX_WORKERS))
+    args = parser.parse_args()
+
+    create_tables()
+    if args.command == "status":
+        db = SessionLocal()
+        try:
+            print(status(db))
+        finally:
+            db.close()
+    else:
+        worker = OutboxWorker(args.workers)
+        worker.start()
+        try:
+            while True:
+                worker._stop.wait(60)
+        except KeyboardInterrupt:
+            worker.shutdown()
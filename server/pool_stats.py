@@ -0,0 +1,108 @@
+"""Connection pools that record checkout statistics.
+
+Drop-in replacements for the SQLAlchemy pool classes (passed as
+poolclass=...), each keeping a PoolStats with checkout counts, how often a
+checkout found the pool exhausted and had to wait, timeouts, and checkout
+latency. Read by /internal/pool-stats.
+"""
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+RECENT_CHECKOUTS = 1024
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.recent = deque(maxlen=RECENT_CHECKOUTS)
+
+    def record(self, latency, waited, timed_out):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+                self.recent.append(latency)
+            if waited:
+                self.waits += 1
+
+    def snapshot(self):
+        with self._lock:
+            recent = sorted(self.recent)
+            checkouts = self.checkouts
+            result = {
+                "checkouts": checkouts,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "checkout_latency_ms": {
+                    "avg": self.total_latency / checkouts * 1000 if checkouts else 0.0,
+                    "max": self.max_latency * 1000,
+                },
+            }
+
+        def percentile(fraction):
+            return recent[min(len(recent) - 1, int(len(recent) * fraction))] * 1000 if recent else 0.0
+
+        result["checkout_latency_ms"].update({"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99)})
+        return result
+
+class _InstrumentedPool:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _exhausted(self):
+        return False
+
+    def _do_get(self):
+        waited = self._exhausted()
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - started, waited, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started, waited, timed_out=False)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting into the same stats
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def describe(self):
+        return {"class": type(self).__name__, "status": self.status(), **self.stats.snapshot()}
+
+class _InstrumentedQueueMixin(_InstrumentedPool):
+    def _exhausted(self):
+        return self._max_overflow > -1 and self._overflow >= self._max_overflow and self._pool.qsize() == 0
+
+    def describe(self):
+        return {
+            **super().describe(),
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": max(0, self.overflow()),
+            "max_overflow": self._max_overflow,
+        }
+
+class InstrumentedQueuePool(_InstrumentedQueueMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_InstrumentedQueueMixin, AsyncAdaptedQueuePool):
+    pass
+
+class InstrumentedNullPool(_InstrumentedPool, NullPool):
+    pass
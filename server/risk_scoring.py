@@ -0,0 +1,130 @@
+"""Burnout risk scoring, batch-first.
+
+Every score is computed by the NumPy batch functions; the scalar helpers
+used at write and request time are one-element calls into them, so a
+backfill reproduces exactly what the API would have stored.
+
+Changing the micro-assessment weights: edit MICRO_RISK_WEIGHTS, bump
+RISK_MODEL_VERSION, deploy, then re-score the stored rows:
+
+    python risk_scoring.py rescore [--chunk-size N]
+
+The backfill walks micro_assessments in id order, one chunk per
+transaction, and only picks rows scored by an older model version, so an
+interrupted run resumes where it stopped when started again.
+"""
+import argparse
+import time
+
+import numpy as np
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from data_versions import bump_data_versions
+from database import SessionLocal
+from models import MicroAssessment, create_tables
+
+RISK_MODEL_VERSION = 1  # stored with each score; bump whenever the weights change
+
+# Micro-assessment answers are 1-5. (weight, inverted): inverted answers count
+# as 6 - answer, so higher satisfaction, sleep and support lower the risk
+MICRO_RISK_WEIGHTS = {
+    "fatigue_level": (0.6, False),
+    "stress_level": (0.6, False),
+    "work_satisfaction": (0.15, True),
+    "sleep_quality": (0.15, True),
+    "support_feeling": (0.1, True),
+}
+MICRO_RISK_DIVISOR = 5  # raw score / 5 * 10 puts it on the 1-10 scale
+MICRO_RISK_RANGE = (1, 10)
+
+# Health-derived risk (0-10): each factor is normalized to 0-1, higher = riskier
+HEALTH_RISK_WEIGHTS = {"resting_heart_rate": 0.3, "hrv": 0.4, "sleep": 0.3}
+
+RESCORE_CHUNK_SIZE = 5000
+
+def score_micro_assessments(answers) -> np.ndarray:
+    """Risk scores (1-10, one decimal) for equal-length arrays of answers keyed by
+    MICRO_RISK_WEIGHTS; NaN where an answer is missing"""
+    raw = None
+    for metric, (weight, inverted) in MICRO_RISK_WEIGHTS.items():
+        values = np.asarray(answers[metric], dtype=float)
+        term = (6 - values if inverted else values) * weight
+        raw = term if raw is None else raw + term
+    low, high = MICRO_RISK_RANGE
+    return np.round(np.clip(raw / MICRO_RISK_DIVISOR * 10, low, high), 1)
+
+def score_micro_assessment(**answers) -> float:
+    return float(score_micro_assessments({metric: [value] for metric, value in answers.items()})[0])
+
+def health_risk_scores(resting_heart_rate, hrv, sleep) -> np.ndarray:
+    """Risk (0-10) from average resting heart rate, HRV and sleep hours; NaN where any is missing or zero"""
+    resting_heart_rate, hrv, sleep = (np.asarray(values, dtype=float) for values in (resting_heart_rate, hrv, sleep))
+    factors = {
+        "resting_heart_rate": np.clip((resting_heart_rate - 50) * 2, 0, 100) / 100,
+        "hrv": np.clip(100 - hrv, 0, 100) / 100,
+        "sleep": np.clip((8 - sleep) * 20, 0, 100) / 100,
+    }
+    risk = sum(factors[name] * weight for name, weight in HEALTH_RISK_WEIGHTS.items()) * 10
+    missing = np.isnan(resting_heart_rate) | np.isnan(hrv) | np.isnan(sleep)
+    missing |= (resting_heart_rate == 0) | (hrv == 0) | (sleep == 0)
+    return np.where(missing, np.nan, risk)
+
+def health_risk_score(resting_heart_rate, hrv, sleep):
+    """Scalar health_risk_scores; None when an input is missing"""
+    values = [np.nan if value is None else value for value in (resting_heart_rate, hrv, sleep)]
+    risk = health_risk_scores(*([value] for value in values))[0]
+    return None if np.isnan(risk) else float(risk)
+
+def rescore_micro_assessments(db: Session, chunk_size: int = RESCORE_CHUNK_SIZE):
+    """Re-score every micro-assessment scored by an older model version; returns the rows updated"""
+    stale = MicroAssessment.risk_score_version != RISK_MODEL_VERSION
+    total = db.execute(select(func.count()).select_from(MicroAssessment).where(stale)).scalar()
+    print(f"{total} micro-assessments to re-score with risk model v{RISK_MODEL_VERSION}")
+
+    columns = [getattr(MicroAssessment, metric) for metric in MICRO_RISK_WEIGHTS]
+    rescored = 0
+    last_id = 0
+    started = time.perf_counter()
+    while True:
+        rows = db.execute(
+            select(MicroAssessment.id, MicroAssessment.user_id, *columns)
+            .where(MicroAssessment.id > last_id, stale)
+            .order_by(MicroAssessment.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        table = np.array([row[2:] for row in rows], dtype=float)
+        scores = score_micro_assessments({metric: table[:, i] for i, metric in enumerate(MICRO_RISK_WEIGHTS)})
+
+        # Bulk UPDATE by primary key, one executemany per chunk
+        db.execute(update(MicroAssessment), [
+            {"id": row.id, "burnout_risk_score": None if np.isnan(score) else float(score),
+             "risk_score_version": RISK_MODEL_VERSION}
+            for row, score in zip(rows, scores)
+        ])
+        bump_data_versions(db, {row.user_id for row in rows})
+        db.commit()
+
+        rescored += len(rows)
+        elapsed = time.perf_counter() - started
+        print(f"  {rescored}/{total} re-scored, up to id {last_id} ({elapsed:.1f}s, {rescored / elapsed:.0f} rows/s)")
+
+    return rescored
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Burnout risk score maintenance")
+    parser.add_argument("command", choices=["rescore"])
+    parser.add_argument("--chunk-size", type=int, default=RESCORE_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        total = rescore_micro_assessments(db, args.chunk_size)
+        print(f"✅ {total} micro-assessments re-scored with risk model v{RISK_MODEL_VERSION}")
+    finally:
+        db.close()
@@ -1,11 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, select, union
 from sqlalchemy.orm import Session
-from database import get_db
-from models import User, Test, Mood
+from auth import current_user_id
+from database import SessionLocal, dialect_insert, get_db
+from metrics import count_handled_error
+from models import User, Test, Mood, MicroAssessment, ActivityDay, UserStreak
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from typing import Optional
-import traceback
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -17,10 +23,10 @@ class StreakResponse(BaseModel):
     lastActivity: Optional[str] = None
 
 @router.get("/streaks/{user_id}")
-def get_user_streaks(user_id: int, db: Session = Depends(get_db)):
+def get_user_streaks(user_id: int, db: Session = Depends(get_db), caller_id: Optional[int] = Depends(current_user_id)):
     try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
+        # The session token's own user is known to exist
+        if caller_id != user_id and not db.query(User.id).filter(User.id == user_id).first():
             return {
                 "currentStreak": 0,
                 "longestStreak": 0,
@@ -28,133 +34,37 @@ def get_user_streaks(user_id: int, db: Session = Depends(get_db)):
                 "totalAssessments": 0,
                 "lastActivity": None
             }
-        
-        # Get all user activity (moods, completed tests, and micro-assessments)
-        try:
-            moods = db.query(Mood).filter(Mood.user_id == user_id).all()
-        except Exception as e:
-            print(f"Error querying moods: {e}")
-            moods = []
-            
-        try:
-            # Try with completed filter first
-            tests = db.query(Test).filter(
-                Test.user_id == user_id,
-                Test.completed == True
-            ).all()
-        except Exception as e:
-            print(f"Error querying tests with completed filter: {e}")
-            # If that fails (e.g., completed column doesn't exist), try without it
-            try:
-                tests = db.query(Test).filter(Test.user_id == user_id).all()
-            except Exception as e2:
-                print(f"Error querying tests without filter: {e2}")
-                tests = []
-        
-        # Get micro-assessments if they exist (using try-except in case the table doesn't exist yet)
-        micro_assessments = []
-        try:
-            from models import MicroAssessment
-            micro_assessments = db.query(MicroAssessment).filter(
-                MicroAssessment.user_id == user_id
-            ).all()
-        except Exception as e:
-            print(f"No micro-assessments available: {e}")
-            # This is ok - the table might not exist yet
-        
-        # Combine all activity and get unique dates
-        activity_dates = set()
-        
-        for mood in moods:
-            try:
-                activity_dates.add(mood.created_at.date())
-            except Exception as e:
-                print(f"Error processing mood date: {e}")
-        
-        for test in tests:
-            try:
-                activity_dates.add(test.created_at.date())
-            except Exception as e:
-                print(f"Error processing test date: {e}")
-        
-        for assessment in micro_assessments:
-            try:
-                activity_dates.add(assessment.created_at.date())
-            except Exception as e:
-                print(f"Error processing micro-assessment date: {e}")
-        
-        if not activity_dates:
-            return {
-                "currentStreak": 0,
-                "longestStreak": 0,
-                "weeklyCheckIns": 0,
-                "totalAssessments": len(tests),
-                "lastActivity": None
-            }
-        
-        # Sort dates
-        sorted_dates = sorted(activity_dates)
-        
-        # Calculate current streak
-        current_streak = 0
+
+        summary = db.query(UserStreak).filter(UserStreak.user_id == user_id).first()
+        if not summary:
+            # First visit since the ledger was introduced: build it from history once
+            summary = rebuild_user_activity(db, user_id)
+            db.commit()
+
         today = datetime.utcnow().date()
-        
-        # If there was activity today, start streak at 1
-        if today in sorted_dates:
-            current_streak = 1
-            check_date = today - timedelta(days=1)
-        else:
-            # If the most recent activity was yesterday, start streak at 1
-            if sorted_dates and sorted_dates[-1] == today - timedelta(days=1):
-                current_streak = 1
-                check_date = today - timedelta(days=2)
-            else:
-                # No current streak
-                try:
-                    longest_streak = calculate_longest_streak(sorted_dates)
-                    weekly_checkins = count_weekly_checkins(sorted_dates)
-                    last_activity = sorted_dates[-1].isoformat() if sorted_dates else None
-                except Exception as e:
-                    print(f"Error calculating streak stats: {e}")
-                    longest_streak = 0
-                    weekly_checkins = 0
-                    last_activity = None
-                    
-                return {
-                    "currentStreak": 0,
-                    "longestStreak": longest_streak,
-                    "weeklyCheckIns": weekly_checkins,
-                    "totalAssessments": len(tests),
-                    "lastActivity": last_activity
-                }
-        
-        # Continue checking previous days for streak
-        try:
-            while check_date in sorted_dates:
-                current_streak += 1
-                check_date = check_date - timedelta(days=1)
-                
-            longest_streak = calculate_longest_streak(sorted_dates)
-            weekly_checkins = count_weekly_checkins(sorted_dates)
-            last_activity = sorted_dates[-1].isoformat() if sorted_dates else None
-        except Exception as e:
-            print(f"Error in streak calculation loop: {e}")
-            current_streak = 0
-            longest_streak = 0
-            weekly_checkins = 0
-            last_activity = None
-            
+        last_activity = summary.last_activity
+
+        # The run ending on the last active day only counts if it reaches today or yesterday
+        current_streak = 0
+        if last_activity and last_activity >= today - timedelta(days=1):
+            current_streak = summary.current_run
+
+        weekly_checkins = db.query(func.count(ActivityDay.day)).filter(
+            ActivityDay.user_id == user_id,
+            ActivityDay.day >= today - timedelta(days=7)
+        ).scalar()
+
         return {
             "currentStreak": current_streak,
-            "longestStreak": longest_streak,
+            "longestStreak": summary.longest_streak,
             "weeklyCheckIns": weekly_checkins,
-            "totalAssessments": len(tests),
-            "lastActivity": last_activity
+            "totalAssessments": summary.total_assessments,
+            "lastActivity": last_activity.isoformat() if last_activity else None
         }
-            
-    except Exception as e:
-        print(f"Unhandled error in get_user_streaks: {e}")
-        traceback.print_exc()
+
+    except Exception:
+        logger.exception("Unhandled error in get_user_streaks for user %s", user_id)
+        count_handled_error("get_user_streaks")
         # Return default values instead of throwing a 500 error
         return {
             "currentStreak": 0,
@@ -164,14 +74,128 @@ def get_user_streaks(user_id: int, db: Session = Depends(get_db)):
             "lastActivity": None
         }
 
+def record_activity(db: Session, user_id: int, when: datetime, completed_test: bool = False):
+    """Add the day of `when` to the user's activity ledger and update their streak summary.
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    db.flush()
+    day = when.date()
+
+    inserted = db.execute(
+        dialect_insert(db, ActivityDay)
+        .values(user_id=user_id, day=day)
+        .on_conflict_do_nothing()
+        .returning(ActivityDay.day)
+    ).first()
+
+    summary = db.query(UserStreak).filter(UserStreak.user_id == user_id).with_for_update().first()
+    if not summary:
+        # No summary yet: the history (including this write) is folded in by the rebuild
+        rebuild_user_activity(db, user_id)
+        return
+
+    if inserted:
+        last = summary.last_activity
+        if last is None or day > last:
+            summary.current_run = summary.current_run + 1 if last and day == last + timedelta(days=1) else 1
+            summary.last_activity = day
+            summary.longest_streak = max(summary.longest_streak, summary.current_run)
+        else:
+            # A day before the last activity was filled in; runs may have merged
+            _apply_summary(summary, _load_days(db, user_id))
+
+    if completed_test:
+        summary.total_assessments += 1
+
+def record_activities(db: Session, payloads, completed_test: bool = False):
+    """Outbox handler: record_activity for events carrying user_id and an ISO created_at"""
+    for payload in payloads:
+        record_activity(db, payload["user_id"], datetime.fromisoformat(payload["created_at"]))
+    if completed_test:
+        # Counted, not incremented: a summary rebuilt while events were pending already includes their tests
+        user_ids = {payload["user_id"] for payload in payloads}
+        totals = dict(db.execute(
+            select(Test.user_id, func.count(Test.id))
+            .where(Test.user_id.in_(user_ids), Test.completed == True)
+            .group_by(Test.user_id)
+        ).all())
+        for summary in db.query(UserStreak).filter(UserStreak.user_id.in_(user_ids)):
+            summary.total_assessments = totals.get(summary.user_id, 0)
+
+def rebuild_user_activity(db: Session, user_id: Optional[int] = None):
+    """Rebuild the activity ledger and streak summaries from moods, completed tests and micro-assessments.
+
+    With a user_id only that user is rebuilt and their summary is returned.
+    """
+    db.flush()
+    db.execute(
+        dialect_insert(db, ActivityDay)
+        .from_select(["user_id", "day"], _activity_days_select(user_id))
+        .on_conflict_do_nothing()
+    )
+
+    if user_id is not None:
+        return _rebuild_summary(db, user_id)
+
+    user_ids = [row[0] for row in db.execute(select(ActivityDay.user_id).distinct())]
+    for uid in user_ids:
+        _rebuild_summary(db, uid)
+
+def _activity_days_select(user_id: Optional[int] = None):
+    def day_select(model, *criteria):
+        query = select(model.user_id, func.date(model.created_at)).where(model.user_id.isnot(None), *criteria)
+        if user_id is not None:
+            query = query.where(model.user_id == user_id)
+        return query
+
+    return union(
+        day_select(Mood),
+        day_select(Test, Test.completed == True),
+        day_select(MicroAssessment),
+    )
+
+def _load_days(db: Session, user_id: int):
+    return [
+        row[0] for row in db.execute(
+            select(ActivityDay.day).where(ActivityDay.user_id == user_id).order_by(ActivityDay.day)
+        )
+    ]
+
+def _apply_summary(summary: UserStreak, days):
+    summary.longest_streak = calculate_longest_streak(days)
+    summary.last_activity = days[-1] if days else None
+    summary.current_run = 0
+    if days:
+        summary.current_run = 1
+        check_date = days[-1] - timedelta(days=1)
+        day_set = set(days)
+        while check_date in day_set:
+            summary.current_run += 1
+            check_date -= timedelta(days=1)
+
+def _rebuild_summary(db: Session, user_id: int):
+    summary = db.query(UserStreak).filter(UserStreak.user_id == user_id).with_for_update().first()
+    if not summary:
+        summary = UserStreak(user_id=user_id)
+        db.add(summary)
+
+    _apply_summary(summary, _load_days(db, user_id))
+    summary.total_assessments = db.query(func.count(Test.id)).filter(
+        Test.user_id == user_id,
+        Test.completed == True
+    ).scalar()
+    db.flush()
+    return summary
+
 def calculate_longest_streak(dates):
     if not dates:
         return 0
-    
+
     dates = sorted(dates)
     longest_streak = 1
     current_streak = 1
-    
+
     for i in range(1, len(dates)):
         # If dates are consecutive
         if (dates[i] - dates[i-1]).days == 1:
@@ -179,12 +203,29 @@ def calculate_longest_streak(dates):
         else:
             longest_streak = max(longest_streak, current_streak)
             current_streak = 1
-    
+
     return max(longest_streak, current_streak)
 
 def count_weekly_checkins(dates):
     if not dates:
         return 0
-    
+
     one_week_ago = datetime.utcnow().date() - timedelta(days=7)
-    return sum(1 for date in dates if date >= one_week_ago)
\ No newline at end of file
+    return sum(1 for date in dates if date >= one_week_ago)
+
+# One-shot backfill: python streak_service.py backfill
+if __name__ == "__main__":
+    if sys.argv[1:] != ["backfill"]:
+        print("Usage: python streak_service.py backfill")
+        sys.exit(1)
+
+    from models import create_tables
+    create_tables()
+
+    db = SessionLocal()
+    try:
+        rebuild_user_activity(db)
+        db.commit()
+        print(f"✅ Activity ledger rebuilt for {db.query(func.count(UserStreak.user_id)).scalar()} users")
+    finally:
+        db.close()
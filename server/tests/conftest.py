@@ -0,0 +1,7 @@
+"""Test setup. Test dependencies: pip install -r requirements-dev.txt; run python -m pytest from server/."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The service modules create their tables on import; keep that off the real database
+os.environ.setdefault("DATABASE_URL", "sqlite://")
@@ -0,0 +1,67 @@
+"""MBI test submission: scoring, and a constant number of SQL statements whatever the number of answers."""
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from mbi_test_service import MBI_QUESTIONS, ResponseSchema, StartTestRequest, TestSubmission, start_test, submit_test
+from models import Base, Response, Test, User
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def db(engine):
+    with Session(engine) as db:
+        yield db
+
+@pytest.fixture
+def user_id(db):
+    user = User(name="test", email="test@example.com", password="x")
+    db.add(user)
+    db.commit()
+    # Warm up the activity ledger so every submission takes the same streak path
+    submit_test(submission(user.id, 1), db, user.id)
+    return user.id
+
+def submission(user_id, answers, test_id=None):
+    responses = [ResponseSchema(question_id=question["id"], score=3) for question in MBI_QUESTIONS[:answers]]
+    return TestSubmission(user_id=user_id, responses=responses, test_id=test_id)
+
+def count_statements(engine, fn):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return len(statements)
+
+def test_new_test_statements_do_not_grow_with_answers(engine, db, user_id):
+    counts = [
+        count_statements(engine, lambda: submit_test(submission(user_id, answers), db, user_id))
+        for answers in (1, len(MBI_QUESTIONS))
+    ]
+    assert counts[0] == counts[1]
+
+def test_in_progress_test_statements_do_not_grow_with_answers(engine, db, user_id):
+    counts = []
+    for answers in (1, len(MBI_QUESTIONS)):
+        test_id = start_test(StartTestRequest(user_id=user_id), db, user_id)["test_id"]
+        counts.append(count_statements(engine, lambda: submit_test(submission(user_id, answers, test_id), db, user_id)))
+    assert counts[0] == counts[1]
+
+def test_repeated_question_keeps_its_last_score(db, user_id):
+    question = MBI_QUESTIONS[0]
+    responses = [ResponseSchema(question_id=question["id"], score=score) for score in (6, 2)]
+    submit_test(TestSubmission(user_id=user_id, responses=responses), db, user_id)
+
+    test = db.query(Test).filter(Test.user_id == user_id).order_by(Test.id.desc()).first()
+    stored = db.query(Response.score).filter(Response.test_id == test.id).all()
+    assert [row.score for row in stored] == [2]
+    assert getattr(test, f"{question['category']}_score") == 2
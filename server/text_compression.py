@@ -0,0 +1,99 @@
+"""Opt-in compression for the large journal text columns.
+
+JOURNAL_COMPRESSION=zlib (or zstd, with the zstandard package installed)
+turns it on; it is off by default. CompressedText then stores values of at
+least JOURNAL_COMPRESSION_THRESHOLD bytes as a compressed blob and returns
+plain strings on read, whichever mode wrote the row.
+
+Blob format: MAGIC, format version, codec id, then the compressed UTF-8.
+
+Applied on SQLite only. Postgres already compresses large values in TOAST
+(lz4 for the journal columns since migration 8, where the server supports
+it), and its search trigger reads content inside SQL, where only plain
+text works; there the type passes values through. SQLite has no value
+compression at all, so this is what keeps journal text small for SQLite
+deployments; its FTS5 index reads through journal_text(), registered on
+every connection.
+
+Rows written before the mode was turned on are compressed by
+journal_compression.py.
+"""
+import os
+import zlib
+
+from sqlalchemy import Text
+from sqlalchemy.types import TypeDecorator
+
+try:
+    import zstandard
+except ImportError:  # only needed for JOURNAL_COMPRESSION=zstd
+    zstandard = None
+
+COMPRESSION_CODEC = os.getenv("JOURNAL_COMPRESSION", "off")
+COMPRESSION_THRESHOLD = int(os.getenv("JOURNAL_COMPRESSION_THRESHOLD", "512"))  # bytes of UTF-8
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+MAGIC = b"\xfe"  # never starts UTF-8 text
+FORMAT_VERSION = 1
+CODEC_IDS = {"zlib": 1, "zstd": 2}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+
+def check_codec(codec: str):
+    if codec != "off" and codec not in CODEC_IDS:
+        raise ValueError(f"Unknown JOURNAL_COMPRESSION {codec!r}: use off, {' or '.join(CODEC_IDS)}")
+    if codec == "zstd" and zstandard is None:
+        raise RuntimeError("JOURNAL_COMPRESSION=zstd needs the zstandard package")
+
+check_codec(COMPRESSION_CODEC)
+
+def compress_text(value: str, codec: str = None, threshold: int = None):
+    """Blob for `value`, or `value` itself when compression is off, it is short, or it does not shrink"""
+    codec = codec or COMPRESSION_CODEC
+    threshold = COMPRESSION_THRESHOLD if threshold is None else threshold
+    if codec == "off":
+        return value
+
+    data = value.encode()
+    if len(data) < threshold:
+        return value
+    if codec == "zstd":
+        body = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    else:
+        body = zlib.compress(data, ZLIB_LEVEL)
+
+    blob = MAGIC + bytes([FORMAT_VERSION, CODEC_IDS[codec]]) + body
+    return blob if len(blob) < len(data) else value
+
+def plain_text(value):
+    """Text of a stored value, compressed or not"""
+    if not isinstance(value, bytes):
+        return value
+    if value[:1] != MAGIC or value[1] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported compressed text format {value[:2]!r}")
+
+    codec = CODEC_NAMES.get(value[2])
+    if codec == "zlib":
+        return zlib.decompress(value[3:]).decode()
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Reading zstd-compressed text needs the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(value[3:]).decode()
+    raise ValueError(f"Unknown compressed text codec {value[2]}")
+
+class CompressedText(TypeDecorator):
+    """Text stored compressed on SQLite when JOURNAL_COMPRESSION is on"""
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, bytes) or dialect.name != "sqlite":
+            return value
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return plain_text(value)
+
+def register_sqlite_functions(dbapi_connection, connection_record):
+    dbapi_connection.create_function("journal_text", 1, plain_text, deterministic=True)
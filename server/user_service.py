@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from database import get_db
 from models.user import User, GenderEnum, MaritalStatusEnum
@@ -7,6 +8,11 @@ from datetime import datetime
 from typing import Optional, List
 from models import User, Test, Mood, create_tables
 from models.mood import MoodType 
+from auth import current_user_id, ensure_user
+from data_versions import bump_data_version, user_etag
+from outbox import enqueue
+from mbi_test_service import TestSummary, test_summaries_select
+from json_responses import json_response, row_dicts
 
 router = APIRouter()
 
@@ -43,12 +49,14 @@ class MoodSubmission(BaseModel):
     user_id: int
     mood: MoodType
 
+class MoodEntry(BaseModel):
+    mood: MoodType
+    timestamp: datetime
+
 
 @router.post("/mood")
-def save_mood(mood_data: MoodSubmission, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == mood_data.user_id).first()
-    if not user:
-        raise HTTPException(status_code=400, detail="User does not exist")
+def save_mood(mood_data: MoodSubmission, db: Session = Depends(get_db), caller_id: Optional[int] = Depends(current_user_id)):
+    ensure_user(db, mood_data.user_id, caller_id, 400, "User does not exist")
     
     # Check if the mood is already recorded for today
     today = datetime.utcnow().date()
@@ -61,55 +69,39 @@ def save_mood(mood_data: MoodSubmission, db: Session = Depends(get_db)):
         today_mood = existing_mood.mood
         mood_update = db.query(Mood).filter(Mood.id == existing_mood.id).first()
         mood_update.mood = mood_data.mood
+        bump_data_version(db, mood_data.user_id)
         db.commit()
         db.refresh(mood_update)
         return {"message": "Mood updated successfully", "previous_mood": today_mood}
     # If no mood recorded for today, create a new entry
     else:
-        mood_entry = Mood(user_id=user.id, mood=mood_data.mood, created_at=datetime.utcnow())
+        mood_entry = Mood(user_id=mood_data.user_id, mood=mood_data.mood, created_at=datetime.utcnow())
         db.add(mood_entry)
+        enqueue(db, "mood.created", {"user_id": mood_data.user_id, "created_at": mood_entry.created_at.isoformat()})
+        bump_data_version(db, mood_data.user_id)
         db.commit()
         db.refresh(mood_entry)
         return {"message": "Mood saved successfully"}
 
-@router.get("/mood/{user_id}")
-def get_latest_moods(user_id: int, db: Session = Depends(get_db)):
-    moods = (
-        db.query(Mood)
-        .filter(Mood.user_id == user_id)
+def latest_moods(db: Session, user_id: int):
+    return row_dicts(db.execute(
+        select(Mood.mood, Mood.created_at.label("timestamp"))
+        .where(Mood.user_id == user_id)
         .order_by(Mood.created_at.asc())
         .limit(10)
-        .all()
-    )
-    return [
-        {"mood": mood.mood, "timestamp": mood.created_at.isoformat()}
-        for mood in moods
-    ]
+    ))
 
+@router.get("/mood/{user_id}", response_model=List[MoodEntry], dependencies=[Depends(user_etag)])
+def get_latest_moods(user_id: int, response: Response, db: Session = Depends(get_db)):
+    return json_response(latest_moods(db, user_id), response)
 
 
-@router.get("/tests/{user_id}")
-def get_tests_by_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    tests = db.query(Test).filter(Test.user_id == user_id).order_by(Test.created_at.desc()).all()
-
-    return [
-        {
-            "id": test.id,
-            "created_at": test.created_at,
-            "emotional_exhaustion_score": test.emotional_exhaustion_score,
-            "emotional_exhaustion_level": test.emotional_exhaustion_level,
-            "depersonalization_score": test.depersonalization_score,
-            "depersonalization_level": test.depersonalization_level,
-            "personal_accomplishment_score": test.personal_accomplishment_score,
-            "personal_accomplishment_level": test.personal_accomplishment_level,
-            "burnout_level": test.burnout_level,
-        }
-        for test in tests
-    ]
+@router.get("/tests/{user_id}", response_model=List[TestSummary], dependencies=[Depends(user_etag)])
+def get_tests_by_user(user_id: int, response: Response, db: Session = Depends(get_db), caller_id: Optional[int] = Depends(current_user_id)):
+    ensure_user(db, user_id, caller_id)
+
+    return json_response(row_dicts(db.execute(test_summaries_select(user_id))), response)
 
 class NameUpdateRequest(BaseModel):
     user_id: int
@@ -121,6 +113,7 @@ def update_name(data: NameUpdateRequest, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     user.name = data.new_name
+    bump_data_version(db, user.id)
     db.commit()
     return {"message": "Name updated successfully"}
 
@@ -180,6 +173,7 @@ def save_user_profile(profile: UserProfileUpdate, db: Session = Depends(get_db))
         user.previous_burnout = profile.previous_burnout
     
     user.updated_at = datetime.utcnow()
+    bump_data_version(db, user.id)
     db.commit()
     
     return {"message": "Profile updated successfully"}
@@ -193,40 +187,63 @@ def save_user_reasons(data: UserReasonsUpdate, db: Session = Depends(get_db)):
     # Convert list of reason IDs to comma-separated string
     user.reasons = ",".join(map(str, data.reasons))
     user.updated_at = datetime.utcnow()
+    bump_data_version(db, user.id)
     db.commit()
     
     return {"message": "Reasons saved successfully"}
 
-@router.get("/user-profile/{user_id}")
-def get_user_profile(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+class UserProfileResponse(BaseModel):
+    id: int
+    name: str
+    email: str
+    age: Optional[int]
+    gender: Optional[GenderEnum]
+    marital_status: Optional[MaritalStatusEnum]
+    has_children: Optional[bool]
+    specialty: Optional[str]
+    work_setting: Optional[str]
+    career_stage: Optional[str]
+    work_hours: Optional[int]
+    on_call_frequency: Optional[str]
+    years_experience: Optional[int]
+    previous_burnout: Optional[int]
+    reasons: Optional[List[int]]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+# Profile fields returned as stored, except that empty values (0, False, "") are sent as None
+PROFILE_FIELDS = [
+    "age", "gender", "marital_status", "has_children", "specialty", "work_setting",
+    "career_stage", "work_hours", "on_call_frequency", "years_experience", "previous_burnout"
+]
+
+@router.get("/user-profile/{user_id}", response_model=UserProfileResponse, dependencies=[Depends(user_etag)])
+def get_user_profile(user_id: int, response: Response, db: Session = Depends(get_db)):
+    user = db.execute(
+        select(
+            User.id, User.name, User.email, User.reasons, User.created_at, User.updated_at,
+            *(getattr(User, field) for field in PROFILE_FIELDS)
+        ).where(User.id == user_id)
+    ).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    profile = user._mapping
+    
     # Convert reasons string back to list of integers if it exists
     reasons_list = []
     if user.reasons:
         reasons_list = [int(r) for r in user.reasons.split(",")]
     
-    return {
+    return json_response({
         "id": user.id,
         "name": user.name,
         "email": user.email,
-        "age": user.age if user.age else None,
-        "gender": user.gender if user.gender else None,
-        "marital_status": user.marital_status if user.marital_status else None,
-        "has_children": user.has_children if user.has_children else None,
-        "specialty": user.specialty if user.specialty else None,
-        "work_setting": user.work_setting if user.work_setting else None,
-        "career_stage": user.career_stage if user.career_stage else None,
-        "work_hours": user.work_hours if user.work_hours else None,
-        "on_call_frequency": user.on_call_frequency if user.on_call_frequency else None,
-        "years_experience": user.years_experience if user.years_experience else None,
-        "previous_burnout": user.previous_burnout if user.previous_burnout else None,
+        **{field: profile[field] if profile[field] else None for field in PROFILE_FIELDS},
         "reasons": reasons_list if reasons_list else None,
         "created_at": user.created_at,
         "updated_at": user.updated_at
-    }
+    }, response)
 
 @router.put("/update-profile")
 def update_user_field(data: UserFieldUpdate, db: Session = Depends(get_db)):
@@ -254,6 +271,7 @@ def update_user_field(data: UserFieldUpdate, db: Session = Depends(get_db)):
         setattr(user, data.field, data.value)
     
     user.updated_at = datetime.utcnow()
+    bump_data_version(db, user.id)
     db.commit()
     
     return {"message": f"Field '{data.field}' updated successfully"}
\ No newline at end of file
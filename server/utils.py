@@ -1,9 +1,115 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+# bcrypt cost: fixed with BCRYPT_ROUNDS, otherwise calibrated at startup to BCRYPT_TARGET_MS per hash.
+# Deployments with several processes or replicas should fix it, so they all hash alike.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "0")) or None
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", "250"))
+BCRYPT_MIN_ROUNDS = 12  # passlib's default; calibration never goes below it
+BCRYPT_MAX_ROUNDS = 15
+
+# Hashing pool: worker processes plus a bounded number of queued requests
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "16"))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "2"))  # seconds
+
+@lru_cache(maxsize=None)
+def _context(rounds: int) -> CryptContext:
+    # Only a cost below `rounds` is "needs update": rehashing goes up, never down
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+    )
+
+def hash_password(password: str, rounds: int = None) -> str:
+    if rounds is None:
+        return pwd_context.hash(password)
+    return _context(rounds).hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
+
+def verify_and_update(plain_password: str, hashed_password: str, rounds: int):
+    """(valid, new_hash): new_hash is set when the stored hash uses fewer than `rounds`"""
+    return _context(rounds).verify_and_update(plain_password, hashed_password)
+
+def calibrate_bcrypt_rounds(target_ms: float = BCRYPT_TARGET_MS) -> int:
+    """Highest bcrypt cost whose hash time on this host stays within target_ms"""
+    started = time.perf_counter()
+    hash_password("calibration", BCRYPT_MIN_ROUNDS)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    # Each extra round doubles the work
+    extra = math.floor(math.log2(target_ms / elapsed_ms)) if elapsed_ms < target_ms else 0
+    return max(BCRYPT_MIN_ROUNDS, min(BCRYPT_MAX_ROUNDS, BCRYPT_MIN_ROUNDS + extra))
+
+class HashingPoolBusy(Exception):
+    """Raised when the hashing queue is full; callers should answer 503 with Retry-After"""
+
+    retry_after = PASSWORD_HASH_RETRY_AFTER
+
+class PasswordHasher:
+    """bcrypt hashing and verification on a process pool with a bounded queue.
+
+    Keeps bcrypt off the request threads: callers await the result on the
+    event loop, so a queued hash holds neither a thread nor a connection.
+    When workers and queue are all taken, calls fail fast with
+    HashingPoolBusy instead of piling up.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue_size: int = PASSWORD_HASH_QUEUE):
+        self.workers = workers
+        self.rounds = None
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._executor is not None:
+            return
+        with self._lock:
+            if self._executor is not None:
+                return
+            self.rounds = BCRYPT_ROUNDS or calibrate_bcrypt_rounds()
+            print(f"✅ Password hashing pool: {self.workers} workers, bcrypt cost {self.rounds}")
+            # spawn: forking a threaded server process is not safe
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    async def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        self.start()
+        return await self._run(hash_password, password, self.rounds)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str):
+        self.start()
+        return await self._run(verify_and_update, plain_password, hashed_password, self.rounds)
+
+password_hasher = PasswordHasher()